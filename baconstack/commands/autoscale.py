@@ -0,0 +1,117 @@
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+
+from baconstack.utils.autoscale import (
+    DEFAULT_INTERVAL,
+    DEFAULT_TOLERANCE,
+    DEFAULT_WINDOW,
+    Autoscaler,
+    Decision,
+    RuleError,
+    Sample,
+    ScaleHistory,
+    load_rules,
+    sample,
+    scale_command,
+)
+from baconstack.utils.dokku import DokkuError, connect, read_app_json, run
+
+app = typer.Typer()
+console = Console()
+
+
+def show_sample(samples: dict[str, Sample]):
+    if not samples:
+        console.print("[dim]No running containers[/dim]")
+        return
+    console.print(
+        "  ".join(
+            f"{process_type}: {s.containers}x cpu {s.cpu:.0f}% mem {s.memory:.0f}%"
+            for process_type, s in sorted(samples.items())
+        ),
+        style="dim",
+    )
+
+
+def show_decision(decision: Decision, dry_run: bool):
+    if decision.changes:
+        verb = "would scale" if dry_run else "scaling"
+        console.print(
+            f"[yellow]{decision.process_type}: {verb} {decision.current} -> "
+            f"{decision.desired}[/yellow] ({decision.reason})"
+        )
+    else:
+        console.print(
+            f"{decision.process_type}: keeping {decision.current} ({decision.reason})"
+        )
+
+
+@app.command()
+def autoscale(
+    project_name: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    project_dir: Path = typer.Option(
+        None, help="Directory with the app.json rules (default: the app's name)"
+    ),
+    interval: float = typer.Option(DEFAULT_INTERVAL, help="Seconds between samples"),
+    window: int = typer.Option(
+        DEFAULT_WINDOW, min=1, help="Samples each decision is based on"
+    ),
+    tolerance: float = typer.Option(
+        DEFAULT_TOLERANCE, help="Fraction off target that is left alone"
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Report decisions without scaling"
+    ),
+    once: bool = typer.Option(
+        False, "--once", help="Decide once, after a single window, and exit"
+    ),
+):
+    """Scale an app's process types to the utilisation targets in app.json"""
+    try:
+        rules = load_rules(read_app_json(project_dir or Path(project_name)))
+    except (RuleError, ValueError) as e:
+        console.print(f"[red]Invalid autoscale rules in app.json:[/red] {e}")
+        raise typer.Exit(1)
+    if not rules:
+        console.print("[red]app.json has no dokku.autoscale rules[/red]")
+        raise typer.Exit(1)
+
+    ssh = connect(dokku_host, dokku_user)
+    scaler = Autoscaler(rules, window, tolerance)
+    history = ScaleHistory(dokku_host, project_name)
+
+    try:
+        while True:
+            try:
+                samples = sample(ssh, project_name)
+            except DokkuError as e:
+                console.print(f"[red]Error sampling {project_name}:[/red] {e}")
+                raise typer.Exit(1)
+            show_sample(samples)
+            scaler.observe(samples)
+
+            decisions = scaler.decisions(history.load(), time.time())
+            for decision in decisions:
+                show_decision(decision, dry_run)
+            changes = [d for d in decisions if d.changes]
+            if changes and not dry_run:
+                result = run(ssh, scale_command(project_name, changes))
+                if not result.ok:
+                    console.print(f"[red]Error scaling:[/red] {result.stderr}")
+                    raise typer.Exit(1)
+                process_types = [d.process_type for d in changes]
+                history.record(process_types)
+                scaler.scaled(process_types)
+
+            if once and len(decisions) == len(rules):
+                return
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        console.print("Stopped")
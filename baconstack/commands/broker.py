@@ -0,0 +1,78 @@
+import json
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.dokku import (
+    DEFAULT_IDLE_TIMEOUT,
+    Broker,
+    BrokerError,
+    broker_request,
+    broker_running,
+    broker_socket_path,
+    ensure_broker,
+)
+
+app = typer.Typer(
+    help="Manage the background SSH connection broker (enable with BACONSTACK_BROKER=1)"
+)
+console = Console()
+
+
+@app.command()
+def start():
+    """Start the broker in the background"""
+    socket_path = ensure_broker()
+    console.print(f"[green]Broker listening on {socket_path}[/green]")
+
+
+@app.command()
+def stop():
+    """Stop the broker and close its connections"""
+    socket_path = broker_socket_path()
+    if not broker_running(socket_path):
+        console.print("[yellow]Broker is not running[/yellow]")
+        return
+    sock, _ = broker_request(socket_path, {"op": "stop"})
+    sock.close()
+    console.print("[green]Broker stopped[/green]")
+
+
+@app.command()
+def status():
+    """Show the connections held by the broker"""
+    socket_path = broker_socket_path()
+    try:
+        sock, payload = broker_request(socket_path, {"op": "status"})
+    except BrokerError:
+        console.print("[yellow]Broker is not running[/yellow]")
+        return
+    sock.close()
+
+    table = Table(title=f"Broker connections ({socket_path})")
+    table.add_column("Host")
+    table.add_column("User")
+    table.add_column("Idle (s)", justify="right")
+    for connection in json.loads(payload):
+        table.add_row(
+            connection["host"], connection["user"] or "", f"{connection['idle']:.0f}"
+        )
+    console.print(table)
+
+
+@app.command()
+def serve(
+    socket: str = typer.Option(None, help="Path of the broker's Unix socket"),
+    idle_timeout: float = typer.Option(
+        DEFAULT_IDLE_TIMEOUT,
+        envvar="BACONSTACK_BROKER_IDLE_TIMEOUT",
+        help="Seconds before an unused connection is closed",
+    ),
+):
+    """Run the broker in the foreground"""
+    try:
+        Broker(socket or broker_socket_path(), idle_timeout).serve()
+    except BrokerError as e:
+        console.print(f"[yellow]{e}[/yellow]")
+        raise typer.Exit(1)
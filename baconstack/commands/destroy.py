@@ -0,0 +1,73 @@
+import typer
+from rich.console import Console
+from rich.text import Text
+
+from baconstack.utils.dns import DigitalOceanClient, RecordIndex, app_records
+from baconstack.utils.dokku import app_domains, connect, run, split_host
+
+app = typer.Typer()
+console = Console()
+
+# Lines of output kept per stream, for reporting failures
+OUTPUT_TAIL = 50
+
+
+@app.command()
+def destroy(
+    project_name: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    do_token: str = typer.Option(None, envvar="DO_API_KEY"),
+    force: bool = typer.Option(False, "--force", help="Skip confirmation prompt"),
+):
+    """Destroy a Dokku app and remove its DNS record"""
+    if not force:
+        confirm = typer.confirm(
+            f"This will permanently delete the app '{project_name}' and its DNS records. Continue?"
+        )
+        if not confirm:
+            raise typer.Abort()
+
+    # Connect to Dokku host
+    ssh = connect(dokku_host)
+
+    # The app's recorded domains tell us which zones hold its records
+    domains = app_domains(ssh, project_name)
+
+    # Destroy the Dokku app
+    result = run(
+        ssh,
+        f"sudo dokku apps:destroy {project_name} --force",
+        on_output=lambda stream, line: console.print(
+            Text(line.rstrip("\n"), style="red" if stream == "stderr" else "")
+        ),
+        tail=OUTPUT_TAIL,
+    )
+    if not result.ok:
+        console.print(f"[red]Error destroying app:[/red] {result.stderr}")
+        raise typer.Exit(1)
+
+    # Remove DNS records from DigitalOcean
+    try:
+        index = RecordIndex(DigitalOceanClient(do_token))
+        records = app_records(
+            index,
+            project_name,
+            domains,
+            split_host(dokku_host)[0],
+            on_missing_zone=lambda zone: console.print(
+                f"[yellow]Skipped {zone}: not a zone in this DigitalOcean account[/yellow]"
+            ),
+        )
+
+        for zone, record in records:
+            index.delete(zone, record)
+            console.print(
+                f"[green]Removed DNS record for {record['name']}.{zone}[/green]"
+            )
+
+        if not records:
+            console.print("[yellow]No matching DNS records found[/yellow]")
+
+    except Exception as e:
+        console.print(f"[red]Error removing DNS record: {str(e)}[/red]")
+        raise typer.Exit(1)
@@ -0,0 +1,122 @@
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.dns import (
+    DEFAULT_WORKERS,
+    Change,
+    DigitalOceanClient,
+    DNSError,
+    RecordIndex,
+    apply,
+    desired_cname,
+    plan,
+)
+from baconstack.utils.dokku import split_host
+from baconstack.utils.fleet import load_manifest
+
+app = typer.Typer(help="Reconcile DNS records with the apps in a fleet manifest")
+console = Console()
+
+ACTION_STYLES = {"create": "green", "update": "yellow", "delete": "red"}
+
+MANIFEST = typer.Argument(Path("fleet.toml"), help="Fleet manifest (TOML)")
+PRUNE = typer.Option(
+    False,
+    help="Also delete CNAMEs pointing at the fleet's hosts that no app accounts for",
+)
+
+
+def plan_manifest(
+    manifest: Path, do_token: str, prune: bool, workers: int = DEFAULT_WORKERS
+) -> tuple[RecordIndex, list[Change]]:
+    """Plan the changes needed for every app in the manifest"""
+    try:
+        fleet = load_manifest(manifest)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Invalid fleet manifest {manifest}: {e}[/red]")
+        raise typer.Exit(1)
+
+    # DNS points at the host name, whatever SSH port the host is reached on
+    hosts = {a.host: split_host(a.host)[0] for a in fleet.apps}
+    desired = [desired_cname(a.domain, hosts[a.host]) for a in fleet.apps if a.domain]
+    index = RecordIndex(DigitalOceanClient(do_token, pool_size=workers))
+    try:
+        changes = plan(index, desired, set(hosts.values()) if prune else None)
+    except DNSError as e:
+        console.print(f"[red]Error reading DNS zones: {e}[/red]")
+        raise typer.Exit(1)
+    return index, changes
+
+
+def plan_table(changes: list[Change]) -> Table:
+    table = Table(title="DNS changes")
+    table.add_column("Action")
+    table.add_column("Record")
+    table.add_column("Type")
+    table.add_column("Data")
+    for change in changes:
+        style = ACTION_STYLES[change.action]
+        data = change.record["data"]
+        if change.action == "update":
+            data = f"{data} -> {change.desired.data}"
+        table.add_row(
+            f"[{style}]{change.action}[/{style}]",
+            change.fqdn,
+            change.record["type"],
+            data,
+        )
+    return table
+
+
+@app.command("plan")
+def show_plan(
+    manifest: Path = MANIFEST,
+    do_token: str = typer.Option(
+        None, envvar="DO_API_KEY", help="DigitalOcean API token"
+    ),
+    prune: bool = PRUNE,
+):
+    """Show the DNS changes needed to match the manifest"""
+    _, changes = plan_manifest(manifest, do_token, prune)
+    if not changes:
+        console.print("[green]DNS is up to date[/green]")
+        return
+    console.print(plan_table(changes))
+
+
+@app.command("apply")
+def apply_plan(
+    manifest: Path = MANIFEST,
+    do_token: str = typer.Option(
+        None, envvar="DO_API_KEY", help="DigitalOcean API token"
+    ),
+    prune: bool = PRUNE,
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, help="Maximum number of API requests in flight"
+    ),
+    yes: bool = typer.Option(False, "--yes", help="Skip confirmation prompt"),
+):
+    """Apply the DNS changes needed to match the manifest"""
+    index, changes = plan_manifest(manifest, do_token, prune, workers)
+    if not changes:
+        console.print("[green]DNS is up to date[/green]")
+        return
+
+    console.print(plan_table(changes))
+    if not yes and not typer.confirm(f"Apply {len(changes)} changes?"):
+        raise typer.Abort()
+
+    failed = 0
+    for change, error in apply(index, changes, workers):
+        if error:
+            failed += 1
+            console.print(
+                f"[red]Failed to {change.action} {change.fqdn}: {error}[/red]"
+            )
+
+    console.print(f"Applied {len(changes) - failed} of {len(changes)} changes")
+    if failed:
+        raise typer.Exit(1)
@@ -0,0 +1,203 @@
+import secrets
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.dokku import (
+    DokkuError,
+    config_digest,
+    config_digests,
+    config_export,
+    config_set_commands,
+    connect,
+    run,
+)
+from baconstack.utils.env import filter_sensitive_vars, is_sensitive, load_env_file
+
+app = typer.Typer(help="Manage environment variables")
+console = Console()
+
+
+def config_table(project_name: str, config: dict[str, str]) -> Table:
+    """Render an app's configuration as a table, hiding sensitive values"""
+    table = Table(title=f"Dokku Configuration for {project_name}")
+    table.add_column("Variable")
+    table.add_column("Value")
+
+    for key, value in sorted(config.items()):
+        table.add_row(key, "*" * 8 if is_sensitive(key) else value)
+
+    return table
+
+
+def changes_table(project_name: str, changes: dict[str, str], existing: set[str]):
+    """Render the variables a sync set, hiding sensitive values"""
+    table = Table(title=f"Configuration changes for {project_name}")
+    table.add_column("Variable")
+    table.add_column("Value")
+    table.add_column("Change")
+
+    for key, value in sorted(changes.items()):
+        table.add_row(
+            key,
+            "*" * 8 if is_sensitive(key) else value,
+            "updated" if key in existing else "added",
+        )
+
+    return table
+
+
+def read_config(ssh, project_name: str) -> dict[str, str]:
+    try:
+        return config_export(ssh, project_name)
+    except DokkuError as e:
+        console.print(f"[red]Error reading configuration:[/red] {e}")
+        raise typer.Exit(1)
+
+
+def compare_config(
+    ssh, project_name: str, wanted: dict[str, str], digest: bool
+) -> tuple[set[str], set[str]]:
+    """Names of the app's existing variables, and of those among them whose
+    value differs from `wanted`
+
+    With `digest`, only keyed hashes of the remote values are fetched; hosts
+    without python3 to compute them fall back to reading the values.
+    """
+    if digest:
+        key = secrets.token_hex(16)
+        try:
+            digests = config_digests(ssh, project_name, key)
+        except DokkuError as e:
+            console.print(
+                f"[yellow]Could not compare digests ({e}); "
+                "reading the values instead[/yellow]"
+            )
+        else:
+            differing = {
+                name
+                for name, value in wanted.items()
+                if name in digests and digests[name] != config_digest(key, value)
+            }
+            return set(digests), differing
+
+    existing_config = read_config(ssh, project_name)
+    differing = {
+        name
+        for name, value in wanted.items()
+        if name in existing_config and existing_config[name] != value
+    }
+    return set(existing_config), differing
+
+
+@app.command()
+def init(
+    project_dir: str = typer.Argument(".", help="Project directory"),
+):
+    """Initialize .env file from template"""
+    project_path = Path(project_dir)
+    env_example = project_path / ".env.example"
+    env_file = project_path / ".env"
+
+    if env_file.exists():
+        if not typer.confirm("A .env file already exists. Overwrite?"):
+            raise typer.Abort()
+
+    if not env_example.exists():
+        console.print("[red]No .env.example file found[/red]")
+        raise typer.Abort()
+
+    # Copy template to .env
+    env_file.write_text(env_example.read_text())
+    console.print("[green]Created .env file from template[/green]")
+    console.print("\nPlease edit the .env file and update the values.")
+
+    # Show current variables
+    env_vars = load_env_file(env_file)
+    table = Table(title="Environment Variables")
+    table.add_column("Variable")
+    table.add_column("Value")
+
+    filtered_vars = filter_sensitive_vars(env_vars)
+    for key, value in filtered_vars.items():
+        table.add_row(key, value or "[red]empty[/red]")
+
+    console.print(table)
+
+
+@app.command()
+def sync(
+    project_name: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(None, envvar="DOKKU_HOST_USER"),
+    env_file: str = typer.Option(".env", help="Path to .env file"),
+    restart: bool = typer.Option(True, help="Restart the app once the changes are set"),
+    digest: bool = typer.Option(
+        True, help="Compare hashes of the remote values rather than the values"
+    ),
+):
+    """Sync local environment variables to Dokku"""
+    env_path = Path(env_file)
+    if not env_path.exists():
+        console.print(f"[red]No .env file found at {env_file}[/red]")
+        raise typer.Abort()
+
+    # Load environment variables
+    env_vars = load_env_file(env_path)
+
+    # Connect to Dokku host
+    ssh = connect(dokku_host, dokku_user)
+
+    # Find which variables are new or differ, skipping empty values
+    wanted = {key: value for key, value in env_vars.items() if value}
+    existing, differing = compare_config(ssh, project_name, wanted, digest)
+
+    changes = {}
+    for key, new_value in wanted.items():
+        if key in differing:
+            if typer.confirm(f"Variable {key} exists with different value. Overwrite?"):
+                changes[key] = new_value
+        elif key not in existing:
+            # New variable, add it
+            changes[key] = new_value
+
+    if not changes:
+        console.print("[yellow]No changes needed[/yellow]")
+        return
+
+    # Apply changes without restarting, then restart once at the end
+    for command in config_set_commands(project_name, changes):
+        result = run(ssh, command)
+        if not result.ok:
+            console.print(f"[red]Error setting configuration:[/red] {result.stderr}")
+            raise typer.Exit(1)
+
+    console.print(f"[green]Set {len(changes)} variables[/green]")
+    console.print(changes_table(project_name, changes, existing))
+
+    if not restart:
+        console.print(
+            f"[yellow]Not restarted; changes take effect on the next deploy or "
+            f"`dokku ps:restart {project_name}`[/yellow]"
+        )
+        return
+
+    result = run(ssh, f"sudo dokku ps:restart {project_name}")
+    if not result.ok:
+        console.print(f"[red]Error restarting {project_name}:[/red] {result.stderr}")
+        raise typer.Exit(1)
+    console.print(f"[green]Restarted {project_name}[/green]")
+
+
+@app.command()
+def show(
+    project_name: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(..., envvar="DOKKU_HOST_USER"),
+):
+    """Show current Dokku environment variables"""
+    ssh = connect(dokku_host, dokku_user)
+
+    console.print(config_table(project_name, read_config(ssh, project_name)))
@@ -0,0 +1,196 @@
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+
+from baconstack.utils.fleet import (
+    DEFAULT_PER_HOST,
+    DEFAULT_WORKERS,
+    FleetApp,
+    FleetJob,
+    cli_runner,
+    load_manifest,
+    run_fleet,
+)
+
+app = typer.Typer(help="Run commands across every app in a fleet manifest")
+console = Console()
+
+STATUS_STYLES = {
+    "queued": "dim",
+    "running": "yellow",
+    "ok": "green",
+    "failed": "red",
+}
+
+MANIFEST = typer.Argument(Path("fleet.toml"), help="Fleet manifest (TOML)")
+WORKERS = typer.Option(DEFAULT_WORKERS, min=1, help="Maximum number of apps in flight")
+PER_HOST = typer.Option(
+    DEFAULT_PER_HOST, help="Maximum apps in flight per host, unless set in manifest"
+)
+BROKER = typer.Option(True, help="Share one SSH connection per host between apps")
+ONLY = typer.Option(None, "--app", help="Only run for these apps")
+
+
+class FleetView:
+    """Live table of every job's status"""
+
+    def __init__(self, command: str, jobs: list[FleetJob]):
+        self.command = command
+        self.jobs = jobs
+
+    def __rich__(self) -> Table:
+        done = sum(job.status in ("ok", "failed") for job in self.jobs)
+        table = Table(title=f"fleet {self.command}: {done}/{len(self.jobs)} done")
+        table.add_column("App")
+        table.add_column("Host")
+        table.add_column("Status")
+        table.add_column("Time", justify="right")
+        for job in self.jobs:
+            style = STATUS_STYLES[job.status]
+            table.add_row(
+                job.app.name,
+                job.app.host,
+                f"[{style}]{job.status}[/{style}]",
+                f"{job.elapsed:.1f}s" if job.started else "",
+            )
+        return table
+
+
+def run_command(
+    command: str,
+    manifest: Path,
+    job_args: Callable[[FleetApp], list[str]],
+    workers: int,
+    per_host: int,
+    broker: bool,
+    only: list[str] | None,
+    extra_env: dict[str, str] | None = None,
+):
+    try:
+        fleet = load_manifest(manifest)
+        apps = [a for a in fleet.apps if not only or a.name in only]
+        jobs = [FleetJob(a, job_args(a)) for a in apps]
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Invalid fleet manifest {manifest}: {e}[/red]")
+        raise typer.Exit(1)
+
+    env = {**os.environ, **(extra_env or {})}
+    if broker:
+        env["BACONSTACK_BROKER"] = "1"
+
+    view = FleetView(command, jobs)
+    from rich.live import Live
+
+    with Live(view, console=console, refresh_per_second=4) as live:
+        run_fleet(
+            jobs,
+            cli_runner(fleet.root, env),
+            workers=workers,
+            per_host=per_host,
+            host_limits=fleet.host_limits,
+            on_update=live.refresh,
+        )
+
+    # Live only ends its last frame with a newline on a terminal
+    if not console.is_terminal:
+        console.line()
+
+    failed = [job for job in jobs if job.status == "failed"]
+    for job in failed:
+        tail = "\n".join(job.output.strip().splitlines()[-20:])
+        console.print(Panel(tail, title=f"{job.app.name} on {job.app.host}"))
+
+    summary = f"{len(jobs) - len(failed)} succeeded, {len(failed)} failed"
+    if failed:
+        console.print(f"[red]{summary}[/red]")
+        raise typer.Exit(1)
+    console.print(f"[green]{summary}[/green]")
+
+
+@app.command()
+def setup(
+    manifest: Path = MANIFEST,
+    do_token: str = typer.Option(
+        None, envvar="DO_API_KEY", help="DigitalOcean API token"
+    ),
+    workers: int = WORKERS,
+    per_host: int = PER_HOST,
+    broker: bool = BROKER,
+    only: list[str] = ONLY,
+):
+    """Set up every app in the manifest"""
+
+    def job_args(fleet_app: FleetApp) -> list[str]:
+        if not fleet_app.domain:
+            raise ValueError(f"App {fleet_app.name} has no domain")
+        args = ["setup", fleet_app.name, fleet_app.domain]
+        args += ["--dokku-host", fleet_app.host]
+        if fleet_app.user:
+            args += ["--dokku-user", fleet_app.user]
+        return args
+
+    run_command(
+        "setup",
+        manifest,
+        job_args,
+        workers,
+        per_host,
+        broker,
+        only,
+        {"DO_API_KEY": do_token} if do_token else None,
+    )
+
+
+@app.command()
+def destroy(
+    manifest: Path = MANIFEST,
+    do_token: str = typer.Option(None, envvar="DO_API_KEY"),
+    force: bool = typer.Option(False, "--force", help="Skip confirmation prompt"),
+    workers: int = WORKERS,
+    per_host: int = PER_HOST,
+    broker: bool = BROKER,
+    only: list[str] = ONLY,
+):
+    """Destroy every app in the manifest and remove their DNS records"""
+    if not force:
+        confirm = typer.confirm(
+            f"This will permanently delete every app in {manifest} and its DNS records. Continue?"
+        )
+        if not confirm:
+            raise typer.Abort()
+
+    run_command(
+        "destroy",
+        manifest,
+        lambda a: ["destroy", a.name, "--dokku-host", a.host, "--force"],
+        workers,
+        per_host,
+        broker,
+        only,
+        {"DO_API_KEY": do_token} if do_token else None,
+    )
+
+
+@app.command()
+def setup_loki(
+    manifest: Path = MANIFEST,
+    workers: int = WORKERS,
+    per_host: int = PER_HOST,
+    broker: bool = BROKER,
+    only: list[str] = ONLY,
+):
+    """Set up Loki logging for every app in the manifest"""
+    run_command(
+        "setup-loki",
+        manifest,
+        lambda a: ["setup-loki", a.name, "--dokku-host", a.host],
+        workers,
+        per_host,
+        broker,
+        only,
+    )
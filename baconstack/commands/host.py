@@ -0,0 +1,80 @@
+import typer
+from rich.console import Console
+from rich.table import Table
+from rich.text import Text
+
+from baconstack.utils.dokku import DokkuError, connect, run_batch
+from baconstack.utils.plugins import PLUGINS, PluginInventory, install_commands
+
+app = typer.Typer()
+console = Console()
+
+# Lines of output kept per command and stream, for reporting failures
+OUTPUT_TAIL = 50
+
+
+@app.callback()
+def host():
+    """Prepare Dokku hosts for baconstack apps"""
+
+
+@app.command()
+def bootstrap(
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    plugins: list[str] = typer.Option(
+        None, "--plugin", help="Only install these plugins"
+    ),
+):
+    """Install the Dokku plugins baconstack apps need, once per host"""
+    names = plugins or list(PLUGINS)
+    unknown = sorted(set(names) - set(PLUGINS))
+    if unknown:
+        console.print(
+            f"[red]Unknown plugins: {', '.join(unknown)}. "
+            f"Choose from {', '.join(PLUGINS)}[/red]"
+        )
+        raise typer.Exit(1)
+
+    ssh = connect(dokku_host, dokku_user)
+
+    # Always start from the host's real plugin list
+    inventory = PluginInventory(dokku_host)
+    try:
+        installed = inventory.installed(ssh, refresh=True)
+    except DokkuError as e:
+        console.print(f"[red]Error listing plugins:[/red] {e}")
+        raise typer.Exit(1)
+
+    missing = [name for name in names if name not in installed]
+    results = run_batch(
+        ssh,
+        install_commands(installed, missing),
+        on_output=lambda i, stream, line: console.print(
+            Text(line.rstrip("\n"), style="red" if stream == "stderr" else "")
+        ),
+        tail=OUTPUT_TAIL,
+    )
+
+    table = Table(title=f"Plugins on {dokku_host}")
+    table.add_column("Plugin")
+    table.add_column("Status")
+    failed = False
+    for name in names:
+        if name not in missing:
+            table.add_row(name, "[green]already installed[/green]")
+            continue
+        result = results[missing.index(name)]
+        if result.ok:
+            inventory.add(name)
+            table.add_row(name, "[green]installed[/green]")
+        else:
+            failed = True
+            console.print(f"[red]Error installing {name}[/red] {result.stderr}")
+            table.add_row(name, "[red]failed[/red]")
+    console.print(table)
+
+    if failed:
+        raise typer.Exit(1)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import ssl
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.loadtest import (
+    DEFAULT_CONNECTIONS,
+    DEFAULT_DURATION,
+    DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_TIMEOUT,
+    MAX_RATE,
+    LoadResult,
+    run_load,
+)
+
+app = typer.Typer()
+console = Console()
+
+# Summary figures that are latencies, shown in milliseconds
+LATENCIES = ("min", "mean", "p50", "p90", "p95", "p99", "p999", "max")
+
+
+def figure(name: str, value: float) -> str:
+    if name in LATENCIES:
+        return f"{value / 1000:.2f} ms"
+    if name == "throughput":
+        return f"{value:.1f}/s"
+    return str(value)
+
+
+def results_table(result: LoadResult) -> Table:
+    table = Table(
+        title=f"{result.url} ({result.mode} loop)",
+        caption=f"{result.connections} connections, {result.duration:.1f}s",
+    )
+    table.add_column("Measure")
+    table.add_column("Value", justify="right")
+    for name, value in result.summary().items():
+        table.add_row(name, figure(name, value))
+    return table
+
+
+def errors_table(result: LoadResult) -> Table:
+    table = Table(title="Errors")
+    table.add_column("Kind")
+    table.add_column("Count", justify="right")
+    for kind, count in sorted(result.errors.items(), key=lambda item: -item[1]):
+        table.add_row(kind, str(count))
+    return table
+
+
+def comparison_table(baseline: LoadResult, result: LoadResult) -> Table:
+    table = Table(title=f"Compared with {baseline.started_at}")
+    table.add_column("Measure")
+    table.add_column("Baseline", justify="right")
+    table.add_column("This run", justify="right")
+    table.add_column("Change", justify="right")
+    before, after = baseline.summary(), result.summary()
+    for name in after:
+        if before[name]:
+            change = (after[name] - before[name]) / before[name] * 100
+            higher_is_better = name in ("requests", "ok", "throughput")
+            worse = change < 0 if higher_is_better else change > 0
+            style = "red" if worse and abs(change) >= 5 else ""
+            shown = f"{change:+.1f}%"
+            shown = f"[{style}]{shown}[/{style}]" if style else shown
+        else:
+            shown = ""
+        table.add_row(
+            name, figure(name, before[name]), figure(name, after[name]), shown
+        )
+    return table
+
+
+@app.command()
+def loadtest(
+    url: str,
+    connections: int = typer.Option(
+        DEFAULT_CONNECTIONS, "--connections", "-c", min=1, help="Connections to use"
+    ),
+    duration: float = typer.Option(
+        DEFAULT_DURATION, "--duration", "-d", help="Seconds to send requests for"
+    ),
+    rate: float = typer.Option(
+        None, help="Requests per second, started on a fixed schedule"
+    ),
+    open_loop: bool = typer.Option(
+        False,
+        "--open-loop",
+        help="With --rate, open more connections rather than fall behind",
+    ),
+    max_connections: int = typer.Option(
+        DEFAULT_MAX_CONNECTIONS,
+        min=1,
+        help="Most connections --open-loop may open",
+    ),
+    timeout: float = typer.Option(DEFAULT_TIMEOUT, help="Seconds per request"),
+    method: str = typer.Option("GET", help="HTTP method"),
+    headers: list[str] = typer.Option(
+        None, "--header", "-H", help='Extra request header, as "Name: value"'
+    ),
+    insecure: bool = typer.Option(False, help="Don't verify the server's certificate"),
+    output: Path = typer.Option(None, help="Save the results to this JSON file"),
+    compare: Path = typer.Option(
+        None, help="Compare with results saved by an earlier run"
+    ),
+):
+    """Load test a URL and report its latency percentiles"""
+    if rate is not None and not 0 < rate <= MAX_RATE:
+        console.print(f"[red]--rate must be above 0 and at most {MAX_RATE:,}[/red]")
+        raise typer.Exit(1)
+    if open_loop and rate is None:
+        console.print("[red]--open-loop needs a --rate[/red]")
+        raise typer.Exit(1)
+    extra = {}
+    for header in headers or []:
+        name, sep, value = header.partition(":")
+        if not sep or not name.strip():
+            console.print(f'[red]Headers look like "Name: value", not {header!r}[/red]')
+            raise typer.Exit(1)
+        extra[name.strip()] = value.strip()
+
+    baseline = None
+    if compare:
+        try:
+            baseline = LoadResult.from_dict(json.loads(compare.read_text()))
+        except (OSError, ValueError, KeyError) as e:
+            console.print(f"[red]Could not read results from {compare}: {e}[/red]")
+            raise typer.Exit(1)
+
+    context = ssl.create_default_context()
+    if insecure:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    pacing = f"{rate:g} requests/s" if rate else "as fast as answered"
+    console.print(
+        f"Loading {url} for {duration:g}s on {connections} connections, {pacing}"
+    )
+    try:
+        result = asyncio.run(
+            run_load(
+                url,
+                connections,
+                duration,
+                rate,
+                open_loop,
+                timeout,
+                method.upper(),
+                extra,
+                context,
+                max_connections,
+            )
+        )
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+    console.print(results_table(result))
+    if result.errors:
+        console.print(errors_table(result))
+    if baseline:
+        console.print(comparison_table(baseline, result))
+    if output:
+        output.write_text(json.dumps(result.to_dict(), indent=2))
+        console.print(f"Results written to {output}")
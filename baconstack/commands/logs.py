@@ -0,0 +1,102 @@
+import time
+
+import typer
+from rich.console import Console
+
+from baconstack.utils.loki import (
+    APP_LABEL,
+    FOLLOW_INTERVAL,
+    PAGE_SIZE,
+    LokiClient,
+    LokiError,
+    build_query,
+    parse_time,
+)
+
+app = typer.Typer()
+console = Console(stderr=True)
+
+
+def parse_labels(labels: list[str]) -> dict[str, str]:
+    selector = {}
+    for label in labels:
+        key, sep, value = label.partition("=")
+        if not sep or not key:
+            console.print(f"[red]Labels are KEY=VALUE, not {label!r}[/red]")
+            raise typer.Exit(1)
+        selector[key.strip()] = value.strip()
+    return selector
+
+
+@app.command()
+def logs(
+    project_name: str,
+    since: str = typer.Option(
+        "1h", help="Start: a duration ago (15m, 2h, 1d) or an ISO 8601 time"
+    ),
+    until: str = typer.Option(None, help="End, in the same forms; defaults to now"),
+    grep: list[str] = typer.Option(
+        None, "--grep", help="Only lines containing this text (repeatable)"
+    ),
+    exclude: list[str] = typer.Option(
+        None, "--exclude", help="Leave out lines containing this text (repeatable)"
+    ),
+    regex: str = typer.Option(None, help="Only lines matching this RE2 expression"),
+    labels: list[str] = typer.Option(
+        None, "--label", help="Only streams with this label, as KEY=VALUE"
+    ),
+    limit: int = typer.Option(None, help="Stop after this many lines"),
+    follow: bool = typer.Option(
+        False, "--follow", "-f", help="Keep printing new lines as they arrive"
+    ),
+    interval: float = typer.Option(
+        FOLLOW_INTERVAL, help="Seconds between checks for new lines with --follow"
+    ),
+    timestamps: bool = typer.Option(True, help="Prefix each line with its time"),
+    loki_url: str = typer.Option(..., envvar="LOKI_URL", help="Loki base URL"),
+    loki_user: str = typer.Option(None, envvar="LOKI_USER"),
+    loki_password: str = typer.Option(None, envvar="LOKI_PASSWORD"),
+):
+    """Search and tail an app's logs in Loki"""
+    if follow and until:
+        console.print("[red]--follow reads up to now; leave out --until[/red]")
+        raise typer.Exit(1)
+    try:
+        start = parse_time(since)
+        end = parse_time(until) if until else time.time_ns()
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+    query = build_query(
+        {APP_LABEL: project_name, **parse_labels(labels or [])},
+        grep or [],
+        exclude or [],
+        regex,
+    )
+    client = LokiClient(loki_url, loki_user, loki_password)
+    if follow:
+        entries = client.follow(query, start, interval, PAGE_SIZE)
+    else:
+        entries = client.lines(query, start, end, PAGE_SIZE, limit)
+
+    # Lines go to stdout as they arrive, untouched, so they can be piped on
+    count = 0
+    try:
+        for entry in entries:
+            if timestamps:
+                typer.echo(
+                    f"{entry.time.isoformat(timespec='milliseconds')} ", nl=False
+                )
+            typer.echo(entry.line)
+            count += 1
+            if follow and limit is not None and count >= limit:
+                break
+    except LokiError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        pass
+
+    if not count and not follow:
+        console.print(f"[yellow]No log lines matched {query}[/yellow]")
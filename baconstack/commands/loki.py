@@ -0,0 +1,53 @@
+import typer
+from rich.console import Console
+from rich.text import Text
+
+from baconstack.utils.dokku import DokkuError, connect, run_batch
+from baconstack.utils.plugins import PluginInventory, install_commands
+
+app = typer.Typer()
+console = Console()
+
+# Lines of output kept per command and stream, for reporting failures
+OUTPUT_TAIL = 50
+
+
+@app.command()
+def setup_loki(
+    project_name: str,
+    dokku_host: str = typer.Option(..., envvar="DOKKU_HOST"),
+):
+    """Set up Loki logging for a Dokku app"""
+    ssh = connect(dokku_host)
+
+    # The plugin is installed host-wide, so only install it if it is missing
+    inventory = PluginInventory(dokku_host)
+    try:
+        plugins = inventory.installed(ssh)
+    except DokkuError as e:
+        console.print(f"[red]Error listing plugins:[/red] {e}")
+        raise typer.Exit(1)
+    installs = install_commands(plugins, ["loki"])
+
+    commands = [
+        f"dokku loki:enable {project_name}",
+        f"dokku loki:set {project_name} retention-period 7d",
+    ]
+
+    results = run_batch(
+        ssh,
+        [*installs, *(f"sudo {cmd}" for cmd in commands)],
+        on_output=lambda i, stream, line: console.print(
+            Text(line.rstrip("\n"), style="red" if stream == "stderr" else "")
+        ),
+        tail=OUTPUT_TAIL,
+    )
+    for result in results:
+        if not result.ok:
+            console.print(f"[red]Error running {result.command}[/red] {result.stderr}")
+
+    if installs and results[0].ok:
+        inventory.add("loki")
+
+    if not all(result.ok for result in results):
+        raise typer.Exit(1)
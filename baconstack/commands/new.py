@@ -0,0 +1,175 @@
+import os
+import subprocess
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+
+from baconstack.utils.steps import run_steps
+from baconstack.utils.template import (
+    DEFAULT_TEMPLATE,
+    DEFAULT_WORKERS,
+    TASKS_FILE,
+    TaskError,
+    TemplateError,
+    load_projects,
+    project_data,
+    project_tasks,
+    render_project,
+    render_projects,
+    resolve_template,
+)
+
+app = typer.Typer()
+console = Console()
+
+
+def finish_project(project_dir: Path, skip: tuple[str, ...], rendered: float) -> bool:
+    """Run the project's declared tasks and show how long each step took
+
+    `rendered` is how long copier took, including the template's own tasks.
+    """
+    try:
+        steps = project_tasks(project_dir, skip)
+    except TaskError as e:
+        console.print(f"[red]{e}[/red]")
+        return False
+    started = time.monotonic()
+    outcomes = run_steps(steps)
+
+    table = Table(title="Post-generation tasks")
+    table.add_column("Task")
+    table.add_column("Status")
+    table.add_column("Time", justify="right")
+    table.add_row("copier", "[green]ok[/green]", f"{rendered:.1f}s")
+    for step in steps:
+        outcome = outcomes[step.name]
+        if outcome.ok:
+            status = "[green]ok[/green]"
+        else:
+            status = f"[red]{'blocked' if outcome.skipped else 'failed'}[/red]"
+        table.add_row(step.name, status, f"{outcome.elapsed:.1f}s")
+    table.add_row("total", "", f"{rendered + time.monotonic() - started:.1f}s")
+    console.print(table)
+
+    for outcome in outcomes.values():
+        if outcome.error:
+            console.print(f"[red]{outcome.name}: {outcome.error}[/red]")
+    return all(outcome.ok for outcome in outcomes.values())
+
+
+def create_many(
+    manifest: Path,
+    template: str,
+    source: str,
+    defaults: dict,
+    workers: int,
+    skip: tuple[str, ...],
+):
+    """Render every project in a manifest and report how each one went"""
+    try:
+        projects = load_projects(manifest, defaults)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Invalid project manifest {manifest}: {e}[/red]")
+        raise typer.Exit(1)
+
+    console.print(Panel(f"Creating {len(projects)} projects from {manifest}"))
+
+    def report(data: dict, error: str | None, elapsed: float):
+        if error:
+            console.print(f"[red]✗ {data['project_name']}: {error}[/red]")
+        else:
+            console.print(f"[green]✓ {data['project_name']}[/green] ({elapsed:.1f}s)")
+
+    errors = render_projects(template, source, projects, workers, skip, on_done=report)
+
+    failed = [name for name, error in errors.items() if error]
+    summary = f"{len(projects) - len(failed)} created, {len(failed)} failed"
+    if failed:
+        console.print(f"[red]{summary}[/red]")
+        raise typer.Exit(1)
+    console.print(f"[green]{summary}[/green]")
+
+
+@app.command()
+def new(
+    project_name: str = typer.Argument(None),
+    framework: str = typer.Option("fastapi", help="Web framework to use"),
+    domain: str = typer.Option(None, help="Domain for deployment"),
+    description: str = typer.Option(None, help="Project description"),
+    author_name: str = typer.Option(None, help="Author name"),
+    author_email: str = typer.Option(None, help="Author email"),
+    use_loki: bool = typer.Option(True, help="Enable Loki logging"),
+    offline: bool = typer.Option(
+        False, help="Render from the cached template without fetching"
+    ),
+    refresh: bool = typer.Option(
+        False, help="Update the cached template before rendering"
+    ),
+    manifest: Path = typer.Option(
+        None, "--from", help="Create every project listed in this manifest (TOML)"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, help="Projects rendered at once with --from"
+    ),
+    skip_tasks: list[str] = typer.Option(
+        None,
+        "--skip-task",
+        help=f"Skip a task the template declares in {TASKS_FILE}",
+    ),
+):
+    """Create a new web project from template"""
+    if bool(project_name) == bool(manifest):
+        console.print("[red]Give either a project name or --from MANIFEST[/red]")
+        raise typer.Exit(1)
+
+    skip = tuple(skip_tasks or ())
+    # Skip pre-commit if requested
+    if os.getenv("SKIP_PRE_COMMIT"):
+        skip += ("pre-commit",)
+
+    template = os.getenv("BACONSTACK_TEMPLATE", DEFAULT_TEMPLATE)
+    try:
+        template_repo = resolve_template(template, offline=offline, refresh=refresh)
+    except TemplateError as e:
+        console.print(f"[red]Error fetching template {template}: {e}[/red]")
+        raise typer.Exit(1)
+
+    if manifest:
+        # Command line options are the defaults for every project; each
+        # project gets its own domain unless the manifest sets one
+        defaults = {
+            "framework": framework,
+            "description": description,
+            "author_name": author_name,
+            "author_email": author_email,
+            "use_loki": use_loki,
+        }
+        create_many(manifest, template, template_repo, defaults, workers, skip)
+        return
+
+    console.print(Panel(f"Creating new {framework} project: {project_name}"))
+
+    # Use copier to create project from template
+    data = project_data(
+        project_name,
+        framework,
+        domain,
+        description,
+        author_name,
+        author_email,
+        use_loki,
+    )
+
+    started = time.monotonic()
+    try:
+        render_project(template, template_repo, data)
+    except subprocess.CalledProcessError as e:
+        console.print(f"[red]Error creating project: {e}[/red]")
+        raise typer.Exit(1)
+
+    if not finish_project(Path(project_name), skip, time.monotonic() - started):
+        raise typer.Exit(1)
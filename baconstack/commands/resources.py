@@ -0,0 +1,101 @@
+import time
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.autoscale import container_stats, read_stats
+from baconstack.utils.dokku import DokkuError, connect, run_batch
+from baconstack.utils.resources import (
+    DEFAULT_PROCESS_TYPE,
+    KINDS,
+    Usage,
+    display_commands,
+    parse_display,
+    peak_usage,
+)
+
+app = typer.Typer()
+console = Console()
+
+
+def memory(size: int | None) -> str:
+    return "none" if size is None else f"{size / 2**20:.0f} MiB"
+
+
+def usage_table(project_name: str, usage: list[Usage], samples: int) -> Table:
+    table = Table(
+        title=f"Resource usage of {project_name}",
+        caption=f"peaks over {samples} samples",
+    )
+    table.add_column("Process")
+    table.add_column("Containers", justify="right")
+    table.add_column("CPU peak / limit", justify="right")
+    table.add_column("Memory peak / limit", justify="right")
+    table.add_column("Memory reserved", justify="right")
+    for entry in usage:
+        cpu_limit = "none" if entry.cpu_limit is None else f"{entry.cpu_limit:g}"
+        table.add_row(
+            entry.process_type,
+            str(entry.containers),
+            f"{entry.cpu_peak:.2f} / {cpu_limit}",
+            f"{memory(entry.memory_peak)} / {memory(entry.memory_limit)}",
+            memory(entry.memory_reserve),
+        )
+    return table
+
+
+@app.callback()
+def resources():
+    """Right-size apps' resource limits and reservations"""
+
+
+@app.command()
+def report(
+    project_name: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    samples: int = typer.Option(6, min=1, help="docker stats samples to take"),
+    interval: float = typer.Option(10.0, help="Seconds between samples"),
+):
+    """Compare an app's limits with the peak usage of its containers"""
+    ssh = connect(dokku_host, dokku_user)
+
+    seen = []
+    try:
+        for n in range(samples):
+            if n:
+                time.sleep(interval)
+            seen.append(container_stats(read_stats(ssh), project_name))
+    except DokkuError as e:
+        console.print(f"[red]Error sampling {project_name}:[/red] {e}")
+        raise typer.Exit(1)
+
+    process_types = sorted({c.process_type for containers in seen for c in containers})
+    if not process_types:
+        console.print(f"[yellow]No running containers for {project_name}[/yellow]")
+        raise typer.Exit(1)
+
+    # Settings for the app as a whole and for each process type, in one exec
+    scopes = [DEFAULT_PROCESS_TYPE, *process_types]
+    results = iter(run_batch(ssh, display_commands(project_name, scopes)))
+    current = {}
+    for process_type in scopes:
+        for kind in KINDS:
+            result = next(results)
+            if not result.ok:
+                console.print(
+                    f"[red]Error reading resource {kind}s:[/red] {result.stderr}"
+                )
+                raise typer.Exit(1)
+            current[kind, process_type] = parse_display(result.stdout)
+
+    usage = peak_usage(seen, current)
+    console.print(usage_table(project_name, usage, samples))
+    for entry in usage:
+        for note in entry.advice:
+            console.print(f"[yellow]{entry.process_type}: {note}[/yellow]")
+        if not entry.advice:
+            console.print(f"[green]{entry.process_type}: limits fit its usage[/green]")
@@ -0,0 +1,355 @@
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+
+from baconstack.utils.dns import (
+    DigitalOceanClient,
+    DNSError,
+    RecordIndex,
+    apply,
+    desired_cname,
+    plan,
+)
+from baconstack.utils.dokku import (
+    AppState,
+    CommandResult,
+    apt_packages_commands,
+    connect,
+    normalise_packages,
+    packages_hash,
+    query_app_state,
+    read_app_json,
+    run_batch,
+    split_host,
+)
+from baconstack.utils.plugins import PluginInventory, install_commands
+from baconstack.utils.resources import (
+    ProfileError,
+    ResourceProfile,
+    load_profiles,
+    resource_commands,
+)
+from baconstack.utils.steps import DEFAULT_CONCURRENCY, Step, run_steps
+
+app = typer.Typer()
+console = Console()
+
+# Lines of output kept per command and stream, for reporting failures
+OUTPUT_TAIL = 50
+
+STATUS_STYLES = {
+    "queued": "dim",
+    "running": "yellow",
+    "ok": "green",
+    "failed": "red",
+    "skipped": "yellow",
+}
+
+CHANGE_VERBS = {
+    "create": "Created DNS record for",
+    "update": "Updated DNS record for",
+    "delete": "Removed duplicate DNS record for",
+}
+
+
+def ensure_dns_record(domain: str, dokku_host: str, do_token: str):
+    """Point a CNAME for domain at the Dokku host, unless one already does"""
+    index = RecordIndex(DigitalOceanClient(do_token))
+    record = desired_cname(domain, split_host(dokku_host)[0])
+
+    # Compare against the live zone
+    try:
+        changes = plan(index, [record])
+    except DNSError as e:
+        console.print(
+            f"[red]Error: Domain {record.zone} not found in DigitalOcean[/red]"
+        )
+        console.print(f"[red]Details: {str(e)}[/red]")
+        raise typer.Exit(1)
+
+    if not changes:
+        console.print(f"DNS record for {domain} is up to date")
+        return
+
+    for change, error in apply(index, changes):
+        if error:
+            console.print(f"[red]Error creating DNS record: {str(error)}[/red]")
+            raise typer.Exit(1)
+        console.print(f"[green]{CHANGE_VERBS[change.action]} {change.fqdn}[/green]")
+
+
+def output_line(prefix: str, stream: str, line: str) -> Text:
+    return Text.assemble(
+        (f"{prefix} ", "dim"),
+        (line.rstrip("\n"), "red" if stream == "stderr" else ""),
+    )
+
+
+def report_results(results: list[CommandResult]):
+    """Report failed commands with the tail of their output
+
+    Output was already shown as it streamed; this repeats what is needed to
+    see why a command failed once the live view has moved on.
+    """
+    for result in results:
+        if not result.ok:
+            cmd = result.command.removeprefix("sudo ")
+            console.print(f"[red]Error running {cmd}[/red] {result.stderr}")
+
+
+def run_commands(ssh, commands: list[str], name: str = "") -> bool:
+    """Run commands as one batch, report them, and return whether all succeeded
+
+    An empty list costs nothing: no channel is opened. Output is printed live,
+    prefixed with `name`, and only the last OUTPUT_TAIL lines are kept.
+    """
+    results = run_batch(
+        ssh,
+        commands,
+        on_output=lambda i, stream, line: console.print(
+            output_line(name, stream, line)
+        ),
+        tail=OUTPUT_TAIL,
+    )
+    report_results(results)
+    return all(result.ok for result in results)
+
+
+class StepsView:
+    """Live table of setup steps with their status and elapsed time"""
+
+    def __init__(self, steps: list[Step]):
+        self.status = {step.name: "queued" for step in steps}
+        self.started: dict[str, float] = {}
+        self.finished: dict[str, float] = {}
+
+    def track(self, step: Step) -> Step:
+        """Wrap a step so its progress shows up in the view"""
+
+        def run():
+            self.started[step.name] = time.monotonic()
+            self.status[step.name] = "running"
+            ok = False
+            try:
+                ok = step.run() is not False
+                return ok
+            finally:
+                self.finished[step.name] = time.monotonic()
+                self.status[step.name] = "ok" if ok else "failed"
+
+        return replace(step, run=run)
+
+    def skip(self, name: str):
+        self.status[name] = "skipped"
+
+    def __rich__(self) -> Table:
+        table = Table(title="Setup steps")
+        table.add_column("Step")
+        table.add_column("Status")
+        table.add_column("Time", justify="right")
+        now = time.monotonic()
+        for name, status in self.status.items():
+            style = STATUS_STYLES[status]
+            elapsed = ""
+            if name in self.started:
+                elapsed = f"{self.finished.get(name, now) - self.started[name]:.1f}s"
+            table.add_row(name, f"[{style}]{status}[/{style}]", elapsed)
+        return table
+
+
+def setup_steps(
+    ssh,
+    project_name: str,
+    domain: str,
+    dokku_host: str,
+    do_token: str,
+    apt_packages: list[str],
+    state: AppState,
+    inventory: PluginInventory,
+    profiles: list[ResourceProfile] = (),
+) -> list[Step]:
+    """Provisioning steps for an app, with the dependencies between them
+
+    Commands for work that `state` shows is already done are left out, so a
+    step with nothing left to do finishes without touching the host. Plugins
+    baconstack installs are recorded in the host's inventory.
+    """
+
+    def dokku(name: str, *commands: str, after: tuple[str, ...] = ()) -> Step:
+        return Step(
+            name,
+            lambda: run_commands(ssh, [f"sudo dokku {cmd}" for cmd in commands], name),
+            after=after,
+        )
+
+    def unless(done: bool, *commands: str) -> list[str]:
+        return [] if done else list(commands)
+
+    def install_plugins(*names: str) -> bool:
+        commands = install_commands(state.plugins, list(names))
+        if not commands:
+            return True
+        if not run_commands(ssh, commands, f"{names[0]}-plugin"):
+            return False
+        for name in names:
+            inventory.add(name)
+        return True
+
+    storage_mount = f"/var/lib/dokku/data/storage/{project_name}:/app/data"
+    mounted = storage_mount in state.mounts
+    # An existing certificate doesn't cover a domain this run adds
+    covered = state.has_certificate and domain in state.vhosts
+    steps = [
+        Step(
+            "dns",
+            lambda: ensure_dns_record(domain, dokku_host, do_token),
+            worker="api",
+        ),
+        dokku(
+            "app",
+            *unless(state.exists, f"apps:create {project_name}"),
+            *unless(domain in state.vhosts, f"domains:add {project_name} {domain}"),
+        ),
+        # Storage setup
+        dokku(
+            "storage-directory",
+            *unless(mounted, f"storage:ensure-directory {project_name}"),
+        ),
+        dokku(
+            "storage-mount",
+            *unless(mounted, f"storage:mount {project_name} {storage_mount}"),
+            after=("app", "storage-directory"),
+        ),
+        # SSL setup; the certificate can only be issued once DNS points here
+        Step("letsencrypt-plugin", lambda: install_plugins("letsencrypt")),
+        dokku(
+            "letsencrypt",
+            *unless(
+                state.has_certificate,
+                f"letsencrypt:set {project_name} email seb@bacon.boutique",
+            ),
+            *unless(covered, f"letsencrypt:enable {project_name}"),
+            *unless(state.has_certificate, f"letsencrypt:auto-renew {project_name}"),
+            after=("dns", "app", "letsencrypt-plugin"),
+        ),
+    ]
+
+    # docker-options need the app to exist
+    apt_commands = apt_packages_commands(
+        project_name, apt_packages, state.build_options
+    )
+    if apt_commands:
+        steps.append(
+            Step(
+                "apt",
+                lambda: run_commands(ssh, apt_commands, "apt"),
+                after=("app",),
+            )
+        )
+
+    # Resource limits and reservations also need the app to exist
+    resource_changes = resource_commands(project_name, list(profiles), state.resources)
+    if resource_changes:
+        steps.append(
+            Step(
+                "resources",
+                lambda: run_commands(ssh, resource_changes, "resources"),
+                after=("app",),
+            )
+        )
+    return steps
+
+
+@app.command()
+def setup(
+    project_name: str,
+    domain: str,
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    do_token: str = typer.Option(
+        None, envvar="DO_API_KEY", help="DigitalOcean API token"
+    ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        envvar="BACONSTACK_CONCURRENCY",
+        help="Maximum number of SSH channels used at once",
+    ),
+):
+    """Set up Dokku app and configure domain"""
+    console.print(Panel(f"Setting up {project_name} on {dokku_host}"))
+
+    project_dir = Path(project_name)
+    app_config = read_app_json(project_dir)
+
+    try:
+        profiles = load_profiles(app_config)
+    except ProfileError as e:
+        console.print(f"[red]Invalid resource profiles in app.json:[/red] {e}")
+        raise typer.Exit(1)
+
+    # Connect to Dokku host
+    ssh = connect(dokku_host, dokku_user)
+
+    apt_packages = normalise_packages(
+        app_config.get("dokku", {}).get("apt-packages", [])
+    )
+    if apt_packages:
+        console.print(
+            f"Setting up APT packages: {', '.join(apt_packages)} "
+            f"[dim](hash {packages_hash(apt_packages)})[/dim]"
+        )
+
+    # Find out what is already in place, then only do what is missing.
+    # Independent steps run at the same time on separate channels.
+    # The host's plugins come from the local inventory while it is fresh.
+    inventory = PluginInventory(dokku_host)
+    plugins = inventory.cached()
+    state = query_app_state(
+        ssh, project_name, plugins, [profile.process_type for profile in profiles]
+    )
+    if plugins is None and state.plugins:
+        inventory.save(state.plugins)
+    steps = setup_steps(
+        ssh,
+        project_name,
+        domain,
+        dokku_host,
+        do_token,
+        apt_packages,
+        state,
+        inventory,
+        profiles,
+    )
+    view = StepsView(steps)
+    from rich.live import Live
+
+    with Live(view, console=console, refresh_per_second=4):
+        outcomes = run_steps([view.track(step) for step in steps], concurrency)
+        for outcome in outcomes.values():
+            if outcome.skipped:
+                view.skip(outcome.name)
+
+    # Live only ends its last frame with a newline on a terminal
+    if not console.is_terminal:
+        console.line()
+
+    for outcome in outcomes.values():
+        # Steps that exit have already said why
+        if outcome.error and not isinstance(outcome.error, typer.Exit):
+            console.print(f"[red]{outcome.name}: {outcome.error}[/red]")
+        elif outcome.skipped:
+            console.print(
+                f"[yellow]Skipped {outcome.name}: "
+                f"{', '.join(outcome.blocked_by)} failed[/yellow]"
+            )
+
+    if not all(outcome.ok for outcome in outcomes.values()):
+        raise typer.Exit(1)
@@ -0,0 +1,75 @@
+import json
+import time
+from dataclasses import asdict
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.dokku import DokkuError, connect
+from baconstack.utils.status import STATUS_TTL, AppStatus, StatusCache, query_status
+
+app = typer.Typer()
+console = Console()
+
+RUNNING_STYLES = {"true": "green", "mixed": "yellow", "false": "red"}
+
+
+def status_table(host: str, statuses: list[AppStatus], age: float) -> Table:
+    table = Table(title=f"Apps on {host}", caption=f"as of {age:.0f}s ago")
+    table.add_column("App")
+    table.add_column("Running")
+    table.add_column("Processes")
+    table.add_column("Domains")
+    table.add_column("Certificate expires")
+    for status in statuses:
+        style = RUNNING_STYLES.get(status.running, "")
+        running = status.running if status.deployed else "not deployed"
+        table.add_row(
+            status.name,
+            f"[{style}]{running}[/{style}]" if style else running,
+            " ".join(f"{kind}={n}" for kind, n in sorted(status.processes.items())),
+            "\n".join(status.domains),
+            status.certificate_expiry or "[dim]none[/dim]",
+        )
+    return table
+
+
+@app.command()
+def status(
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print the snapshot as JSON"),
+    max_age: float = typer.Option(
+        STATUS_TTL, help="Seconds a cached snapshot may be reused for"
+    ),
+    refresh: bool = typer.Option(False, help="Ignore any cached snapshot"),
+):
+    """Show every app on a Dokku host: processes, domains and certificates"""
+    cache = StatusCache(dokku_host)
+    snapshot = None if refresh else cache.cached(max_age)
+    if snapshot is None:
+        ssh = connect(dokku_host, dokku_user)
+        try:
+            statuses = query_status(ssh)
+        except DokkuError as e:
+            console.print(f"[red]Error reading status of {dokku_host}:[/red] {e}")
+            raise typer.Exit(1)
+        snapshot = cache.save(statuses), statuses
+
+    fetched_at, statuses = snapshot
+    if as_json:
+        typer.echo(
+            json.dumps(
+                {
+                    "host": dokku_host,
+                    "fetched_at": fetched_at,
+                    "apps": [asdict(s) for s in statuses],
+                },
+                indent=2,
+            )
+        )
+        return
+    console.print(status_table(dokku_host, statuses, time.time() - fetched_at))
@@ -0,0 +1,143 @@
+import asyncio
+import socket
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from baconstack.utils.wait import (
+    CHECKS,
+    DEFAULT_TIMEOUT,
+    CheckResult,
+    Target,
+    wait_ready,
+)
+
+app = typer.Typer()
+console = Console()
+
+
+def host_addresses(host: str) -> set[str] | None:
+    """Addresses of a Dokku host, which its apps' domains should resolve to"""
+    from baconstack.utils.dokku import split_host
+
+    try:
+        infos = socket.getaddrinfo(split_host(host)[0], None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        console.print(
+            f"[yellow]Could not resolve {host} ({e.strerror}); "
+            "accepting any address for its apps[/yellow]"
+        )
+        return None
+    return {info[4][0] for info in infos}
+
+
+def first_domains(apps: list[str], dokku_host: str, dokku_user: str) -> dict[str, str]:
+    """Each named app's first domain, read from Dokku in one round trip"""
+    from baconstack.utils.dokku import connect, run
+    from baconstack.utils.status import parse_reports
+
+    ssh = connect(dokku_host, dokku_user)
+    result = run(ssh, "sudo dokku domains:report")
+    reports = parse_reports(result.stdout) if result.ok else {}
+    domains = {}
+    for name in apps:
+        vhosts = reports.get(name, {}).get("domains app vhosts", "").split()
+        if not vhosts:
+            console.print(f"[red]No domain found for {name} on {dokku_host}[/red]")
+            raise typer.Exit(1)
+        domains[name] = vhosts[0]
+    return domains
+
+
+def manifest_targets(manifest: Path) -> list[tuple[str, str, str]]:
+    from baconstack.utils.fleet import load_manifest
+
+    try:
+        fleet = load_manifest(manifest)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Invalid fleet manifest {manifest}: {e}[/red]")
+        raise typer.Exit(1)
+    return [(a.name, a.domain, a.host) for a in fleet.apps if a.domain]
+
+
+def show_result(result: CheckResult):
+    status = "[green]ok[/green]" if result.ok else "[red]gave up[/red]"
+    console.print(
+        f"{result.target.name} {result.check}: {status} after "
+        f"{result.attempts} attempts, {result.elapsed:.1f}s ({result.detail})"
+    )
+
+
+@app.command()
+def wait(
+    apps: list[str] = typer.Argument(
+        None, help="Apps to wait for; names with a dot are taken as domains"
+    ),
+    manifest: Path = typer.Option(
+        None, "--from", help="Wait for every app in this fleet manifest"
+    ),
+    dokku_host: str = typer.Option(None, envvar="DOKKU_HOST"),
+    dokku_user: str = typer.Option(
+        None, envvar="DOKKU_HOST_USER", help="Username for Dokku host SSH connection"
+    ),
+    checks: list[str] = typer.Option(
+        None, "--check", help=f"Only run these checks ({', '.join(CHECKS)})"
+    ),
+    path: str = typer.Option("/", help="Path requested by the HTTP check"),
+    timeout: float = typer.Option(DEFAULT_TIMEOUT, help="Seconds to wait in all"),
+):
+    """Wait until apps resolve, serve a valid certificate and answer HTTP"""
+    chosen = tuple(checks or CHECKS)
+    unknown = sorted(set(chosen) - set(CHECKS))
+    if unknown:
+        console.print(
+            f"[red]Unknown checks: {', '.join(unknown)}. "
+            f"Choose from {', '.join(CHECKS)}[/red]"
+        )
+        raise typer.Exit(1)
+
+    # (name, domain, host) for every app
+    wanted = manifest_targets(manifest) if manifest else []
+    names = [name for name in apps or [] if "." not in name]
+    if names and not dokku_host:
+        console.print("[red]--dokku-host is needed to look up app domains[/red]")
+        raise typer.Exit(1)
+    domains = first_domains(names, dokku_host, dokku_user) if names else {}
+    for name in apps or []:
+        wanted.append((name, domains.get(name, name), dokku_host))
+    if not wanted:
+        console.print("[red]Give app names, domains or --from MANIFEST[/red]")
+        raise typer.Exit(1)
+
+    # Domains should point at their Dokku host once DNS has propagated
+    addresses = {host: host_addresses(host) for _, _, host in wanted if host}
+    targets = [
+        Target(name, domain, addresses.get(host), path=path)
+        for name, domain, host in wanted
+    ]
+
+    results = asyncio.run(wait_ready(targets, chosen, timeout, on_result=show_result))
+
+    table = Table(title="Readiness")
+    table.add_column("App")
+    for check in chosen:
+        table.add_column(check)
+    by_target = {}
+    for result in results:
+        by_target.setdefault(result.target.name, {})[result.check] = result
+    for name, outcome in by_target.items():
+        table.add_row(
+            name,
+            *(
+                f"[green]{outcome[c].elapsed:.1f}s[/green]"
+                if outcome[c].ok
+                else "[red]not ready[/red]"
+                for c in chosen
+            ),
+        )
+    console.print(table)
+
+    if not all(result.ok for result in results):
+        raise typer.Exit(1)
@@ -0,0 +1,318 @@
+import json
+import math
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from baconstack.utils.cache import cache_dir, locked, write_atomic
+from baconstack.utils.dokku import DokkuError, run
+
+if TYPE_CHECKING:
+    import paramiko
+
+# Seconds between samples, and samples averaged for each decision
+DEFAULT_INTERVAL = 30.0
+DEFAULT_WINDOW = 4
+# Seconds a process type is left alone after it was scaled
+DEFAULT_COOLDOWN = 300.0
+# Utilisation within this fraction of the target counts as on target
+DEFAULT_TOLERANCE = 0.1
+
+# One line of JSON per running container on the host; the app's are picked out
+# by name, so this single command also works with a sudoers entry limited to it
+STATS_COMMAND = "sudo docker stats --no-stream --format '{{json .}}'"
+
+PERCENT = re.compile(r"^\s*([\d.]+)\s*%\s*$")
+SIZE = re.compile(r"^\s*([\d.]+)\s*([kmgt]?i?b)\s*$", re.IGNORECASE)
+SIZE_UNITS = {
+    f"{prefix}{infix}b": (1024 if infix else 1000) ** power
+    for power, prefix in enumerate(("", "k", "m", "g", "t"))
+    for infix in (("", "i") if prefix else ("",))
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+@dataclass
+class ScalingRule:
+    """How one process type is scaled, from app.json's dokku.autoscale section"""
+
+    process_type: str
+    min: int = 1
+    max: int = 1
+    # Target utilisation per container, in percent; None to ignore the metric
+    cpu: float | None = None
+    memory: float | None = None
+    cooldown: float = DEFAULT_COOLDOWN
+
+    @property
+    def targets(self) -> dict[str, float]:
+        return {
+            metric: target
+            for metric, target in (("cpu", self.cpu), ("memory", self.memory))
+            if target is not None
+        }
+
+
+def load_rules(app_json: dict) -> dict[str, ScalingRule]:
+    """Scaling rules per process type, from app.json's dokku.autoscale, e.g.
+
+    "autoscale": {"web": {"min": 1, "max": 4, "cpu": 70, "cooldown": 300}}
+    """
+    rules = {}
+    for process_type, spec in app_json.get("dokku", {}).get("autoscale", {}).items():
+        unknown = set(spec) - {"min", "max", "cpu", "memory", "cooldown"}
+        if unknown:
+            raise RuleError(
+                f"{process_type}: unknown settings {', '.join(sorted(unknown))}"
+            )
+        try:
+            rule = ScalingRule(
+                process_type,
+                min=int(spec.get("min", 1)),
+                max=int(spec.get("max", spec.get("min", 1))),
+                cpu=float(spec["cpu"]) if "cpu" in spec else None,
+                memory=float(spec["memory"]) if "memory" in spec else None,
+                cooldown=float(spec.get("cooldown", DEFAULT_COOLDOWN)),
+            )
+        except (TypeError, ValueError) as e:
+            raise RuleError(f"{process_type}: {e}") from None
+        if not 0 <= rule.min <= rule.max:
+            raise RuleError(f"{process_type}: need 0 <= min <= max")
+        if not rule.targets:
+            raise RuleError(f"{process_type}: set a cpu or memory target")
+        if any(target <= 0 for target in rule.targets.values()):
+            raise RuleError(f"{process_type}: targets must be above 0%")
+        rules[process_type] = rule
+    return rules
+
+
+@dataclass
+class Sample:
+    """Mean utilisation across one process type's running containers"""
+
+    containers: int
+    cpu: float
+    memory: float
+
+
+@dataclass
+class ContainerStats:
+    """One container's usage as `docker stats` reports it"""
+
+    process_type: str
+    cpu: float  # percent of one core
+    memory: float  # percent of the container's limit, or of the host
+    memory_bytes: int
+
+
+def parse_percent(value: str) -> float:
+    match = PERCENT.match(value)
+    return float(match[1]) if match else 0.0
+
+
+def parse_size(value: str) -> int:
+    """Bytes in a docker size such as "123.4MiB" or "1.2GB"; 0 if unreadable"""
+    match = SIZE.match(value)
+    if not match:
+        return 0
+    return int(float(match[1]) * SIZE_UNITS[match[2].lower()])
+
+
+def container_stats(output: str, app: str) -> list[ContainerStats]:
+    """The app's containers in `docker stats` JSON lines
+
+    Dokku names containers <app>.<process type>.<index>.
+    """
+    name = re.compile(rf"^{re.escape(app)}\.([\w-]+)\.\d+$")
+    containers = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        stats = json.loads(line)
+        match = name.match(stats.get("Name", ""))
+        if match:
+            containers.append(
+                ContainerStats(
+                    match[1],
+                    parse_percent(stats["CPUPerc"]),
+                    parse_percent(stats["MemPerc"]),
+                    parse_size(stats.get("MemUsage", "").split("/")[0]),
+                )
+            )
+    return containers
+
+
+def parse_stats(output: str, app: str) -> dict[str, Sample]:
+    """Samples per process type from `docker stats` JSON lines"""
+    by_type: dict[str, list[ContainerStats]] = {}
+    for container in container_stats(output, app):
+        by_type.setdefault(container.process_type, []).append(container)
+    return {
+        process_type: Sample(
+            len(containers),
+            sum(c.cpu for c in containers) / len(containers),
+            sum(c.memory for c in containers) / len(containers),
+        )
+        for process_type, containers in by_type.items()
+    }
+
+
+def read_stats(ssh: "paramiko.SSHClient") -> str:
+    result = run(ssh, STATS_COMMAND)
+    if not result.ok:
+        raise DokkuError(result.stderr.strip() or result.stdout.strip())
+    return result.stdout
+
+
+def sample(ssh: "paramiko.SSHClient", app: str) -> dict[str, Sample]:
+    return parse_stats(read_stats(ssh), app)
+
+
+@dataclass
+class Decision:
+    process_type: str
+    current: int
+    desired: int
+    reason: str
+
+    @property
+    def changes(self) -> bool:
+        return self.desired != self.current
+
+
+def decide(
+    rule: ScalingRule,
+    current: int,
+    window: list[Sample],
+    seconds_since_scaled: float | None = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> Decision:
+    """How many containers a process type should run
+
+    Each metric asks for current * utilisation / target containers. To scale
+    up, utilisation is the window's mean; to scale down, its peak, so a brief
+    lull doesn't shed capacity. Within `tolerance` of the target nothing
+    changes. The busiest metric wins, and the result is kept within the
+    rule's bounds and cooldown. A process type with no running containers,
+    e.g. of a stopped app, is left alone.
+    """
+    if current == 0:
+        return Decision(rule.process_type, 0, 0, "no running containers")
+
+    wanted, reasons = [], []
+    for metric, target in rule.targets.items():
+        values = [getattr(s, metric) for s in window]
+        if not values:
+            continue
+        mean, peak = sum(values) / len(values), max(values)
+        if mean / target > 1 + tolerance:
+            wanted.append(math.ceil(current * mean / target))
+            reasons.append(f"{metric} {mean:.0f}% > {target:.0f}%")
+        elif peak / target < 1 - tolerance:
+            wanted.append(max(math.ceil(current * peak / target), 1))
+            reasons.append(f"{metric} peak {peak:.0f}% < {target:.0f}%")
+        else:
+            wanted.append(current)
+            reasons.append(f"{metric} {mean:.0f}% on target")
+    if not wanted:
+        reasons.append("no samples")
+    # Scale down only when every metric allows it
+    wanted = max(wanted, default=current)
+    desired = min(max(wanted, rule.min), rule.max)
+    if desired != wanted:
+        reasons.append(f"bounded to {rule.min}..{rule.max}")
+
+    if (
+        desired != current
+        and seconds_since_scaled is not None
+        and seconds_since_scaled < rule.cooldown
+    ):
+        left = rule.cooldown - seconds_since_scaled
+        reasons.append(f"cooling down for {left:.0f}s more")
+        desired = current
+    return Decision(rule.process_type, current, desired, "; ".join(reasons))
+
+
+class ScaleHistory:
+    """When each of an app's process types was last scaled
+
+    Kept on disk, so cooldowns hold across restarts of the autoscaler and
+    across `--once` runs from cron.
+    """
+
+    def __init__(self, host: str, app: str, directory: Path | None = None):
+        self.path = (directory or cache_dir("autoscale")) / f"{host}_{app}.json"
+
+    def load(self) -> dict[str, float]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, process_types: list[str], when: float | None = None):
+        with locked(self.path):
+            scaled = self.load()
+            scaled.update(dict.fromkeys(process_types, when or time.time()))
+            write_atomic(self.path, json.dumps(scaled))
+
+
+@dataclass
+class Autoscaler:
+    """Collects samples per process type and decides from full windows"""
+
+    rules: dict[str, ScalingRule]
+    window: int = DEFAULT_WINDOW
+    tolerance: float = DEFAULT_TOLERANCE
+    samples: dict[str, deque] = field(default_factory=dict)
+    containers: dict[str, int] = field(default_factory=dict)
+
+    def observe(self, samples: dict[str, Sample]):
+        for process_type in self.rules:
+            current = samples.get(process_type, Sample(0, 0.0, 0.0))
+            history = self.samples.setdefault(process_type, deque(maxlen=self.window))
+            if current.containers != self.containers.get(process_type):
+                # Utilisation spread over a different number of containers
+                # says little about the new count; start the window again
+                history.clear()
+                self.containers[process_type] = current.containers
+            if current.containers:
+                history.append(current)
+
+    def ready(self, process_type: str) -> bool:
+        """Whether a decision can be made: a full window, or nothing running"""
+        return (
+            not self.containers.get(process_type)
+            or len(self.samples.get(process_type, ())) >= self.window
+        )
+
+    def decisions(self, last_scaled: dict[str, float], now: float) -> list[Decision]:
+        return [
+            decide(
+                rule,
+                self.containers.get(process_type, 0),
+                list(self.samples.get(process_type, ())),
+                now - last_scaled[process_type]
+                if process_type in last_scaled
+                else None,
+                self.tolerance,
+            )
+            for process_type, rule in self.rules.items()
+            if self.ready(process_type)
+        ]
+
+    def scaled(self, process_types: list[str]):
+        for process_type in process_types:
+            self.samples.pop(process_type, None)
+            self.containers.pop(process_type, None)
+
+
+def scale_command(app: str, decisions: list[Decision]) -> str:
+    """One `ps:scale` for every process type that changes"""
+    counts = " ".join(f"{d.process_type}={d.desired}" for d in decisions)
+    return f"sudo dokku ps:scale {app} {counts}"
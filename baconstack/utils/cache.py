@@ -0,0 +1,47 @@
+import fcntl
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def cache_dir(*parts: str) -> Path:
+    """Return (and create) a directory under the baconstack cache
+
+    Honours BACONSTACK_CACHE_DIR, then XDG_CACHE_HOME.
+    """
+    base = os.getenv("BACONSTACK_CACHE_DIR")
+    if not base:
+        xdg = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+        base = Path(xdg) / "baconstack"
+    path = Path(base, *parts)
+    path.mkdir(parents=True, exist_ok=True, mode=0o700)
+    return path
+
+
+def write_atomic(path: Path, text: str):
+    """Replace path with text, so readers see either the old or new contents
+
+    The text goes to a temp file unique to this writer first, so concurrent
+    writers (e.g. fleet's per-app processes) never share one.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on path across threads and processes
+
+    Use around a read-modify-write of path so concurrent updates aren't lost.
+    """
+    with open(path.with_name(path.name + ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
@@ -0,0 +1,469 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from baconstack.utils.cache import cache_dir, locked, write_atomic
+from baconstack.utils.trace import span
+
+API_URL = "https://api.digitalocean.com/v2"
+# How long a cached zone is trusted before it is revalidated with its ETag
+INDEX_TTL = 300
+# Requests kept in hand when the rate limit runs low, for other callers
+RATE_LIMIT_RESERVE = 10
+DEFAULT_WORKERS = 8
+PAGE_SIZE = 200
+MAX_RETRIES = 5
+# Base delay in seconds, doubled on each retry unless the API says otherwise
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = {500, 502, 503, 504}
+# Safe to resend if the first attempt may or may not have been applied
+IDEMPOTENT_METHODS = {"GET", "PATCH", "DELETE"}
+
+
+class DNSError(RuntimeError):
+    def __init__(self, message: str, response=None):
+        super().__init__(message)
+        # The API's reply, if the request got one
+        self.response = response
+
+
+def split_domain(domain: str) -> tuple[str, str]:
+    """Split a domain into its record name and DigitalOcean zone
+
+    The zone is the last two labels, as setup creates them:
+    "blog.example.com" -> ("blog", "example.com"). Names are lowercased, as
+    DNS compares them case-insensitively.
+    """
+    labels = domain.rstrip(".").lower().split(".")
+    return ".".join(labels[:-2]) or "@", ".".join(labels[-2:])
+
+
+class RateLimit:
+    """DigitalOcean's request budget, as reported by its RateLimit-* headers
+
+    Callers wait() before each request; once the remaining budget drops to
+    the reserve, they sleep until the window resets.
+    """
+
+    def __init__(self, reserve: int = RATE_LIMIT_RESERVE):
+        self.reserve = reserve
+        self.remaining: int | None = None
+        self.reset: float | None = None
+        self.lock = threading.Lock()
+
+    def update(self, headers):
+        try:
+            remaining = int(headers["RateLimit-Remaining"])
+            reset = float(headers["RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self.lock:
+            self.remaining, self.reset = remaining, reset
+
+    def wait(self):
+        with self.lock:
+            if self.remaining is None or self.remaining > self.reserve:
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return
+            delay = (self.reset or 0) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DigitalOceanClient:
+    """Minimal client for the DigitalOcean domains API
+
+    Requests share one keep-alive session. Throttled (429) requests, and
+    idempotent requests that hit a server error or a dropped connection, are
+    retried with exponential backoff, waiting as long as Retry-After or the
+    rate-limit reset asks.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str | None = None,
+        retries: int = MAX_RETRIES,
+        backoff: float = RETRY_BACKOFF,
+        pool_size: int = DEFAULT_WORKERS,
+    ):
+        self.token = token
+        self.base_url = (base_url or os.getenv("DO_API_URL") or API_URL).rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = max(pool_size, 1)
+        self.rate_limit = RateLimit()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.headers["Authorization"] = f"Bearer {self.token}"
+                # One pooled connection per worker that may share this client
+                adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def retry_delay(self, attempt: int, response=None) -> float:
+        """Seconds to wait before retrying, preferring what the API asked for"""
+        headers = response.headers if response is not None else {}
+        try:
+            return max(float(headers["Retry-After"]), 0.0)
+        except (KeyError, TypeError, ValueError):
+            pass
+        if response is not None and response.status_code == 429:
+            try:
+                return max(float(headers["RateLimit-Reset"]) - time.time(), 0.0)
+            except (KeyError, TypeError, ValueError):
+                pass
+        return self.backoff * 2**attempt
+
+    def request(self, method: str, path: str, headers=None, **kwargs):
+        import requests
+
+        url = path if path.startswith("http") else self.base_url + path
+        idempotent = method in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            self.rate_limit.wait()
+            try:
+                with span(f"{method} {path}", "api", attempt=attempt):
+                    response = self.session.request(
+                        method, url, headers=headers, timeout=30, **kwargs
+                    )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt == self.retries:
+                    raise DNSError(f"{method} {path} failed: {e}") from e
+                time.sleep(self.retry_delay(attempt))
+                continue
+
+            self.rate_limit.update(response.headers)
+            retryable = response.status_code == 429 or (
+                idempotent and response.status_code in RETRY_STATUSES
+            )
+            if retryable and attempt < self.retries:
+                time.sleep(self.retry_delay(attempt, response))
+                continue
+            if response.status_code >= 400:
+                raise DNSError(
+                    f"{method} {path} failed ({response.status_code}): {response.text}",
+                    response,
+                )
+            return response
+
+    def _pages(self, response, key: str) -> Iterator[dict]:
+        """Yield `key` items from a listing, fetching each further page
+        (links.pages.next) only once the previous one has been consumed"""
+        while True:
+            data = response.json()
+            yield from data.get(key, [])
+            next_url = data.get("links", {}).get("pages", {}).get("next")
+            if not next_url:
+                return
+            response = self.request("GET", next_url)
+
+    def iter_zones(self) -> Iterator[str]:
+        response = self.request("GET", "/domains", params={"per_page": PAGE_SIZE})
+        for zone in self._pages(response, "domains"):
+            yield zone["name"]
+
+    def list_zones(self) -> list[str]:
+        return list(self.iter_zones())
+
+    def list_records(
+        self, zone: str, etag: str | None = None
+    ) -> tuple[Iterator[dict] | None, str | None]:
+        """Records in a zone and the ETag to revalidate them with
+
+        The records come back as a lazy iterator over the zone's pages, or
+        None if they have not changed since `etag`.
+        """
+        response = self.request(
+            "GET",
+            f"/domains/{zone}/records",
+            headers={"If-None-Match": etag} if etag else None,
+            params={"per_page": PAGE_SIZE},
+        )
+        if response.status_code == 304:
+            return None, etag
+        return self._pages(response, "domain_records"), response.headers.get(
+            "ETag", etag
+        )
+
+    def create_record(self, zone: str, record: dict) -> dict:
+        response = self.request("POST", f"/domains/{zone}/records", json=record)
+        return response.json()["domain_record"]
+
+    def update_record(self, zone: str, record_id: int, changes: dict) -> dict:
+        response = self.request(
+            "PATCH", f"/domains/{zone}/records/{record_id}", json=changes
+        )
+        return response.json()["domain_record"]
+
+    def delete_record(self, zone: str, record_id: int):
+        try:
+            self.request("DELETE", f"/domains/{zone}/records/{record_id}")
+        except DNSError as e:
+            # Already gone, e.g. removed by hand since the index was built
+            if e.response is None or e.response.status_code != 404:
+                raise
+
+
+class RecordIndex:
+    """On-disk index of zone -> records, so lookups don't rescan the account
+
+    Each zone is stored as JSON with the time it was fetched and its ETag.
+    Within `ttl` seconds the cached copy is used as is; after that it is
+    revalidated with If-None-Match and only refetched if it changed. Writes
+    made through the index update the cached copy too.
+    """
+
+    def __init__(
+        self,
+        client: DigitalOceanClient,
+        ttl: float = INDEX_TTL,
+        directory: Path | None = None,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.directory = directory or cache_dir("dns")
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.json"
+
+    def _load(self, name: str) -> dict | None:
+        try:
+            return json.loads(self._path(name).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, name: str, entry: dict):
+        write_atomic(self._path(name), json.dumps(entry))
+
+    def zones(self, refresh: bool = False) -> list[str]:
+        entry = self._load("_zones")
+        if entry and not refresh and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["zones"]
+        zones = self.client.list_zones()
+        self._save("_zones", {"fetched_at": time.time(), "zones": zones})
+        return zones
+
+    def records(self, zone: str, refresh: bool = False) -> list[dict]:
+        entry = self._load(zone)
+        if entry and not refresh and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["records"]
+
+        records, etag = self.client.list_records(
+            zone, etag=entry.get("etag") if entry else None
+        )
+        records = entry["records"] if records is None else list(records)
+        self._save(zone, {"fetched_at": time.time(), "etag": etag, "records": records})
+        return records
+
+    def find(self, zone: str, record_type: str, name: str) -> list[dict]:
+        return [
+            record
+            for record in self.records(zone)
+            if record["type"] == record_type and record["name"].lower() == name.lower()
+        ]
+
+    def _update(self, zone: str, change):
+        with locked(self._path(zone)):
+            entry = self._load(zone)
+            if entry:
+                entry["records"] = change(entry["records"])
+                # The zone changed under the ETag, so it can't be revalidated
+                entry["etag"] = None
+                self._save(zone, entry)
+
+    def create(self, zone: str, record: dict) -> dict:
+        created = self.client.create_record(zone, record)
+        self._update(zone, lambda records: [*records, created])
+        return created
+
+    def update(self, zone: str, record: dict, changes: dict) -> dict:
+        updated = self.client.update_record(zone, record["id"], changes)
+        self._update(
+            zone,
+            lambda records: [
+                updated if r["id"] == record["id"] else r for r in records
+            ],
+        )
+        return updated
+
+    def delete(self, zone: str, record: dict):
+        self.client.delete_record(zone, record["id"])
+        self._update(
+            zone, lambda records: [r for r in records if r["id"] != record["id"]]
+        )
+
+
+def app_records(
+    index: RecordIndex,
+    project_name: str,
+    domains: list[str],
+    target: str,
+    on_missing_zone: Callable[[str], None] = lambda zone: None,
+) -> list[tuple[str, dict]]:
+    """CNAME records pointing at target for an app's domains, as (zone, record)
+
+    Only the zones of the given domains are looked at. If the app has no
+    recorded domains, every zone is searched for a CNAME named after the app.
+    A zone the account doesn't have is passed to on_missing_zone and skipped.
+    """
+    names = [split_domain(d) for d in domains if "." in d]
+    if not names:
+        names = [(project_name, zone) for zone in index.zones()]
+
+    found = []
+    missing = set()
+    for name, zone in names:
+        if zone in missing:
+            continue
+        try:
+            records = index.find(zone, "CNAME", name)
+        except DNSError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            missing.add(zone)
+            on_missing_zone(zone)
+            continue
+        found.extend(
+            (zone, record) for record in records if same_data(record["data"], target)
+        )
+    return found
+
+
+@dataclass(frozen=True)
+class DesiredRecord:
+    zone: str
+    type: str
+    name: str
+    data: str
+
+    @property
+    def fqdn(self) -> str:
+        return self.zone if self.name == "@" else f"{self.name}.{self.zone}"
+
+
+def desired_cname(domain: str, target: str) -> DesiredRecord:
+    """The CNAME pointing an app's domain at its Dokku host"""
+    name, zone = split_domain(domain)
+    return DesiredRecord(zone, "CNAME", name, target.rstrip(".") + ".")
+
+
+def same_data(a: str, b: str) -> bool:
+    return a.rstrip(".").lower() == b.rstrip(".").lower()
+
+
+@dataclass
+class Change:
+    """One API call needed to bring a zone in line with the desired records"""
+
+    action: str  # "create", "update" or "delete"
+    zone: str
+    record: dict
+    desired: DesiredRecord | None = None
+
+    @property
+    def fqdn(self) -> str:
+        name = self.record["name"]
+        return self.zone if name == "@" else f"{name}.{self.zone}"
+
+
+def plan(
+    index: RecordIndex,
+    desired: list[DesiredRecord],
+    prune_targets: set[str] | None = None,
+) -> list[Change]:
+    """Changes needed so each zone holds exactly the desired records
+
+    Each zone is fetched (or revalidated) once. Duplicate records for a
+    desired name are deleted. With prune_targets, CNAMEs pointing at one of
+    those hosts that no desired record accounts for are deleted too.
+    """
+    by_zone: dict[str, list[DesiredRecord]] = defaultdict(list)
+    for record in desired:
+        by_zone[record.zone].append(record)
+
+    changes = []
+    for zone, wanted in by_zone.items():
+        live = index.records(zone, refresh=True)
+        for record in wanted:
+            matches = [
+                r
+                for r in live
+                if r["type"] == record.type and r["name"].lower() == record.name
+            ]
+            if not matches:
+                changes.append(
+                    Change(
+                        "create",
+                        zone,
+                        {"type": record.type, "name": record.name, "data": record.data},
+                        record,
+                    )
+                )
+                continue
+
+            keep = next(
+                (r for r in matches if same_data(r["data"], record.data)), matches[0]
+            )
+            if not same_data(keep["data"], record.data):
+                changes.append(Change("update", zone, keep, record))
+            changes += [Change("delete", zone, r) for r in matches if r is not keep]
+
+        if prune_targets:
+            names = {(r.type, r.name) for r in wanted}
+            changes += [
+                Change("delete", zone, r)
+                for r in live
+                if r["type"] == "CNAME"
+                and (r["type"], r["name"].lower()) not in names
+                and any(same_data(r["data"], target) for target in prune_targets)
+            ]
+    return changes
+
+
+def apply_change(index: RecordIndex, change: Change) -> dict | None:
+    if change.action == "create":
+        return index.create(change.zone, change.record)
+    if change.action == "update":
+        return index.update(change.zone, change.record, {"data": change.desired.data})
+    index.delete(change.zone, change.record)
+    return None
+
+
+def apply(
+    index: RecordIndex,
+    changes: list[Change],
+    workers: int = DEFAULT_WORKERS,
+) -> list[tuple[Change, Exception | None]]:
+    """Apply changes concurrently, pacing requests by the API's rate limit
+
+    Returns each change with the error it raised, if any.
+    """
+
+    def attempt(change: Change) -> tuple[Change, Exception | None]:
+        try:
+            apply_change(index, change)
+            return change, None
+        except Exception as e:
+            return change, e
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        return list(pool.map(attempt, changes))
@@ -0,0 +1,893 @@
+import base64
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import queue
+import re
+import shlex
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from rich.console import Console
+
+from baconstack.utils.cache import cache_dir
+from baconstack.utils.resources import KINDS, display_commands, parse_display
+from baconstack.utils.trace import span, tracer
+
+if TYPE_CHECKING:
+    import paramiko
+
+console = Console()
+
+# Set to any value to route SSH commands through the background broker
+BROKER_ENV = "BACONSTACK_BROKER"
+DEFAULT_IDLE_TIMEOUT = 300.0
+
+# Broker wire format: one-byte frame kind, four-byte payload length, payload.
+# Requests are a single "q" frame holding JSON; the broker answers "k" (ok,
+# optional JSON payload) or "!" (error message), then for exec requests streams
+# "o"/"e" frames with stdout/stderr and a final "x" frame with the exit status.
+FRAME_HEADER = struct.Struct(">cI")
+
+# Remote commands reach the shell as a single `sh -c` argument, which Linux
+# caps at 128 KiB (MAX_ARG_STRLEN); stay well inside it
+CONFIG_SET_LIMIT = 64 * 1024
+
+# Build option through which Dokku apps receive the APT packages to install
+APT_BUILD_ARG = "--build-arg DOKKU_APT_PACKAGES="
+
+# Run on the host against an app's JSON config export: prints a keyed SHA-256
+# of each value, so only digests cross the wire
+CONFIG_DIGEST_SCRIPT = (
+    "import hashlib, hmac, json, sys; key = sys.argv[1].encode(); "
+    "print(json.dumps({k: hmac.new(key, v.encode(), hashlib.sha256).hexdigest() "
+    "for k, v in json.loads(sys.stdin.read() or '{}').items()}))"
+)
+
+
+class DokkuError(RuntimeError):
+    pass
+
+
+class BrokerError(RuntimeError):
+    pass
+
+
+def read_app_json(project_dir: Path) -> dict:
+    """Read and parse app.json file"""
+    app_json_path = project_dir / "app.json"
+    if not app_json_path.exists():
+        return {}
+    return json.loads(app_json_path.read_text())
+
+
+def split_host(host: str) -> tuple[str, int | None]:
+    """Split a "host:port" Dokku host; the port is None when not given"""
+    name, sep, port = host.rpartition(":")
+    if sep and port.isdigit() and ":" not in name:
+        return name, int(port)
+    return host, None
+
+
+def open_ssh(host: str, user: str | None = None) -> "paramiko.SSHClient":
+    """Connect a paramiko client to host, optionally given with a :port suffix"""
+    import paramiko
+
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    hostname, port = split_host(host)
+    if port:
+        ssh.connect(hostname, port=port, username=user)
+    else:
+        ssh.connect(hostname, username=user)
+    # Send each request as soon as it is written, as OpenSSH does; with
+    # Nagle's algorithm every exec after the first waits ~40ms for an ACK
+    ssh.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return ssh
+
+
+def connect(host: str, user: str | None = None):
+    """Connect to a Dokku host
+
+    Returns a paramiko.SSHClient, or a BrokerClient with the same
+    exec_command() interface when BACONSTACK_BROKER is set.
+    """
+    if os.getenv(BROKER_ENV):
+        with span(f"broker connect {host}", "ssh"):
+            return BrokerClient(host, user)
+
+    with span(f"ssh connect {host}", "ssh"):
+        return open_ssh(host, user)
+
+
+@dataclass
+class CommandResult:
+    """Outcome of one remote command"""
+
+    command: str
+    exit_status: int
+    stdout: str = ""
+    stderr: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_status == 0
+
+
+def stream_lines(stdout, stderr, on_line: Callable[[str, str], None]):
+    """Read a command's stdout and stderr at the same time, line by line
+
+    on_line(stream, line) is called as each line arrives, with stream being
+    "stdout" or "stderr", from one thread per stream. Draining both at once
+    keeps a chatty stream from filling its window and stalling the command.
+    """
+
+    def pump(stream, name):
+        for line in iter(stream.readline, ""):
+            on_line(name, line)
+
+    reader = threading.Thread(target=pump, args=(stderr, "stderr"), daemon=True)
+    reader.start()
+    pump(stdout, "stdout")
+    reader.join()
+
+
+def run(
+    ssh: "paramiko.SSHClient",
+    command: str,
+    on_output: Callable[[str, str], None] | None = None,
+    tail: int | None = None,
+) -> CommandResult:
+    """Run a single command on its own channel
+
+    Output is read as it arrives and passed to on_output(stream, line). With
+    `tail`, only the last that many lines of each stream are kept.
+    """
+    kept = {"stdout": deque(maxlen=tail), "stderr": deque(maxlen=tail)}
+
+    def collect(name: str, line: str):
+        kept[name].append(line)
+        if on_output:
+            on_output(name, line)
+
+    with span(command.removeprefix("sudo "), "ssh"):
+        stdin, stdout, stderr = ssh.exec_command(command)
+        stream_lines(stdout, stderr, collect)
+        exit_status = stdout.channel.recv_exit_status()
+    return CommandResult(
+        command, exit_status, "".join(kept["stdout"]), "".join(kept["stderr"])
+    )
+
+
+def batch_script(commands: list[str], marker: str, stop_on_error=False) -> str:
+    """Build a shell script running commands in order with framed output
+
+    Each step is bracketed by marker lines on both stdout and stderr, and the
+    closing stdout marker carries the step's exit status. A newline is written
+    before each closing marker so it always starts a line; the parser drops it.
+    """
+    lines = []
+    for i, command in enumerate(commands):
+        lines += [
+            f"printf '%s begin {i}\\n' {marker}",
+            f"printf '%s begin {i}\\n' {marker} >&2",
+            command,
+            "rc=$?",
+            f"printf '\\n%s end {i} %d\\n' {marker} $rc",
+            f"printf '\\n%s end {i}\\n' {marker} >&2",
+        ]
+        if stop_on_error:
+            lines.append('[ "$rc" -eq 0 ] || exit "$rc"')
+    return "\n".join(lines) + "\n"
+
+
+class BatchOutput:
+    """Incremental parser for one stream of framed batch output
+
+    Lines are routed to the step that printed them as they are fed in. Each
+    step's latest line is held back until the next one arrives, so the newline
+    written before a closing marker can be dropped before anyone sees it.
+    """
+
+    def __init__(
+        self,
+        marker: str,
+        count: int,
+        tail: int | None = None,
+        on_line: Callable[[int, str], None] | None = None,
+    ):
+        self.marker = marker
+        self.lines = [deque(maxlen=tail) for _ in range(count)]
+        # Steps that never ran have a status of None
+        self.statuses: list[int | None] = [None] * count
+        self.on_line = on_line
+        self.current: int | None = None
+        self.pending = ""
+        # When each step's markers arrived, as time.perf_counter() readings
+        self.started: dict[int, float] = {}
+        self.finished: dict[int, float] = {}
+
+    def _emit(self, line: str):
+        if line:
+            self.lines[self.current].append(line)
+            if self.on_line:
+                self.on_line(self.current, line)
+
+    def feed(self, line: str):
+        if not line.startswith(self.marker + " "):
+            if self.current is not None:
+                self._emit(self.pending)
+                self.pending = line
+            return
+
+        _, event, index, *status = line.split()
+        if event == "begin":
+            self.close()
+            self.current = int(index)
+            self.started[self.current] = time.perf_counter()
+        else:
+            self.finished[int(index)] = time.perf_counter()
+            self._emit(self.pending[:-1])
+            self.pending, self.current = "", None
+            if status:
+                self.statuses[int(index)] = int(status[0])
+
+    def close(self):
+        """Flush the last line of a step cut short before its closing marker"""
+        if self.current is not None:
+            self._emit(self.pending)
+        self.pending, self.current = "", None
+
+    def sections(self) -> list[str]:
+        return ["".join(lines) for lines in self.lines]
+
+
+def run_batch(
+    ssh: "paramiko.SSHClient",
+    commands: list[str],
+    stop_on_error=False,
+    on_output: Callable[[int, str, str], None] | None = None,
+    tail: int | None = None,
+) -> list[CommandResult]:
+    """Run a list of commands as one remote script over a single channel
+
+    Returns one CommandResult per command, in order. Commands that did not run
+    (because stop_on_error cut the script short, or it died) have an exit
+    status of -1. Output is streamed to on_output(index, stream, line) as it
+    arrives; with `tail`, only each command's last lines per stream are kept.
+    """
+    if not commands:
+        return []
+
+    marker = f"__baconstack_{uuid.uuid4().hex}"
+    outputs = {
+        name: BatchOutput(
+            marker,
+            len(commands),
+            tail,
+            (lambda i, line, name=name: on_output(i, name, line))
+            if on_output
+            else None,
+        )
+        for name in ("stdout", "stderr")
+    }
+    with span(f"batch of {len(commands)}", "ssh"):
+        stdin, stdout, stderr = ssh.exec_command(
+            batch_script(commands, marker, stop_on_error)
+        )
+        stream_lines(stdout, stderr, lambda name, line: outputs[name].feed(line))
+        stdout.channel.recv_exit_status()
+    for output in outputs.values():
+        output.close()
+
+    # Each command's own time within the batch, from its markers
+    timings = outputs["stdout"]
+    for index, command in enumerate(commands):
+        if index in timings.started and index in timings.finished:
+            tracer.record(
+                command.removeprefix("sudo "),
+                "dokku",
+                timings.started[index],
+                timings.finished[index],
+            )
+
+    statuses = outputs["stdout"].statuses
+    return [
+        CommandResult(command, -1 if status is None else status, out, err)
+        for command, status, out, err in zip(
+            commands,
+            statuses,
+            outputs["stdout"].sections(),
+            outputs["stderr"].sections(),
+        )
+    ]
+
+
+def report_lines(output: str) -> list[str]:
+    """Non-empty lines of Dokku output, without its =====> / -----> headers"""
+    return [
+        line
+        for line in output.splitlines()
+        if line.strip() and not line.lstrip().startswith(("=====>", "----->"))
+    ]
+
+
+@dataclass
+class AppState:
+    """What a Dokku host already has in place for one app"""
+
+    exists: bool
+    vhosts: set[str]
+    mounts: set[str]
+    has_certificate: bool
+    plugins: set[str]
+    build_options: list[str] = field(default_factory=list)
+    # Resource settings by (limit or reserve, process type)
+    resources: dict[tuple[str, str], dict[str, str]] = field(default_factory=dict)
+
+
+def parse_plugin_list(output: str) -> set[str]:
+    # plugin:list indents each plugin under a "plugn: <version>" line
+    return {
+        line.split()[0]
+        for line in output.splitlines()
+        if line.startswith(" ") and line.strip()
+    }
+
+
+def app_state_commands(
+    project_name: str, with_plugins: bool = True, resource_types: list[str] = ()
+) -> list[str]:
+    commands = [
+        "sudo dokku --quiet apps:list",
+        f"sudo dokku domains:report {project_name} --domains-app-vhosts",
+        f"sudo dokku storage:report {project_name} --storage-deploy-mounts",
+        "sudo dokku letsencrypt:list",
+        f"sudo dokku docker-options:report {project_name} --docker-options-build",
+    ]
+    if with_plugins:
+        commands.append("sudo dokku plugin:list")
+    return commands + display_commands(project_name, list(resource_types))
+
+
+def query_app_state(
+    ssh: "paramiko.SSHClient",
+    project_name: str,
+    plugins: set[str] | None = None,
+    resource_types: list[str] = (),
+) -> AppState:
+    """Fetch everything setup needs to know about an app in one round trip
+
+    Pass the host's plugins if they are already known to skip listing them,
+    and the process types whose resource settings are wanted.
+    """
+    results = run_batch(
+        ssh, app_state_commands(project_name, plugins is None, resource_types)
+    )
+    apps, vhosts, mounts, certs, build_options = results[:5]
+    displays = iter(results[6 if plugins is None else 5 :])
+    if plugins is None:
+        plugins = parse_plugin_list(results[5].stdout)
+    resources = {}
+    for process_type in resource_types:
+        for kind in KINDS:
+            result = next(displays)
+            resources[kind, process_type] = (
+                parse_display(result.stdout) if result.ok else {}
+            )
+    # The per-app reports fail when the app does not exist yet
+    mount_tokens = mounts.stdout.split() if mounts.ok else []
+    return AppState(
+        exists=project_name in {line.strip() for line in report_lines(apps.stdout)},
+        vhosts=set(vhosts.stdout.split()) if vhosts.ok else set(),
+        mounts={token for token in mount_tokens if token != "-v"},
+        has_certificate=project_name
+        in {line.split()[0] for line in report_lines(certs.stdout)},
+        plugins=plugins,
+        build_options=parse_docker_options(build_options.stdout)
+        if build_options.ok
+        else [],
+        resources=resources,
+    )
+
+
+def app_domains(ssh: "paramiko.SSHClient", project_name: str) -> list[str]:
+    """Domains Dokku has recorded for an app"""
+    result = run(ssh, f"sudo dokku domains:report {project_name} --domains-app-vhosts")
+    return result.stdout.split() if result.ok else []
+
+
+def config_export(ssh: "paramiko.SSHClient", project_name: str) -> dict[str, str]:
+    """An app's environment, read through Dokku's JSON export"""
+    result = run(ssh, f"sudo dokku config:export --format json {project_name}")
+    if not result.ok:
+        raise DokkuError(result.stderr.strip() or result.stdout.strip())
+    return json.loads(result.stdout or "{}")
+
+
+def config_digest(key: str, value: str) -> str:
+    """Keyed digest of a config value, as CONFIG_DIGEST_SCRIPT computes it"""
+    return hmac.new(key.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def config_digests(
+    ssh: "paramiko.SSHClient", project_name: str, key: str
+) -> dict[str, str]:
+    """Digests of an app's config values, keyed by `key`, in one round trip
+
+    The values themselves never leave the host. A fresh key per call means a
+    digest can't be matched against those of guessed values computed ahead of
+    time. Raises DokkuError if the host has no python3 to compute them with.
+    """
+    result = run(
+        ssh,
+        f"config=$(sudo dokku config:export --format json {project_name}) && "
+        f'printf %s "$config" | python3 -c {shlex.quote(CONFIG_DIGEST_SCRIPT)} '
+        f"{shlex.quote(key)}",
+    )
+    if not result.ok:
+        raise DokkuError(result.stderr.strip() or result.stdout.strip())
+    return json.loads(result.stdout or "{}")
+
+
+def config_set_commands(
+    project_name: str, changes: dict[str, str], limit: int = CONFIG_SET_LIMIT
+) -> list[str]:
+    """`config:set` commands applying changes without restarting the app
+
+    Values are base64 encoded, so quotes, colons and newlines survive the
+    shell. Variables are packed into as few commands as fit within `limit`
+    bytes each; a variable too long for any command still gets one to itself.
+    """
+    prefix = f"sudo dokku config:set --encoded --no-restart {project_name}"
+    commands, command = [], prefix
+    for key, value in changes.items():
+        encoded = base64.b64encode(value.encode()).decode()
+        pair = " " + shlex.quote(f"{key}={encoded}")
+        if command != prefix and len(command) + len(pair) > limit:
+            commands.append(command)
+            command = prefix
+        command += pair
+    if command != prefix:
+        commands.append(command)
+    return commands
+
+
+def normalise_packages(packages: list[str]) -> list[str]:
+    """APT packages sorted and deduplicated, so the build-arg is stable"""
+    return sorted({package.strip() for package in packages if package.strip()})
+
+
+def packages_hash(packages: list[str]) -> str:
+    digest = hashlib.sha256(" ".join(normalise_packages(packages)).encode())
+    return digest.hexdigest()[:12]
+
+
+def parse_docker_options(report: str) -> list[str]:
+    """Split docker-options:report output into the options it joins together
+
+    Options are space separated and each starts with "--", while values
+    (such as an APT package list) never do.
+    """
+    return [option for option in re.split(r" (?=--)", report.strip()) if option]
+
+
+def apt_build_options(options: list[str]) -> list[str]:
+    return [option for option in options if option.startswith(APT_BUILD_ARG)]
+
+
+def apt_packages_commands(
+    project_name: str, packages: list[str], build_options: list[str] = ()
+) -> list[str]:
+    """Commands configuring Dokku to install APT packages at build time
+
+    Packages are normalised and compared by hash with the build-arg already
+    set in `build_options`; if they match there is nothing to do. Otherwise
+    any existing APT build-args are removed before the new one is added, so
+    repeated runs never pile up duplicates.
+    """
+    packages = normalise_packages(packages)
+    existing = apt_build_options(build_options)
+    current = [option.removeprefix(APT_BUILD_ARG).split() for option in existing]
+    if len(current) == (1 if packages else 0) and all(
+        packages_hash(p) == packages_hash(packages) for p in current
+    ):
+        return []
+
+    commands = [
+        f"sudo dokku docker-options:remove {project_name} build {shlex.quote(option)}"
+        for option in existing
+    ]
+    if packages:
+        packages_str = " ".join(packages)
+        commands.append(
+            f"sudo dokku docker-options:add {project_name} build '{APT_BUILD_ARG}{packages_str}'"
+        )
+    return commands
+
+
+def broker_socket_path() -> Path:
+    return Path(os.getenv("BACONSTACK_BROKER_SOCKET") or cache_dir() / "broker.sock")
+
+
+def _send_frame(sock: socket.socket, kind: bytes, payload: bytes = b""):
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes | None:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _recv_frame(sock: socket.socket) -> tuple[bytes | None, bytes]:
+    """Read one frame, returning (None, b"") if the peer hung up"""
+    header = _recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None, b""
+    kind, size = FRAME_HEADER.unpack(header)
+    payload = _recv_exact(sock, size) if size else b""
+    if payload is None:
+        return None, b""
+    return kind, payload
+
+
+class Broker:
+    """Holds authenticated SSH transports per (host, user) behind a Unix socket
+
+    Each exec request opens a new channel on the cached transport, so only the
+    first command for a host pays for key exchange and authentication.
+    Transports with no open channels that have been idle for longer than
+    idle_timeout are closed, and the broker exits once it has no transports
+    and no requests in flight.
+    """
+
+    def __init__(self, socket_path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.idle_timeout = idle_timeout
+        self.clients: dict[tuple[str, str | None], paramiko.SSHClient] = {}
+        self.last_used: dict[tuple[str, str | None], float] = {}
+        # Channels still running a command, per (host, user)
+        self.channels: dict[tuple[str, str | None], int] = {}
+        self.key_locks: dict[tuple[str, str | None], threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.server = None
+
+    def client(self, host: str, user: str | None) -> "paramiko.SSHClient":
+        """Return a connected client for (host, user), reconnecting if needed"""
+        key = (host, user)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            ssh = self.clients.get(key)
+            transport = ssh.get_transport() if ssh else None
+            if transport is None or not transport.is_active():
+                ssh = open_ssh(host, user)
+            with self.lock:
+                self.clients[key] = ssh
+                self.last_used[key] = time.monotonic()
+            return ssh
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {"host": host, "user": user, "idle": now - last_used}
+                for (host, user), last_used in self.last_used.items()
+            ]
+
+    def handle(self, sock: socket.socket):
+        kind, payload = _recv_frame(sock)
+        if kind != b"q":
+            return
+        request = json.loads(payload)
+        op = request.get("op")
+
+        if op == "stop":
+            _send_frame(sock, b"k")
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if op == "status":
+            _send_frame(sock, b"k", json.dumps(self.status()).encode())
+            return
+        if op not in ("connect", "exec"):
+            _send_frame(sock, b"!", f"Unknown broker operation: {op}".encode())
+            return
+
+        key = (request["host"], request.get("user"))
+        # Counted before the client is fetched, so the reaper can't close the
+        # transport between handing it out and the command finishing
+        with self.lock:
+            self.channels[key] = self.channels.get(key, 0) + 1
+        try:
+            try:
+                ssh = self.client(*key)
+                channel = None
+                if op == "exec":
+                    channel = ssh.get_transport().open_session()
+                    channel.exec_command(request["command"])
+            except Exception as e:
+                _send_frame(sock, b"!", str(e).encode())
+                return
+
+            _send_frame(sock, b"k")
+            if channel is not None:
+                self._relay(channel, sock)
+        finally:
+            with self.lock:
+                self.channels[key] -= 1
+                if not self.channels[key]:
+                    del self.channels[key]
+                if key in self.clients:
+                    self.last_used[key] = time.monotonic()
+
+    def _relay(self, channel, sock: socket.socket):
+        """Stream a channel's stdout and stderr to the client, then its exit status"""
+        send_lock = threading.Lock()
+
+        def pump(recv, kind):
+            while data := recv(32768):
+                with send_lock:
+                    _send_frame(sock, kind, data)
+
+        try:
+            stderr_thread = threading.Thread(
+                target=pump, args=(channel.recv_stderr, b"e"), daemon=True
+            )
+            stderr_thread.start()
+            pump(channel.recv, b"o")
+            stderr_thread.join()
+            _send_frame(sock, b"x", str(channel.recv_exit_status()).encode())
+        except OSError:
+            pass  # Client went away; drop the channel
+        finally:
+            channel.close()
+
+    def reap(self):
+        """Close idle transports, and stop the broker once there is nothing left"""
+        interval = max(min(self.idle_timeout / 4, 5.0), 0.05)
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self.lock:
+                for key, last_used in list(self.last_used.items()):
+                    busy = self.channels.get(key)
+                    if not busy and now - last_used > self.idle_timeout:
+                        self.clients.pop(key).close()
+                        del self.last_used[key]
+                idle = (
+                    not self.clients
+                    and not self.active
+                    and now - self.last_activity > self.idle_timeout
+                )
+            if idle:
+                self.server.shutdown()
+                return
+
+    def serve(self):
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with broker.lock:
+                    broker.active += 1
+                try:
+                    broker.handle(self.request)
+                finally:
+                    with broker.lock:
+                        broker.active -= 1
+                        broker.last_activity = time.monotonic()
+
+        if broker_running(self.socket_path):
+            raise BrokerError(f"A broker is already listening on {self.socket_path}")
+        self.socket_path.unlink(missing_ok=True)
+        self.server = socketserver.ThreadingUnixStreamServer(
+            str(self.socket_path), Handler
+        )
+        self.server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        # Remembered so shutdown only removes the socket if it is still ours
+        inode = self.socket_path.stat().st_ino
+        threading.Thread(target=self.reap, daemon=True).start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            try:
+                if self.socket_path.stat().st_ino == inode:
+                    self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+            with self.lock:
+                for ssh in self.clients.values():
+                    ssh.close()
+                self.clients.clear()
+
+
+def broker_running(socket_path: Path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+
+
+def ensure_broker(socket_path: Path | None = None, timeout: float = 5.0) -> Path:
+    """Start the broker in the background unless it is already listening"""
+    socket_path = socket_path or broker_socket_path()
+    if broker_running(socket_path):
+        return socket_path
+
+    # Serialise concurrent starts so only one of them spawns a broker
+    lock_path = socket_path.with_name(socket_path.name + ".lock")
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not broker_running(socket_path):
+            _spawn_broker(socket_path, timeout)
+    return socket_path
+
+
+def _spawn_broker(socket_path: Path, timeout: float):
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "baconstack.cli",
+            "broker",
+            "serve",
+            "--socket",
+            str(socket_path),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if broker_running(socket_path):
+            return
+        time.sleep(0.05)
+    raise BrokerError(f"Broker did not start listening on {socket_path}")
+
+
+def broker_request(socket_path: Path, request: dict) -> tuple[socket.socket, bytes]:
+    """Send a request to the broker, returning the open socket and ack payload"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+        _send_frame(sock, b"q", json.dumps(request).encode())
+        kind, payload = _recv_frame(sock)
+    except OSError as e:
+        sock.close()
+        raise BrokerError(f"Could not reach broker at {socket_path}: {e}") from e
+    if kind != b"k":
+        sock.close()
+        raise BrokerError(payload.decode() or "Broker closed the connection")
+    return sock, payload
+
+
+class BrokerStream:
+    """File-like view of one output stream of a brokered command
+
+    Mirrors paramiko's ChannelFile: read() returns bytes, while readline() and
+    iteration yield decoded lines.
+    """
+
+    def __init__(self, channel: "BrokerChannel"):
+        self.channel = channel
+        self._chunks: queue.Queue[bytes] = queue.Queue()
+        self._buffer = b""
+        self._eof = False
+
+    def _feed(self, data: bytes):
+        self._chunks.put(data)
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._chunks.get()
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def read(self) -> bytes:
+        while self._fill():
+            pass
+        data, self._buffer = self._buffer, b""
+        return data
+
+    def readline(self) -> str:
+        while b"\n" not in self._buffer and self._fill():
+            pass
+        line, sep, self._buffer = self._buffer.partition(b"\n")
+        return (line + sep).decode(errors="replace")
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+
+class BrokerChannel:
+    """Demultiplexes a brokered command's frames into stdout and stderr"""
+
+    def __init__(self, sock: socket.socket):
+        self.stdout = BrokerStream(self)
+        self.stderr = BrokerStream(self)
+        self._exit_status = -1
+        self._done = threading.Event()
+        threading.Thread(target=self._demux, args=(sock,), daemon=True).start()
+
+    def _demux(self, sock: socket.socket):
+        try:
+            while True:
+                kind, payload = _recv_frame(sock)
+                if kind == b"o":
+                    self.stdout._feed(payload)
+                elif kind == b"e":
+                    self.stderr._feed(payload)
+                else:
+                    if kind == b"x":
+                        self._exit_status = int(payload)
+                    break
+        except OSError:
+            pass
+        finally:
+            sock.close()
+            self.stdout._feed(b"")
+            self.stderr._feed(b"")
+            self._done.set()
+
+    def recv_exit_status(self) -> int:
+        self._done.wait()
+        return self._exit_status
+
+
+class BrokerClient:
+    """Stand-in for paramiko.SSHClient that runs commands through the broker"""
+
+    def __init__(
+        self, host: str, user: str | None = None, socket_path: Path | None = None
+    ):
+        self.host = host
+        self.user = user
+        self.socket_path = ensure_broker(socket_path)
+        # Authenticate up front so connection errors surface here, as they
+        # would from SSHClient.connect()
+        sock, _ = broker_request(self.socket_path, self._request("connect"))
+        sock.close()
+
+    def _request(self, op: str, **kwargs) -> dict:
+        return {"op": op, "host": self.host, "user": self.user, **kwargs}
+
+    def exec_command(self, command: str):
+        sock, _ = broker_request(
+            self.socket_path, self._request("exec", command=command)
+        )
+        channel = BrokerChannel(sock)
+        return None, channel.stdout, channel.stderr
+
+    def close(self):
+        pass
@@ -0,0 +1,23 @@
+from pathlib import Path
+
+SENSITIVE_PATTERNS = ["KEY", "SECRET", "PASSWORD", "CREDENTIAL"]
+
+
+def load_env_file(env_file: Path) -> dict[str, str]:
+    """Load environment variables from .env file"""
+    if not env_file.exists():
+        return {}
+
+    from dotenv import dotenv_values
+
+    return dotenv_values(env_file)
+
+
+def is_sensitive(key: str) -> bool:
+    """Whether a variable name looks like it holds a secret"""
+    return any(pattern in key.upper() for pattern in SENSITIVE_PATTERNS)
+
+
+def filter_sensitive_vars(env_vars: dict[str, str]) -> dict[str, str]:
+    """Filter out sensitive variables for display"""
+    return {k: ("*" * 8 if is_sensitive(k) else v) for k, v in env_vars.items()}
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import time
+import tomllib
+from collections import defaultdict, deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 2
+
+
+@dataclass
+class FleetApp:
+    name: str
+    host: str
+    user: str | None = None
+    domain: str | None = None
+
+
+@dataclass
+class Fleet:
+    """Apps and hosts declared in a fleet manifest
+
+    The manifest is TOML with an [[apps]] entry per app (name, host, domain,
+    optionally user) and optional [hosts."<host>"] tables setting `user` and
+    `max_concurrency` for that host. Relative app directories (for app.json)
+    are resolved from the manifest's directory.
+    """
+
+    apps: list[FleetApp]
+    host_limits: dict[str, int]
+    root: Path
+
+
+def load_manifest(path: Path) -> Fleet:
+    data = tomllib.loads(path.read_text())
+    hosts = data.get("hosts", {})
+
+    apps = []
+    for entry in data.get("apps", []):
+        if "name" not in entry:
+            raise ValueError(f"App entry without a name in {path}: {entry}")
+        host = entry.get("host") or os.getenv("DOKKU_HOST")
+        if not host:
+            raise ValueError(f"App {entry['name']} has no host")
+        user = entry.get("user", hosts.get(host, {}).get("user"))
+        apps.append(FleetApp(entry["name"], host, user, entry.get("domain")))
+
+    host_limits = {
+        host: int(config["max_concurrency"])
+        for host, config in hosts.items()
+        if "max_concurrency" in config
+    }
+    return Fleet(apps, host_limits, path.parent)
+
+
+@dataclass
+class FleetJob:
+    """One CLI invocation for one app, and how it went"""
+
+    app: FleetApp
+    args: list[str]
+    status: str = "queued"
+    returncode: int | None = None
+    output: str = ""
+    started: float | None = None
+    finished: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+def cli_runner(cwd: Path, env: dict[str, str]) -> Callable[[FleetJob], tuple]:
+    """Run jobs as separate baconstack processes, capturing their output"""
+
+    def run(job: FleetJob) -> tuple[int, str]:
+        process = subprocess.run(
+            [sys.executable, "-m", "baconstack.cli", *job.args],
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+        )
+        return process.returncode, process.stdout + process.stderr
+
+    return run
+
+
+def run_fleet(
+    jobs: list[FleetJob],
+    runner: Callable[[FleetJob], tuple[int, str]],
+    workers: int = DEFAULT_WORKERS,
+    per_host: int = DEFAULT_PER_HOST,
+    host_limits: dict[str, int] | None = None,
+    on_update: Callable[[], None] = lambda: None,
+):
+    """Run jobs on a bounded pool, never exceeding a host's concurrency cap
+
+    Hosts are served round-robin so one busy host does not hold up the rest.
+    Jobs are updated in place with their status, exit code and output.
+    """
+    host_limits = host_limits or {}
+    pending: dict[str, deque[FleetJob]] = defaultdict(deque)
+    for job in jobs:
+        pending[job.app.host].append(job)
+
+    workers = max(workers, 1)
+    running = {}
+    per_host_running: dict[str, int] = defaultdict(int)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            started = True
+            while started and len(running) < workers:
+                started = False
+                for host in list(pending):
+                    limit = max(host_limits.get(host, per_host), 1)
+                    if len(running) >= workers or per_host_running[host] >= limit:
+                        continue
+                    job = pending[host].popleft()
+                    if not pending[host]:
+                        del pending[host]
+                    per_host_running[host] += 1
+                    job.status = "running"
+                    job.started = time.monotonic()
+                    running[pool.submit(runner, job)] = job
+                    started = True
+            on_update()
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                per_host_running[job.app.host] -= 1
+                try:
+                    job.returncode, job.output = future.result()
+                except Exception as e:
+                    job.returncode, job.output = -1, str(e)
+                job.status = "ok" if job.returncode == 0 else "failed"
+                job.finished = time.monotonic()
+            on_update()
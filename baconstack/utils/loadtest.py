@@ -0,0 +1,403 @@
+import asyncio
+import math
+import ssl
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from urllib.parse import urlsplit
+
+DEFAULT_CONNECTIONS = 10
+DEFAULT_DURATION = 10.0
+DEFAULT_TIMEOUT = 10.0
+# Far beyond what one asyncio process can send; every request is a task
+MAX_RATE = 1_000_000
+# Most connections open-loop mode opens before requests wait for one
+DEFAULT_MAX_CONNECTIONS = 1000
+# Latencies keep this many significant bits, so each is recorded to within
+# 2**(1 - SIGNIFICANT_BITS) of its true value: under 1.6%
+SIGNIFICANT_BITS = 7
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99, "p999": 0.999}
+# Bytes read at a time from response bodies, which are discarded
+READ_SIZE = 64 * 1024
+
+
+class Histogram:
+    """Log-linear histogram of integer values, in the style of HdrHistogram
+
+    Each value is counted in a bucket keeping only its top `bits` significant
+    bits, so relative precision is the same from microseconds to minutes and
+    a run of millions of requests needs at most a few hundred buckets.
+    """
+
+    def __init__(self, bits: int = SIGNIFICANT_BITS):
+        self.bits = bits
+        self.counts: dict[int, int] = {}
+        self.total = 0
+        self.sum = 0
+        self.min: int | None = None
+        self.max = 0
+
+    def bucket(self, value: int) -> int:
+        shift = max(value.bit_length() - self.bits, 0)
+        return value >> shift << shift
+
+    def highest_equivalent(self, bucket: int) -> int:
+        return bucket + (1 << max(bucket.bit_length() - self.bits, 0)) - 1
+
+    def record(self, value: int, count: int = 1):
+        key = self.bucket(value)
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def value_at(self, quantile: float) -> int:
+        """Smallest value at or above `quantile` of those recorded"""
+        if not self.total:
+            return 0
+        rank = max(math.ceil(quantile * self.total), 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self.highest_equivalent(key), self.max)
+        return self.max
+
+    def percentiles(self) -> dict[str, int]:
+        return {name: self.value_at(q) for name, q in PERCENTILES.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "bits": self.bits,
+            "total": self.total,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "counts": {str(key): count for key, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls(data["bits"])
+        histogram.counts = {int(key): count for key, count in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.sum = data["sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+@dataclass
+class Target:
+    """Where requests go, parsed from a URL"""
+
+    url: str
+    scheme: str
+    host: str
+    port: int
+    path: str
+
+    @classmethod
+    def parse(cls, url: str) -> "Target":
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"{url!r} is not an http:// or https:// URL")
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return cls(url, parts.scheme, parts.hostname, port, path)
+
+    @property
+    def host_header(self) -> str:
+        default = 443 if self.scheme == "https" else 80
+        return self.host if self.port == default else f"{self.host}:{self.port}"
+
+
+def build_request(
+    target: Target, method: str = "GET", headers: dict[str, str] | None = None
+) -> bytes:
+    lines = [
+        f"{method} {target.path} HTTP/1.1",
+        f"Host: {target.host_header}",
+        "User-Agent: baconstack-loadtest",
+    ]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def discard(reader: asyncio.StreamReader, size: int):
+    while size > 0:
+        chunk = await reader.read(min(size, READ_SIZE))
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", size)
+        size -= len(chunk)
+
+
+async def read_response(
+    reader: asyncio.StreamReader, method: str = "GET"
+) -> tuple[int, bool]:
+    """Read one response, discarding its body; returns its status and whether
+    the connection can be reused"""
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status_line, *header_lines = head.split("\r\n")
+    version, status = status_line.split()[:2]
+    headers = {}
+    for line in header_lines:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip().lower()
+
+    keep_alive = version == "HTTP/1.1" and headers.get("connection") != "close"
+    status = int(status)
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        pass
+    elif "chunked" in headers.get("transfer-encoding", ""):
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            # Each chunk, the last and empty one included, ends with CRLF
+            await discard(reader, size + 2)
+            if not size:
+                break
+    elif "content-length" in headers:
+        await discard(reader, int(headers["content-length"]))
+    else:
+        # The body runs until the server closes the connection
+        while await reader.read(READ_SIZE):
+            pass
+        keep_alive = False
+    return status, keep_alive
+
+
+class Connection:
+    """One keep-alive connection, reopened whenever the server closes it"""
+
+    def __init__(self, target: Target, context: ssl.SSLContext | None):
+        self.target = target
+        self.context = context if target.scheme == "https" else None
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def request(self, payload: bytes, method: str) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.target.host, self.target.port, ssl=self.context
+            )
+        self.writer.write(payload)
+        await self.writer.drain()
+        status, keep_alive = await read_response(self.reader, method)
+        if not keep_alive:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+@dataclass
+class LoadResult:
+    """What a load test measured; latencies are in microseconds"""
+
+    url: str
+    mode: str
+    connections: int
+    rate: float | None
+    duration: float
+    histogram: Histogram = field(default_factory=Histogram)
+    statuses: dict[str, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    started_at: str = ""
+
+    @property
+    def ok(self) -> int:
+        return self.histogram.total
+
+    @property
+    def requests(self) -> int:
+        return self.ok + sum(self.errors.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.ok / self.duration if self.duration else 0.0
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def response(self, status: int, latency: int):
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if status >= 400:
+            self.error(f"HTTP {status}")
+        else:
+            self.histogram.record(latency)
+
+    def summary(self) -> dict:
+        """Headline numbers, as compared between runs"""
+        return {
+            "requests": self.requests,
+            "ok": self.ok,
+            "errors": sum(self.errors.values()),
+            "throughput": round(self.throughput, 1),
+            "min": self.histogram.min or 0,
+            "mean": round(self.histogram.mean),
+            **self.histogram.percentiles(),
+            "max": self.histogram.max,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "mode": self.mode,
+            "connections": self.connections,
+            "rate": self.rate,
+            "duration": self.duration,
+            "started_at": self.started_at,
+            "summary": self.summary(),
+            "statuses": self.statuses,
+            "errors": self.errors,
+            "latency_us": self.histogram.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoadResult":
+        return cls(
+            data["url"],
+            data["mode"],
+            data["connections"],
+            data["rate"],
+            data["duration"],
+            Histogram.from_dict(data["latency_us"]),
+            data["statuses"],
+            data["errors"],
+            data["started_at"],
+        )
+
+
+async def run_load(
+    url: str,
+    connections: int = DEFAULT_CONNECTIONS,
+    duration: float = DEFAULT_DURATION,
+    rate: float | None = None,
+    open_loop: bool = False,
+    timeout: float = DEFAULT_TIMEOUT,
+    method: str = "GET",
+    headers: dict[str, str] | None = None,
+    context: ssl.SSLContext | None = None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+) -> LoadResult:
+    """Send requests to url for `duration` seconds
+
+    Without a rate, each connection sends its next request as soon as the
+    last one is answered. With one, requests are started on a fixed schedule
+    and their latency counts from when they were due, so a stalled server
+    shows up as queueing delay rather than as fewer, faster samples
+    (coordinated omission). They wait for one of `connections` to be free,
+    unless `open_loop`, where a new connection is opened instead, up to
+    `max_connections`. Requests still waiting for a connection at the end of
+    the run are counted as "no connection" errors. Only successful responses
+    are in the latency histogram; failures are counted by kind. The reported
+    duration stops at the end of the run, not when the last request returns.
+    """
+    target = Target.parse(url)
+    payload = build_request(target, method, headers)
+    context = context or ssl.create_default_context()
+    mode = "closed" if rate is None else "open" if open_loop else "fixed"
+    result = LoadResult(
+        url,
+        mode,
+        connections,
+        rate,
+        duration,
+        started_at=datetime.now(UTC).isoformat(timespec="seconds"),
+    )
+
+    async def send(connection: Connection, due: int):
+        try:
+            status = await asyncio.wait_for(
+                connection.request(payload, method), timeout
+            )
+        except TimeoutError:
+            result.error("timeout")
+            connection.close()
+        except (
+            OSError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ValueError,
+        ) as e:
+            result.error(type(e).__name__)
+            connection.close()
+        else:
+            result.response(status, (time.perf_counter_ns() - due) // 1000)
+
+    started = time.perf_counter_ns()
+    deadline = started + int(duration * 1e9)
+
+    if rate is None:
+
+        async def worker():
+            connection = Connection(target, context)
+            while time.perf_counter_ns() < deadline:
+                await send(connection, time.perf_counter_ns())
+            connection.close()
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    else:
+        idle: asyncio.Queue[Connection] = asyncio.Queue()
+        for _ in range(connections):
+            idle.put_nowait(Connection(target, context))
+        pool = connections
+
+        async def dispatch(due: int):
+            nonlocal pool
+            if open_loop and idle.empty() and pool < max_connections:
+                pool += 1
+                idle.put_nowait(Connection(target, context))
+            try:
+                connection = idle.get_nowait()
+            except asyncio.QueueEmpty:
+                # Wait for one no later than the end of the run
+                wait = max(deadline - time.perf_counter_ns(), 0) / 1e9
+                try:
+                    connection = await asyncio.wait_for(idle.get(), wait)
+                except TimeoutError:
+                    result.error("no connection")
+                    return
+            try:
+                await send(connection, due)
+            finally:
+                idle.put_nowait(connection)
+
+        # Only requests still in flight are kept
+        tasks: set[asyncio.Task] = set()
+        # At least a nanosecond apart, so the schedule always moves on
+        interval = max(int(1e9 / rate), 1)
+        due = started
+        while due < deadline:
+            await asyncio.sleep(max(due - time.perf_counter_ns(), 0) / 1e9)
+            task = asyncio.create_task(dispatch(due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            due += interval
+        await asyncio.gather(*tasks)
+        while not idle.empty():
+            idle.get_nowait().close()
+        result.connections = pool
+
+    result.duration = (min(time.perf_counter_ns(), deadline) - started) / 1e9
+    return result
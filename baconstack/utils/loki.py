@@ -0,0 +1,190 @@
+import json
+import re
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime
+
+from baconstack.utils.trace import span
+
+# Lines asked of Loki per request; each page is all that is held in memory
+PAGE_SIZE = 1000
+# Seconds between polls in follow mode
+FOLLOW_INTERVAL = 2.0
+# Label dokku-loki tags each app's log streams with
+APP_LABEL = "app"
+
+DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+DURATION_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class LokiError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class LogLine:
+    timestamp: int  # nanoseconds since the epoch
+    line: str
+    labels: tuple[tuple[str, str], ...] = ()
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp / 1e9).astimezone()
+
+
+def parse_time(value: str, now: float | None = None) -> int:
+    """Nanosecond timestamp from a duration ago ("15m", "2h", "1d") or an ISO
+    8601 time"""
+    now = time.time() if now is None else now
+    match = DURATION.match(value.strip())
+    if match:
+        seconds = float(match[1]) * DURATION_SECONDS[match[2]]
+        return int((now - seconds) * 1e9)
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(
+            f"{value!r} is neither a duration (e.g. 15m, 2h) nor an ISO 8601 time"
+        ) from None
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return int(moment.timestamp() * 1e9)
+
+
+def _quote(value: str) -> str:
+    # LogQL strings use Go's syntax, which JSON's escaping is a subset of
+    return json.dumps(value)
+
+
+def build_query(
+    selector: dict[str, str],
+    contains: list[str] = (),
+    excludes: list[str] = (),
+    regex: str | None = None,
+) -> str:
+    """LogQL query for streams matching selector, with line filters
+
+    Filters are applied by Loki, so only matching lines leave the server.
+    """
+    query = "{" + ", ".join(f"{k}={_quote(v)}" for k, v in selector.items()) + "}"
+    query += "".join(f" |= {_quote(text)}" for text in contains)
+    query += "".join(f" != {_quote(text)}" for text in excludes)
+    if regex:
+        query += f" |~ {_quote(regex)}"
+    return query
+
+
+class LokiClient:
+    """Minimal client for Loki's query API over one keep-alive session"""
+
+    def __init__(self, url: str, user: str | None = None, password: str | None = None):
+        self.url = url.rstrip("/")
+        self.auth = (user, password or "") if user else None
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+                self._session.auth = self.auth
+            return self._session
+
+    def query_range(
+        self, query: str, start: int, end: int, limit: int = PAGE_SIZE
+    ) -> list[LogLine]:
+        """Up to `limit` lines from [start, end), oldest first"""
+        import requests
+
+        params = {
+            "query": query,
+            "start": start,
+            "end": end,
+            "limit": limit,
+            "direction": "forward",
+        }
+        try:
+            with span("loki query_range", "api"):
+                response = self.session.get(
+                    f"{self.url}/loki/api/v1/query_range", params=params, timeout=60
+                )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise LokiError(f"Could not reach Loki at {self.url}: {e}") from e
+        if response.status_code >= 400:
+            raise LokiError(
+                f"Loki query failed ({response.status_code}): {response.text.strip()}"
+            )
+
+        lines = [
+            LogLine(int(ts), line, tuple(sorted(stream["stream"].items())))
+            for stream in response.json()["data"]["result"]
+            for ts, line in stream["values"]
+        ]
+        # Each stream is in order; interleave them by time
+        lines.sort(key=lambda entry: entry.timestamp)
+        return lines
+
+    def lines(
+        self,
+        query: str,
+        start: int,
+        end: int,
+        page_size: int = PAGE_SIZE,
+        limit: int | None = None,
+    ) -> Iterator[LogLine]:
+        """Every matching line in [start, end), oldest first, a page at a time
+
+        Each page starts at the last timestamp of the one before, as the page
+        may have been cut off part way through the lines sharing it; lines at
+        that timestamp already yielded are skipped. Only one page is held in
+        memory at a time.
+        """
+        seen: set[LogLine] = set()
+        count = 0
+        while start < end:
+            page = self.query_range(query, start, end, page_size)
+            fresh = [entry for entry in page if entry not in seen]
+            for entry in fresh:
+                yield entry
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+            if len(page) < page_size:
+                return
+
+            last = page[-1].timestamp
+            at_last = {entry for entry in page if entry.timestamp == last}
+            if last != start:
+                seen = at_last
+            elif fresh:
+                seen |= at_last
+            else:
+                # More lines share this timestamp than fit in a page, and
+                # Loki has no offset to page through them; move past it
+                last, seen = last + 1, set()
+            start = last
+
+    def follow(
+        self,
+        query: str,
+        start: int,
+        interval: float = FOLLOW_INTERVAL,
+        page_size: int = PAGE_SIZE,
+    ) -> Iterator[LogLine]:
+        """Lines from start onwards as they arrive, polling every `interval`"""
+        seen_at_start: set[LogLine] = set()
+        while True:
+            now = time.time_ns()
+            for entry in self.lines(query, start, now, page_size):
+                if entry in seen_at_start:
+                    continue
+                if entry.timestamp > start:
+                    start, seen_at_start = entry.timestamp, set()
+                seen_at_start.add(entry)
+                yield entry
+            time.sleep(interval)
@@ -0,0 +1,76 @@
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from baconstack.utils.cache import cache_dir, write_atomic
+from baconstack.utils.dokku import DokkuError, parse_plugin_list, run
+
+if TYPE_CHECKING:
+    import paramiko
+
+# Dokku plugins baconstack relies on, by the name plugin:list reports
+PLUGINS = {
+    "letsencrypt": "https://github.com/dokku/dokku-letsencrypt.git",
+    "loki": "https://github.com/dokku/dokku-loki.git",
+}
+# How long a host's plugin list is trusted before plugin:list is run again
+INVENTORY_TTL = 24 * 60 * 60
+
+
+class PluginInventory:
+    """Locally cached list of the plugins installed on a Dokku host
+
+    Plugins are installed host-wide and rarely change, so app-level commands
+    check this list instead of reinstalling plugins every time. It is read
+    with plugin:list at most once per `ttl` seconds, and updated when
+    baconstack installs a plugin itself.
+    """
+
+    def __init__(
+        self, host: str, ttl: float = INVENTORY_TTL, directory: Path | None = None
+    ):
+        self.host = host
+        self.ttl = ttl
+        self.path = (directory or cache_dir("plugins")) / f"{host}.json"
+
+    def cached(self) -> set[str] | None:
+        """Plugins as last seen, or None if the list is missing or stale"""
+        try:
+            entry = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] >= self.ttl:
+            return None
+        return set(entry["plugins"])
+
+    def save(self, plugins: set[str]):
+        write_atomic(
+            self.path,
+            json.dumps({"fetched_at": time.time(), "plugins": sorted(plugins)}),
+        )
+
+    def installed(self, ssh: "paramiko.SSHClient", refresh: bool = False) -> set[str]:
+        plugins = None if refresh else self.cached()
+        if plugins is None:
+            result = run(ssh, "sudo dokku plugin:list")
+            if not result.ok:
+                raise DokkuError(result.stderr.strip() or result.stdout.strip())
+            plugins = parse_plugin_list(result.stdout)
+            self.save(plugins)
+        return plugins
+
+    def add(self, name: str):
+        """Record a plugin baconstack has just installed"""
+        plugins = self.cached()
+        if plugins is not None:
+            self.save(plugins | {name})
+
+
+def install_commands(installed: set[str], names: list[str]) -> list[str]:
+    """plugin:install commands for whichever of the named plugins are missing"""
+    return [
+        f"sudo dokku plugin:install {PLUGINS[name]}"
+        for name in names
+        if name not in installed
+    ]
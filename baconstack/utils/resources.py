@@ -0,0 +1,234 @@
+import math
+import re
+import shlex
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from baconstack.utils.autoscale import ContainerStats
+
+# What Dokku's resource plugin can limit or reserve, each an --<name> option
+RESOURCE_KEYS = (
+    "cpu",
+    "memory",
+    "memory-swap",
+    "network",
+    "network-ingress",
+    "network-egress",
+    "nvidia-gpu",
+)
+KINDS = ("limit", "reserve")
+# Dokku's name for the settings that apply to every process type
+DEFAULT_PROCESS_TYPE = "_default_"
+
+# Suggested memory limits leave this much room above the observed peak,
+# rounded up to a multiple of MEMORY_STEP
+HEADROOM = 1.5
+MEMORY_STEP = 64 * 2**20
+# Peaks above this fraction of a limit are close to hitting it; below
+# OVERSIZED, the limit holds back capacity other apps could use
+NEAR_LIMIT = 0.9
+OVERSIZED = 0.4
+
+MEMORY = re.compile(r"^\s*([\d.]+)\s*([bkmg]?)b?\s*$", re.IGNORECASE)
+MEMORY_UNITS = {"b": 1, "k": 2**10, "m": 2**20, "g": 2**30}
+
+
+class ProfileError(ValueError):
+    pass
+
+
+@dataclass
+class ResourceProfile:
+    """Resource limits and reservations for one process type"""
+
+    process_type: str
+    limit: dict[str, str] = field(default_factory=dict)
+    reserve: dict[str, str] = field(default_factory=dict)
+
+
+def load_profiles(app_json: dict) -> list[ResourceProfile]:
+    """Profiles from app.json's dokku.resources section, e.g.
+
+        "resources": {"web": {"limit": {"cpu": 1, "memory": "512m"}}}
+
+    _default_ applies to process types without a profile of their own.
+    """
+    profiles = []
+    for process_type, spec in app_json.get("dokku", {}).get("resources", {}).items():
+        unknown = set(spec) - set(KINDS)
+        if unknown:
+            raise ProfileError(
+                f"{process_type}: expected limit or reserve, "
+                f"not {', '.join(sorted(unknown))}"
+            )
+        profile = ResourceProfile(process_type)
+        for kind in KINDS:
+            settings = spec.get(kind, {})
+            unknown = set(settings) - set(RESOURCE_KEYS)
+            if unknown:
+                raise ProfileError(
+                    f"{process_type} {kind}: unknown resources "
+                    f"{', '.join(sorted(unknown))}"
+                )
+            setattr(profile, kind, {k: str(v) for k, v in settings.items()})
+        profiles.append(profile)
+    return profiles
+
+
+def resource_command(
+    project_name: str, kind: str, process_type: str, settings: dict[str, str] = None
+) -> str:
+    """`resource:limit` or `resource:reserve`; without settings, it shows them"""
+    command = f"sudo dokku resource:{kind}"
+    if process_type != DEFAULT_PROCESS_TYPE:
+        command += f" --process-type {shlex.quote(process_type)}"
+    for key, value in (settings or {}).items():
+        command += f" --{key} {shlex.quote(value)}"
+    return f"{command} {project_name}"
+
+
+def display_commands(project_name: str, process_types: list[str]) -> list[str]:
+    return [
+        resource_command(project_name, kind, process_type)
+        for process_type in process_types
+        for kind in KINDS
+    ]
+
+
+def parse_display(output: str) -> dict[str, str]:
+    """Settings from `resource:limit`/`resource:reserve` output, which lists
+    "key: value" lines under a =====> header"""
+    settings = {}
+    for line in output.splitlines():
+        key, sep, value = line.strip().partition(":")
+        if sep and not key.startswith("=====>") and value.strip():
+            settings[key.strip()] = value.strip()
+    return settings
+
+
+def same_setting(key: str, have: str, want: str) -> bool:
+    if key.startswith("memory") and parse_memory(want) is not None:
+        return parse_memory(have) == parse_memory(want)
+    return have.lower() == want.lower()
+
+
+def resource_commands(
+    project_name: str,
+    profiles: list[ResourceProfile],
+    current: dict[tuple[str, str], dict[str, str]],
+) -> list[str]:
+    """Commands applying profiles, for (kind, process type)s whose current
+    settings differ
+
+    Settings on the host that a profile does not mention are left as they are.
+    """
+    commands = []
+    for profile in profiles:
+        for kind in KINDS:
+            wanted = getattr(profile, kind)
+            have = current.get((kind, profile.process_type), {})
+            if any(
+                not same_setting(key, have.get(key, ""), value)
+                for key, value in wanted.items()
+            ):
+                commands.append(
+                    resource_command(project_name, kind, profile.process_type, wanted)
+                )
+    return commands
+
+
+def parse_memory(value: str | None) -> int | None:
+    """Bytes in a Dokku memory setting; plain numbers are megabytes"""
+    match = MEMORY.match(value or "")
+    if not match:
+        return None
+    return int(float(match[1]) * MEMORY_UNITS[match[2].lower() or "m"])
+
+
+def format_memory(size: int) -> str:
+    """A memory setting for `size` bytes, in Dokku's megabyte notation"""
+    return f"{math.ceil(size / 2**20)}m"
+
+
+def suggested_memory(peak: int) -> int:
+    return max(math.ceil(peak * HEADROOM / MEMORY_STEP), 1) * MEMORY_STEP
+
+
+@dataclass
+class Usage:
+    """Peak usage seen for one process type, against its effective settings"""
+
+    process_type: str
+    containers: int = 0
+    cpu_peak: float = 0.0  # cores
+    memory_peak: int = 0  # bytes, of the busiest container
+    cpu_limit: float | None = None
+    memory_limit: int | None = None
+    memory_reserve: int | None = None
+
+    @property
+    def advice(self) -> list[str]:
+        notes = []
+        suggestion = format_memory(suggested_memory(self.memory_peak))
+        if self.memory_limit is None:
+            notes.append(f"no memory limit; try {suggestion}")
+        elif self.memory_peak > self.memory_limit * NEAR_LIMIT:
+            notes.append(f"memory near its limit; raise it to {suggestion}")
+        elif self.memory_peak < self.memory_limit * OVERSIZED:
+            notes.append(f"memory oversized; lower it to {suggestion}")
+        if self.cpu_limit is None:
+            notes.append("no cpu limit")
+        elif self.cpu_peak > self.cpu_limit * NEAR_LIMIT:
+            notes.append("cpu near its limit")
+        elif self.cpu_peak < self.cpu_limit * OVERSIZED:
+            notes.append(f"cpu oversized; peak {self.cpu_peak:.2f} cores")
+        return notes
+
+
+def effective(
+    current: dict[tuple[str, str], dict[str, str]],
+    kind: str,
+    process_type: str,
+    key: str,
+) -> str | None:
+    """A process type's own setting, else the app-wide default"""
+    for scope in (process_type, DEFAULT_PROCESS_TYPE):
+        value = current.get((kind, scope), {}).get(key)
+        if value:
+            return value
+    return None
+
+
+def peak_usage(
+    samples: list[list["ContainerStats"]],
+    current: dict[tuple[str, str], dict[str, str]],
+) -> list[Usage]:
+    """Each process type's peaks across samples of its containers, with the
+    settings in effect for it"""
+    usage: dict[str, Usage] = {}
+    for containers in samples:
+        counts: dict[str, int] = {}
+        for container in containers:
+            entry = usage.setdefault(
+                container.process_type, Usage(container.process_type)
+            )
+            entry.cpu_peak = max(entry.cpu_peak, container.cpu / 100)
+            entry.memory_peak = max(entry.memory_peak, container.memory_bytes)
+            counts[container.process_type] = counts.get(container.process_type, 0) + 1
+        for process_type, count in counts.items():
+            usage[process_type].containers = max(usage[process_type].containers, count)
+
+    for entry in usage.values():
+        cpu = effective(current, "limit", entry.process_type, "cpu")
+        try:
+            entry.cpu_limit = float(cpu) if cpu else None
+        except ValueError:
+            entry.cpu_limit = None
+        entry.memory_limit = parse_memory(
+            effective(current, "limit", entry.process_type, "memory")
+        )
+        entry.memory_reserve = parse_memory(
+            effective(current, "reserve", entry.process_type, "memory")
+        )
+    return sorted(usage.values(), key=lambda entry: entry.process_type)
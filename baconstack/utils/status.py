@@ -0,0 +1,140 @@
+import json
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from baconstack.utils.cache import cache_dir, write_atomic
+from baconstack.utils.dokku import DokkuError, report_lines, run_batch
+
+if TYPE_CHECKING:
+    import paramiko
+
+# How long a host's snapshot is served from the cache before Dokku is asked again
+STATUS_TTL = 15
+
+# Run without an app, the reports cover every app on the host
+STATUS_COMMANDS = [
+    "sudo dokku --quiet apps:list",
+    "sudo dokku ps:report",
+    "sudo dokku domains:report",
+    "sudo dokku letsencrypt:list",
+]
+
+REPORT_HEADER = re.compile(r"^=====> (\S+) .*information")
+
+
+@dataclass
+class AppStatus:
+    """What a Dokku host reports about one app"""
+
+    name: str
+    deployed: bool = False
+    running: str = "false"  # "true", "false" or "mixed"
+    processes: dict[str, int] = field(default_factory=dict)
+    domains: list[str] = field(default_factory=list)
+    certificate_expiry: str | None = None
+
+
+def parse_reports(output: str) -> dict[str, dict[str, str]]:
+    """Fields of each app in a `*:report` covering every app
+
+    Fields are keyed by their label in lower case, e.g. "domains app vhosts".
+    """
+    reports: dict[str, dict[str, str]] = {}
+    fields = None
+    for line in output.splitlines():
+        header = REPORT_HEADER.match(line)
+        if header:
+            fields = reports.setdefault(header[1], {})
+            continue
+        label, sep, value = line.strip().partition(":")
+        if fields is not None and sep:
+            fields[label.strip().lower()] = value.strip()
+    return reports
+
+
+def parse_certificates(output: str) -> dict[str, str]:
+    """Certificate expiry by app, from letsencrypt:list"""
+    expiries = {}
+    for line in report_lines(output):
+        fields = line.split()
+        if len(fields) >= 3:
+            expiries[fields[0]] = f"{fields[1]} {fields[2]}"
+    return expiries
+
+
+def process_counts(ps: dict[str, str]) -> dict[str, int]:
+    """Containers per process type, from ps:report's "status <type> <n>" fields"""
+    counts: dict[str, int] = {}
+    for label in ps:
+        parts = label.split()
+        if len(parts) == 3 and parts[0] == "status":
+            counts[parts[1]] = counts.get(parts[1], 0) + 1
+    return counts
+
+
+def query_status(ssh: "paramiko.SSHClient") -> list[AppStatus]:
+    """Status of every app on a host, gathered in one round trip"""
+    apps, ps, domains, certificates = run_batch(ssh, STATUS_COMMANDS)
+    if not apps.ok:
+        raise DokkuError(apps.stderr.strip() or apps.stdout.strip())
+
+    # The reports fail on a host without apps, and letsencrypt:list
+    # without the plugin
+    ps_reports = parse_reports(ps.stdout) if ps.ok else {}
+    domain_reports = parse_reports(domains.stdout) if domains.ok else {}
+    expiries = parse_certificates(certificates.stdout) if certificates.ok else {}
+
+    statuses = []
+    for name in sorted(line.strip() for line in report_lines(apps.stdout)):
+        report = ps_reports.get(name, {})
+        statuses.append(
+            AppStatus(
+                name=name,
+                deployed=report.get("deployed") == "true",
+                running=report.get("running", "false"),
+                processes=process_counts(report),
+                domains=domain_reports.get(name, {})
+                .get("domains app vhosts", "")
+                .split(),
+                certificate_expiry=expiries.get(name),
+            )
+        )
+    return statuses
+
+
+class StatusCache:
+    """Locally cached status snapshot of a Dokku host
+
+    Lets dashboards and scripts poll `status` without an SSH round trip each
+    time: a snapshot younger than the caller's max age is served as is.
+    """
+
+    def __init__(self, host: str, directory: Path | None = None):
+        self.host = host
+        self.path = (directory or cache_dir("status")) / f"{host}.json"
+
+    def cached(
+        self, max_age: float = STATUS_TTL
+    ) -> tuple[float, list[AppStatus]] | None:
+        """When the snapshot was taken and its apps, or None if it is missing
+        or older than max_age"""
+        try:
+            entry = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] >= max_age:
+            return None
+        return entry["fetched_at"], [AppStatus(**app) for app in entry["apps"]]
+
+    def save(self, statuses: list[AppStatus]) -> float:
+        fetched_at = time.time()
+        write_atomic(
+            self.path,
+            json.dumps(
+                {"fetched_at": fetched_at, "apps": [asdict(s) for s in statuses]}
+            ),
+        )
+        return fetched_at
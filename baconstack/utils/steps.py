@@ -0,0 +1,100 @@
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from graphlib import TopologicalSorter
+from typing import Any
+
+from baconstack.utils.trace import span
+
+DEFAULT_CONCURRENCY = 4
+
+
+@dataclass
+class Step:
+    """A unit of provisioning work and the steps it has to wait for
+
+    `run` fails the step by raising or returning False; anything else counts
+    as success. `worker` picks the pool it runs on: "ssh" steps share the
+    concurrency limit, "api" steps run one at a time on the API worker.
+    """
+
+    name: str
+    run: Callable[[], Any]
+    after: tuple[str, ...] = ()
+    worker: str = "ssh"
+
+
+@dataclass
+class StepOutcome:
+    name: str
+    ok: bool
+    result: Any = None
+    error: BaseException | None = None
+    skipped: bool = False
+    elapsed: float = 0.0
+    blocked_by: list[str] = field(default_factory=list)
+
+
+def _run_timed(step: Step) -> tuple[Any, float]:
+    started = time.monotonic()
+    with span(step.name, "step"):
+        result = step.run()
+    return result, time.monotonic() - started
+
+
+def run_steps(
+    steps: list[Step], concurrency: int = DEFAULT_CONCURRENCY
+) -> dict[str, StepOutcome]:
+    """Run steps as a DAG, starting each one as soon as its dependencies succeed
+
+    Independent steps run at the same time, so total latency follows the
+    critical path. Steps whose dependencies failed are skipped.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        unknown = set(step.after) - set(by_name)
+        if unknown:
+            raise ValueError(f"Step {step.name} depends on unknown {sorted(unknown)}")
+
+    sorter = TopologicalSorter({step.name: step.after for step in steps})
+    sorter.prepare()
+
+    outcomes: dict[str, StepOutcome] = {}
+    running = {}
+    pools = {
+        "ssh": ThreadPoolExecutor(max_workers=max(concurrency, 1)),
+        "api": ThreadPoolExecutor(max_workers=1),
+    }
+    try:
+        while sorter.is_active():
+            for name in sorter.get_ready():
+                step = by_name[name]
+                blocked_by = [dep for dep in step.after if not outcomes[dep].ok]
+                if blocked_by:
+                    outcomes[name] = StepOutcome(
+                        name, ok=False, skipped=True, blocked_by=blocked_by
+                    )
+                    sorter.done(name)
+                    continue
+                running[pools[step.worker].submit(_run_timed, step)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result, elapsed = future.result()
+                    outcomes[name] = StepOutcome(
+                        name, ok=result is not False, result=result, elapsed=elapsed
+                    )
+                except Exception as e:
+                    outcomes[name] = StepOutcome(name, ok=False, error=e)
+                sorter.done(name)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    return outcomes
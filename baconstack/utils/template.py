@@ -0,0 +1,369 @@
+import hashlib
+import inspect
+import os
+import re
+import shutil
+import subprocess
+import time
+import tomllib
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+from pathlib import Path
+
+from baconstack.utils.cache import cache_dir
+from baconstack.utils.steps import Step, run_steps
+from baconstack.utils.trace import span
+
+DEFAULT_TEMPLATE = "gh:sebbacon/baconstack-template"
+# How long a mirror is used as is before a background fetch refreshes it
+MIRROR_TTL = 60 * 60
+# Stamp file inside each mirror, touched whenever a fetch is started
+FETCH_STAMP = "baconstack-fetched"
+DEFAULT_WORKERS = os.cpu_count() or 4
+# Tasks a template declares for new to run in parallel, see project_tasks
+TASKS_FILE = ".baconstack-tasks.toml"
+
+PREFIXES = {"gh:": "https://github.com/", "gl:": "https://gitlab.com/"}
+
+
+class TemplateError(RuntimeError):
+    pass
+
+
+def template_url(template: str) -> str | None:
+    """Git URL of a remote template, or None for a local one"""
+    for prefix, base in PREFIXES.items():
+        if template.startswith(prefix):
+            path = template.removeprefix(prefix).lstrip("/")
+            return base + (path if path.endswith(".git") else f"{path}.git")
+    if "://" in template or template.startswith("git@"):
+        return template
+    return None
+
+
+def mirror_path(url: str) -> Path:
+    digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return cache_dir("templates") / f"{digest}.git"
+
+
+def _git(*args: str):
+    try:
+        with span(f"git {args[0]}", "template"):
+            subprocess.run(["git", *args], check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        raise TemplateError(e.stderr.strip() or str(e)) from e
+
+
+def clone_mirror(url: str, path: Path):
+    """Create a bare mirror of url at path
+
+    The clone is made next to path and renamed into place, so a concurrent
+    `new` never sees a half-written mirror.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        _git("clone", "--mirror", "--quiet", url, str(tmp))
+        (tmp / FETCH_STAMP).touch()
+        tmp.rename(path)
+    except OSError:
+        # Fine if another process put its mirror in place first
+        if not path.exists():
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def fetch_mirror(path: Path, background: bool = False):
+    """Bring a mirror up to date, optionally without waiting for it"""
+    (path / FETCH_STAMP).touch()
+    command = ["git", "-C", str(path), "fetch", "--prune", "--quiet"]
+    if background:
+        subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    else:
+        _git(*command[1:])
+
+
+def mirror_age(path: Path) -> float:
+    try:
+        return time.time() - (path / FETCH_STAMP).stat().st_mtime
+    except OSError:
+        return float("inf")
+
+
+def resolve_template(
+    template: str, offline: bool = False, refresh: bool = False
+) -> str:
+    """Source for copier to render `template` from
+
+    Remote templates are rendered from a bare mirror under the cache dir,
+    cloned on first use. A mirror older than MIRROR_TTL is used as is while a
+    background fetch updates it for next time; `refresh` waits for the fetch
+    instead, and `offline` never touches the network. Local templates are
+    returned unchanged.
+    """
+    url = template_url(template)
+    if url is None:
+        return template
+
+    path = mirror_path(url)
+    if not path.exists():
+        if offline:
+            raise TemplateError(
+                f"No cached copy of {template}; run once without --offline"
+            )
+        clone_mirror(url, path)
+    elif refresh and not offline:
+        fetch_mirror(path)
+    elif not offline and mirror_age(path) > MIRROR_TTL:
+        fetch_mirror(path, background=True)
+
+    # A file:// URL makes copier clone the bare mirror as a git repository
+    return path.as_uri()
+
+
+def project_data(
+    project_name: str,
+    framework: str = "fastapi",
+    domain: str | None = None,
+    description: str | None = None,
+    author_name: str | None = None,
+    author_email: str | None = None,
+    use_loki: bool = True,
+) -> dict:
+    """Answers to the template's questions for one project"""
+    return {
+        "framework": framework,
+        "project_name": project_name,
+        "domain": domain or f"{project_name}.example.com",
+        "project_description": description or f"{framework.title()} Web App",
+        "author_name": author_name or "Seb Bacon",
+        "author_email": author_email or "seb.bacon@gmail.com",
+        "use_loki": use_loki,
+    }
+
+
+def load_projects(path: Path, defaults: dict | None = None) -> list[dict]:
+    """Template data for each project in a scaffolding manifest
+
+    The manifest is TOML with a [[projects]] entry per project: a `name` plus
+    any of `new`'s options (framework, domain, description, author_name,
+    author_email, use_loki). Keys in an optional [defaults] table apply to
+    every project, over `defaults`. Other keys are passed to the template as
+    extra data, except `project_name`, which comes from `name`.
+    """
+    data = tomllib.loads(path.read_text())
+    shared = {**(defaults or {}), **data.get("defaults", {})}
+
+    projects, seen = [], set()
+    for entry in data.get("projects", []):
+        entry = {**shared, **entry}
+        name = entry.pop("name", None)
+        if not name:
+            raise ValueError(f"Project entry without a name in {path}: {entry}")
+        if name in seen:
+            raise ValueError(f"Project {name} is listed twice in {path}")
+        seen.add(name)
+        if "project_name" in entry:
+            raise ValueError(
+                f"Project {name} sets project_name in {path}; use name instead"
+            )
+        options = {
+            key: entry.pop(key)
+            for key in list(entry)
+            if key in inspect.signature(project_data).parameters
+        }
+        projects.append({**project_data(name, **options), **entry})
+    return projects
+
+
+def render_project(template: str, source: str, data: dict, quiet: bool = False):
+    """Render one project into ./<project_name> with copier
+
+    Copier runs the template's own `_tasks` as part of this. `source` is where
+    the template is read from (see resolve_template). The answers file records
+    `template` itself, so `copier update` does not depend on this machine's
+    mirror.
+    """
+    from copier import run_copy
+
+    destination = Path(data["project_name"])
+    with span(f"copier {destination}", "template"):
+        run_copy(
+            source,
+            str(destination),
+            data=data,
+            unsafe=True,
+            vcs_ref="HEAD",
+            quiet=quiet,
+        )
+
+    answers = destination / ".copier-answers.yml"
+    if source != template and answers.exists():
+        answers.write_text(
+            re.sub(
+                r"^_src_path: .*$",
+                f"_src_path: {template}",
+                answers.read_text(),
+                count=1,
+                flags=re.MULTILINE,
+            )
+        )
+
+
+def _render_in_worker(
+    template: str, source: str, data: dict, skip: tuple[str, ...]
+) -> tuple[str | None, float]:
+    """Render and finish a project in a pool worker
+
+    Returns the error if it failed, and how long it took.
+    """
+    started = time.monotonic()
+    destination = Path(data["project_name"])
+    if destination.exists():
+        return "directory already exists", 0.0
+    try:
+        render_project(template, source, data, quiet=True)
+        outcomes = run_steps(project_tasks(destination, skip))
+    except Exception as e:
+        return str(e) or type(e).__name__, time.monotonic() - started
+    failed = [o for o in outcomes.values() if not o.ok]
+    error = "; ".join(f"{o.name}: {o.error or 'skipped'}" for o in failed) or None
+    return error, time.monotonic() - started
+
+
+def _import_copier():
+    # Pay for copier's import once per worker rather than once per project
+    import copier  # noqa: F401
+
+
+def render_projects(
+    template: str,
+    source: str,
+    projects: list[dict],
+    workers: int = DEFAULT_WORKERS,
+    skip: tuple[str, ...] = (),
+    on_done: Callable[[dict, str | None, float], None] = lambda *args: None,
+) -> dict[str, str | None]:
+    """Render and finish many projects across a process pool
+
+    Every worker renders from the same resolved `source`. The first project
+    is finished on its own, so its dependency and hook downloads land in the
+    shared uv and pre-commit caches before the rest start at once. Returns
+    each project's error, or None if it was created.
+    """
+    errors: dict[str, str | None] = {}
+    with ProcessPoolExecutor(
+        max_workers=max(min(workers, len(projects)), 1), initializer=_import_copier
+    ) as pool:
+
+        def submit(batch: list[dict]):
+            futures = {
+                pool.submit(_render_in_worker, template, source, data, skip): data
+                for data in batch
+            }
+            for future in as_completed(futures):
+                data = futures[future]
+                try:
+                    error, elapsed = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    error, elapsed = str(e) or type(e).__name__, 0.0
+                errors[data["project_name"]] = error
+                on_done(data, error, elapsed)
+
+        submit(projects[:1])
+        submit(projects[1:])
+    return errors
+
+
+class TaskError(RuntimeError):
+    pass
+
+
+def _task(project_dir: Path, *commands: str | list[str]) -> Callable[[], None]:
+    """Run commands in order: a string through the shell, a list as argv"""
+
+    def run():
+        for command in commands:
+            shell = isinstance(command, str)
+            display = command if shell else " ".join(command)
+            try:
+                with span(display, "task"):
+                    result = subprocess.run(
+                        command,
+                        shell=shell,
+                        cwd=project_dir,
+                        stdin=subprocess.DEVNULL,
+                        capture_output=True,
+                        text=True,
+                    )
+            except FileNotFoundError as e:
+                raise TaskError(f"{command[0]} is not installed") from e
+            if result.returncode != 0:
+                output = (result.stderr or result.stdout).strip().splitlines()
+                raise TaskError(f"{display} failed: " + "\n".join(output[-5:]))
+
+    return run
+
+
+def project_tasks(project_dir: Path, skip: tuple[str, ...] = ()) -> list[Step]:
+    """Steps for the tasks a rendered project declares in TASKS_FILE
+
+    Copier runs a template's `_tasks` one after another while rendering. Work
+    that can overlap goes in TASKS_FILE instead, which copier renders like any
+    other template file:
+
+        [[tasks]]
+        name = "git"
+        run = ["git init -q", "git add -A"]
+
+        [[tasks]]
+        name = "pre-commit"
+        run = [["uv", "tool", "run", "pre-commit", "install", "--install-hooks"]]
+        after = ["git"]
+
+    Each task runs its commands in order, a string through the shell and a
+    list as argv. Tasks run at the same time unless `after` names tasks they
+    have to wait for. Tasks named in `skip` are left out. Returns no steps if
+    the project has no TASKS_FILE.
+    """
+    path = project_dir / TASKS_FILE
+    if not path.exists():
+        return []
+    try:
+        entries = tomllib.loads(path.read_text()).get("tasks", [])
+    except tomllib.TOMLDecodeError as e:
+        raise TaskError(f"Invalid {TASKS_FILE}: {e}") from e
+
+    steps = []
+    for entry in entries:
+        name, commands = entry.get("name"), entry.get("run")
+        if not name or not commands:
+            raise TaskError(f"Task without a name or commands in {TASKS_FILE}")
+        if name in (step.name for step in steps):
+            raise TaskError(f"Task {name} is declared twice in {TASKS_FILE}")
+        steps.append(
+            Step(
+                name, _task(project_dir, *commands), after=tuple(entry.get("after", ()))
+            )
+        )
+
+    names = {step.name for step in steps}
+    for step in steps:
+        unknown = set(step.after) - names
+        if unknown:
+            raise TaskError(
+                f"Task {step.name} waits for unknown tasks: {', '.join(sorted(unknown))}"
+            )
+    return [
+        replace(step, after=tuple(name for name in step.after if name not in skip))
+        for step in steps
+        if step.name not in skip
+    ]
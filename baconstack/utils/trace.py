@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+# Width of the waterfall's bar column, in characters
+WATERFALL_WIDTH = 40
+
+
+@dataclass
+class Span:
+    """One timed operation, in seconds from when tracing started"""
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread: int
+    args: dict = field(default_factory=dict)
+
+
+class Tracer:
+    """Collects spans from any thread while enabled, and costs nothing otherwise"""
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.enabled = True
+
+    def record(self, name: str, category: str, start: float, end: float, **args):
+        """Add a span from two time.perf_counter() readings"""
+        if not self.enabled:
+            return
+        span = Span(
+            name,
+            category,
+            start - self.origin,
+            end - start,
+            threading.get_ident(),
+            args,
+        )
+        with self.lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, category, start, time.perf_counter(), **args)
+
+    def chrome_trace(self) -> dict:
+        """Spans in the Chrome trace event format, as read by Perfetto and
+        chrome://tracing"""
+        threads = {}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round(span.start * 1e6),
+                    "dur": round(span.duration * 1e6),
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {k: str(v) for k, v in span.args.items()},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Path):
+        path.write_text(json.dumps(self.chrome_trace(), indent=1))
+
+    def waterfall(self) -> "Table":
+        """Spans as a table with a bar showing when each ran"""
+        from rich.table import Table
+
+        spans = sorted(self.spans, key=lambda s: s.start)
+        total = max((s.start + s.duration for s in spans), default=0) or 1
+        scale = WATERFALL_WIDTH / total
+
+        table = Table(title=f"Trace ({total:.2f}s)")
+        table.add_column("Span", overflow="fold")
+        table.add_column("Kind")
+        table.add_column("Start", justify="right")
+        table.add_column("Time", justify="right")
+        table.add_column("", no_wrap=True)
+        for span in spans:
+            offset = round(span.start * scale)
+            width = max(round(span.duration * scale), 1)
+            table.add_row(
+                span.name,
+                span.category,
+                f"{span.start:.2f}s",
+                f"{span.duration:.2f}s",
+                " " * offset + "█" * width,
+            )
+        return table
+
+
+tracer = Tracer()
+span = tracer.span
@@ -0,0 +1,182 @@
+import asyncio
+import random
+import socket
+import ssl
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+# What `wait` checks, in the order they are reported
+CHECKS = ("dns", "tls", "http")
+DEFAULT_TIMEOUT = 600.0
+# Retry delays are drawn from [0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)]
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+# Longest a single attempt may take before it counts as failed
+ATTEMPT_TIMEOUT = 10.0
+# Connections open at once across every app, to stay within file limits
+MAX_CONNECTIONS = 100
+
+
+class CheckFailed(Exception):
+    pass
+
+
+@dataclass
+class Target:
+    """An app to wait for"""
+
+    name: str
+    domain: str
+    # Addresses the domain must resolve to, or None for any
+    addresses: set[str] | None = None
+    scheme: str = "https"
+    port: int | None = None
+    path: str = "/"
+
+    @property
+    def url_port(self) -> int:
+        return self.port or (443 if self.scheme == "https" else 80)
+
+
+@dataclass
+class CheckResult:
+    target: Target
+    check: str
+    ok: bool
+    attempts: int
+    elapsed: float
+    detail: str
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP):
+    """Exponential backoff with full jitter, so many waiters spread out"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+async def resolve(host: str) -> set[str]:
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return {info[4][0] for info in infos}
+
+
+async def check_dns(target: Target, context: ssl.SSLContext) -> str:
+    try:
+        addresses = await resolve(target.domain)
+    except socket.gaierror as e:
+        raise CheckFailed(f"does not resolve: {e.strerror}") from e
+    if target.addresses and not addresses & target.addresses:
+        raise CheckFailed(
+            f"resolves to {', '.join(sorted(addresses))}, "
+            f"not {', '.join(sorted(target.addresses))}"
+        )
+    return ", ".join(sorted(addresses))
+
+
+async def check_tls(target: Target, context: ssl.SSLContext) -> str:
+    """The certificate verifies for the domain and has not expired"""
+    try:
+        _, writer = await asyncio.open_connection(
+            target.domain, target.port or 443, ssl=context
+        )
+    except ssl.SSLCertVerificationError as e:
+        raise CheckFailed(e.verify_message or str(e)) from e
+    try:
+        cert = writer.get_extra_info("peercert")
+    finally:
+        writer.close()
+    expires = ssl.cert_time_to_seconds(cert["notAfter"])
+    days = (expires - time.time()) / 86400
+    return f"valid for {days:.0f} more days"
+
+
+async def check_http(target: Target, context: ssl.SSLContext) -> str:
+    """A GET of the target's path answers with a non-error status"""
+    reader, writer = await asyncio.open_connection(
+        target.domain,
+        target.url_port,
+        ssl=context if target.scheme == "https" else None,
+    )
+    try:
+        writer.write(
+            f"GET {target.path} HTTP/1.1\r\nHost: {target.domain}\r\n"
+            "User-Agent: baconstack\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = (await reader.readline()).decode(errors="replace").strip()
+    finally:
+        writer.close()
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise CheckFailed(f"unexpected response {status_line!r}") from None
+    if status >= 400:
+        raise CheckFailed(f"HTTP {status}")
+    return f"HTTP {status}"
+
+
+CHECK_FUNCTIONS: dict[str, Callable[[Target, ssl.SSLContext], Awaitable[str]]] = {
+    "dns": check_dns,
+    "tls": check_tls,
+    "http": check_http,
+}
+
+
+async def _until_ok(
+    target: Target,
+    check: str,
+    deadline: float,
+    context: ssl.SSLContext,
+    connections: asyncio.Semaphore,
+) -> CheckResult:
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        try:
+            async with connections:
+                detail = await asyncio.wait_for(
+                    CHECK_FUNCTIONS[check](target, context),
+                    max(min(ATTEMPT_TIMEOUT, remaining), 0.1),
+                )
+            return CheckResult(
+                target, check, True, attempt, time.monotonic() - started, detail
+            )
+        except (CheckFailed, OSError) as e:
+            # Timeouts are OSErrors too
+            detail = str(e) or type(e).__name__
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return CheckResult(
+                target, check, False, attempt, time.monotonic() - started, detail
+            )
+        await asyncio.sleep(min(backoff_delay(attempt - 1), remaining))
+
+
+async def wait_ready(
+    targets: list[Target],
+    checks: tuple[str, ...] = CHECKS,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_result: Callable[[CheckResult], None] = lambda result: None,
+    context: ssl.SSLContext | None = None,
+) -> list[CheckResult]:
+    """Retry every check for every target at once until each passes or
+    `timeout` seconds have gone by
+
+    Each check backs off on its own, so a slow certificate does not hold up
+    the DNS or HTTP checks of the same app or any other. on_result is called
+    as each check finishes.
+    """
+    context = context or ssl.create_default_context()
+    deadline = time.monotonic() + timeout
+    connections = asyncio.Semaphore(MAX_CONNECTIONS)
+
+    async def run(target: Target, check: str) -> CheckResult:
+        result = await _until_ok(target, check, deadline, context, connections)
+        on_result(result)
+        return result
+
+    return await asyncio.gather(
+        *(run(target, check) for target in targets for check in checks)
+    )
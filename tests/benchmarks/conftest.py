@@ -0,0 +1,105 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+
+import pytest
+
+from tests.emulator import (
+    App,
+    DigitalOceanServer,
+    Dokku,
+    DokkuServer,
+    install_client_key,
+)
+
+# Latency model for the emulated host and API, in seconds
+SSH_RTT = 0.005
+COMMAND_LATENCY = {"*": 0.002, "apps:destroy": 0.02, "ps:restart": 0.02}
+API_LATENCY = 0.005
+
+
+@dataclass
+class Result:
+    command: str
+    apps: int
+    seconds: float
+    execs: int
+    api_calls: int
+
+
+results: list[Result] = []
+
+
+@pytest.fixture
+def record():
+    """Keep a run's numbers for the summary printed at the end"""
+    return lambda *args: results.append(Result(*args))
+
+
+@pytest.fixture(autouse=True)
+def ssh_home(tmp_path, monkeypatch):
+    """A home directory holding the key the emulated host accepts"""
+    home = tmp_path / "home"
+    install_client_key(home)
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.delenv("SSH_AUTH_SOCK", raising=False)
+    monkeypatch.delenv("BACONSTACK_BROKER", raising=False)
+    monkeypatch.chdir(tmp_path)
+    return home
+
+
+@pytest.fixture
+def host():
+    """Build and start an emulated Dokku host with `apps` existing apps"""
+    servers = []
+
+    def start(apps: int = 0) -> DokkuServer:
+        dokku = Dokku(
+            {f"app{i}": App(domains=[f"app{i}.example.com"]) for i in range(apps)},
+            plugins={"letsencrypt", "loki"},
+            latency=COMMAND_LATENCY,
+        )
+        server = DokkuServer(dokku, rtt=SSH_RTT).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Build and start a DigitalOcean stand-in with the given zone records"""
+    servers = []
+
+    def start(records: list[dict]) -> DigitalOceanServer:
+        server = DigitalOceanServer({"example.com": records}, latency=API_LATENCY)
+        server.__enter__()
+        monkeypatch.setenv("DO_API_URL", server.url)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not results:
+        return
+    terminalreporter.section("baconstack benchmarks")
+    terminalreporter.write_line(
+        f"{'command':<10} {'apps':>5} {'seconds':>9} {'per app':>9} "
+        f"{'ssh execs':>10} {'api calls':>10}"
+    )
+    for result in results:
+        terminalreporter.write_line(
+            f"{result.command:<10} {result.apps:>5} {result.seconds:>9.2f} "
+            f"{result.seconds / result.apps:>9.3f} {result.execs:>10} "
+            f"{result.api_calls:>10}"
+        )
+    path = os.getenv("BACONSTACK_BENCHMARK_RESULTS")
+    if path:
+        with open(path, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=1)
@@ -0,0 +1,138 @@
+"""Wall time and round trips for app commands against emulated services
+
+Each command is run once per app, in process, against a local Dokku host
+and DigitalOcean API with the latency model in conftest. A run fails when it
+needs more SSH execs or API calls per app than its budget allows, or takes
+longer than its time budget (scaled by BACONSTACK_BENCHMARK_SLACK on slow
+machines).
+
+Runs cover 1 and 10 apps; set BACONSTACK_BENCHMARK_APPS=1,10,100 for the
+full suite.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+
+runner = CliRunner()
+
+APP_COUNTS = [
+    int(count) for count in os.getenv("BACONSTACK_BENCHMARK_APPS", "1,10").split(",")
+]
+SLACK = float(os.getenv("BACONSTACK_BENCHMARK_SLACK", "1"))
+# Time allowed on top of the per-app budget, for imports and the first connect
+WARMUP = 0.5
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Most a command may cost per app"""
+
+    execs: int
+    api_calls: int
+    seconds: float
+
+
+BUDGETS = {
+    "setup": Budget(execs=5, api_calls=2, seconds=0.35),
+    "env sync": Budget(execs=3, api_calls=0, seconds=0.25),
+    "destroy": Budget(execs=2, api_calls=2, seconds=0.25),
+}
+
+
+def run_for_each(apps: int, args) -> float:
+    """Invoke the CLI once per app, returning the total wall time"""
+    started = time.perf_counter()
+    for i in range(apps):
+        result = runner.invoke(app, args(f"app{i}"))
+        assert result.exit_code == 0, result.output
+    return time.perf_counter() - started
+
+
+def check_budget(command: str, apps: int, seconds: float, execs: int, calls: int):
+    budget = BUDGETS[command]
+    assert execs <= budget.execs * apps, f"{execs} SSH execs"
+    assert calls <= budget.api_calls * apps, f"{calls} API calls"
+    limit = (budget.seconds * apps + WARMUP) * SLACK
+    assert seconds <= limit, f"took {seconds:.2f}s, budget {limit:.2f}s"
+
+
+@pytest.mark.parametrize("apps", APP_COUNTS)
+def test_setup(apps, host, api, record):
+    server = host()
+    dns = api([])
+
+    seconds = run_for_each(
+        apps,
+        lambda name: [
+            "setup",
+            name,
+            f"{name}.example.com",
+            "--dokku-host",
+            server.host,
+            "--dokku-user",
+            "dokku",
+            "--do-token",
+            "token",
+        ],
+    )
+
+    record("setup", apps, seconds, len(server.commands), len(dns.requests))
+    assert len(server.dokku.apps) == apps
+    assert all(a.certificate and a.mounts for a in server.dokku.apps.values())
+    assert len(dns.zones["example.com"]) == apps
+    check_budget("setup", apps, seconds, len(server.commands), len(dns.requests))
+
+
+@pytest.mark.parametrize("apps", APP_COUNTS)
+def test_env_sync(apps, host, tmp_path, record):
+    server = host(apps)
+    env_file = tmp_path / ".env"
+    env_file.write_text("".join(f"VAR_{i}=value {i}\n" for i in range(20)))
+
+    seconds = run_for_each(
+        apps,
+        lambda name: [
+            "env",
+            "sync",
+            name,
+            "--dokku-host",
+            server.host,
+            "--dokku-user",
+            "dokku",
+            "--env-file",
+            str(env_file),
+        ],
+    )
+
+    record("env sync", apps, seconds, len(server.commands), 0)
+    for state in server.dokku.apps.values():
+        assert state.config["VAR_19"] == "value 19"
+        assert state.restarts == 1
+    check_budget("env sync", apps, seconds, len(server.commands), 0)
+
+
+@pytest.mark.parametrize("apps", APP_COUNTS)
+def test_destroy(apps, host, api, record):
+    server = host(apps)
+    dns = api(
+        [
+            {"id": i, "type": "CNAME", "name": f"app{i}", "data": "127.0.0.1."}
+            for i in range(apps)
+        ]
+    )
+
+    seconds = run_for_each(
+        apps,
+        lambda name: ["destroy", name, "--dokku-host", server.host, "--force"],
+    )
+
+    record("destroy", apps, seconds, len(server.commands), len(dns.requests))
+    assert not server.dokku.apps
+    assert not dns.zones["example.com"]
+    check_budget("destroy", apps, seconds, len(server.commands), len(dns.requests))
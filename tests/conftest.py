@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep caches (DNS index, broker socket, ...) out of the real home"""
+    path = tmp_path / "cache"
+    monkeypatch.setenv("BACONSTACK_CACHE_DIR", str(path))
+    return path
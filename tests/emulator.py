@@ -0,0 +1,582 @@
+"""Local stand-ins for a Dokku host and the HTTP APIs baconstack talks to
+
+DokkuServer is a real SSH server (paramiko) that runs each command it is
+sent in a local shell, where `sudo` hands its arguments back to an in-memory
+Dokku. Scripts, framing and streaming therefore behave as they would against
+a real host, with configurable round-trip and per-command latency.
+DigitalOceanServer and LokiServer serve those APIs over HTTP. All of them
+count the round trips made to them.
+"""
+
+import base64
+import functools
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import paramiko
+
+# sudo as seen by commands run on the emulated host: arguments go out on one
+# pipe as NUL-terminated strings ending with an empty one, and the exit
+# status comes back on another once the output files have been written. The
+# pipes are reopened as fds 3 and 4, since dash only redirects fds 0-9.
+SUDO = """\
+exec 3>"/dev/fd/$DOKKU_REQUESTS" 4<"/dev/fd/$DOKKU_REPLIES"
+sudo() {
+  printf '%s\\0' "$@" "" >&3
+  read -r status <&4
+  cat "$DOKKU_OUTPUT/stdout"
+  cat "$DOKKU_OUTPUT/stderr" >&2
+  return "$status"
+}
+"""
+
+PLUGIN_LIST_HEADER = (
+    "plugn: 0.13.0\n"
+    "  00_dokku-standard    0.34.0 enabled    dokku core standard plugin\n"
+)
+
+
+@functools.cache
+def host_key() -> paramiko.PKey:
+    return paramiko.ECDSAKey.generate()
+
+
+def install_client_key(home: Path):
+    """Give `home` an SSH key for paramiko's look_for_keys to find"""
+    ssh_dir = home / ".ssh"
+    ssh_dir.mkdir(parents=True, exist_ok=True)
+    paramiko.ECDSAKey.generate().write_private_key_file(str(ssh_dir / "id_ecdsa"))
+
+
+@dataclass
+class App:
+    domains: list[str] = field(default_factory=list)
+    mounts: list[str] = field(default_factory=list)
+    build_options: list[str] = field(default_factory=list)
+    config: dict[str, str] = field(default_factory=dict)
+    certificate: bool = False
+    restarts: int = 0
+
+
+class DokkuError(Exception):
+    pass
+
+
+class Dokku:
+    """In-memory Dokku answering the subcommands baconstack uses
+
+    `latency` maps subcommands (e.g. "ps:restart") to the seconds they take,
+    with "*" for any other.
+    """
+
+    def __init__(
+        self,
+        apps: dict[str, App] | None = None,
+        plugins: set[str] | None = None,
+        latency: dict[str, float] | None = None,
+    ):
+        self.apps = apps or {}
+        self.plugins = set(plugins or ())
+        self.latency = latency or {}
+        self.calls: list[list[str]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, args: list[str]) -> tuple[str, str, int]:
+        """Run `sudo <args>`, returning stdout, stderr and exit status"""
+        if args[:1] != ["dokku"]:
+            return "", f"sudo: {shlex.join(args)}: not emulated\n", 1
+        args = [arg for arg in args[1:] if arg != "--quiet"]
+        subcommand = args[0] if args else ""
+        time.sleep(self.latency.get(subcommand, self.latency.get("*", 0.0)))
+
+        handler = getattr(self, re.sub(r"\W", "_", subcommand), None)
+        with self.lock:
+            self.calls.append(args)
+            if handler is None:
+                return "", f" !     `{subcommand}` is not a dokku command.\n", 1
+            try:
+                return handler(*args[1:]) or "", "", 0
+            except DokkuError as e:
+                return "", f" !     {e}\n", 1
+            except TypeError:
+                return "", f" !     Invalid arguments for {subcommand}\n", 1
+
+    def app(self, name: str) -> App:
+        if name not in self.apps:
+            raise DokkuError(f"App {name} does not exist")
+        return self.apps[name]
+
+    def apps_list(self):
+        return "".join(f"{name}\n" for name in sorted(self.apps))
+
+    def apps_create(self, name):
+        if name in self.apps:
+            raise DokkuError("Name is already taken")
+        self.apps[name] = App()
+        return f"-----> Creating {name}...\n"
+
+    def apps_destroy(self, name, *flags):
+        self.app(name)
+        del self.apps[name]
+        return f"-----> Destroying {name} (including all add-ons)\n"
+
+    def domains_add(self, name, *domains):
+        app = self.app(name)
+        app.domains += [d for d in domains if d not in app.domains]
+        return "".join(f"-----> Added {d} to {name}\n" for d in domains)
+
+    def domains_report(self, name=None, flag=None):
+        if flag:
+            return " ".join(self.app(name).domains) + "\n"
+        return self.report(
+            "domains",
+            name,
+            lambda app: {
+                "Domains app enabled": "true",
+                "Domains app vhosts": " ".join(app.domains),
+            },
+        )
+
+    def ps_report(self, name=None, flag=None):
+        return self.report(
+            "ps",
+            name,
+            lambda app: {
+                "Deployed": "true",
+                "Processes": "1",
+                "Running": "true",
+                "Status web 1": "running (CID: 0123456789a)",
+            },
+        )
+
+    def report(self, plugin, name, fields):
+        """A `<plugin>:report` for one app, or every app when name is None"""
+        names = [name] if name else sorted(self.apps)
+        lines = []
+        for name in names:
+            lines.append(f"=====> {name} {plugin} information")
+            for label, value in fields(self.app(name)).items():
+                lines.append(f"       {label + ':':<31}{value}")
+        return "".join(f"{line}\n" for line in lines)
+
+    def storage_ensure_directory(self, name):
+        return f"-----> Ensuring /var/lib/dokku/data/storage/{name} exists\n"
+
+    def storage_mount(self, name, mount):
+        app = self.app(name)
+        if mount in app.mounts:
+            raise DokkuError("Mount path already exists.")
+        app.mounts.append(mount)
+
+    def storage_report(self, name, flag):
+        return " ".join(f"-v {mount}" for mount in self.app(name).mounts) + "\n"
+
+    def letsencrypt_list(self):
+        rows = [
+            f"{name:<20} 2099-01-01 00:00:00  89d, 23h\n"
+            for name, app in sorted(self.apps.items())
+            if app.certificate
+        ]
+        header = (
+            "-----> App name           Certificate Expiry        Time before expiry\n"
+        )
+        return header + "".join(rows)
+
+    def letsencrypt_set(self, name, key, value):
+        self.app(name)
+
+    def letsencrypt_enable(self, name):
+        self.app(name).certificate = True
+        return f"-----> Enabling letsencrypt for {name}\n"
+
+    def letsencrypt_auto_renew(self, name):
+        self.app(name)
+
+    def docker_options_report(self, name, flag):
+        return " ".join(self.app(name).build_options) + "\n"
+
+    def docker_options_add(self, name, phase, option):
+        self.app(name).build_options.append(option)
+
+    def docker_options_remove(self, name, phase, option):
+        app = self.app(name)
+        app.build_options = [o for o in app.build_options if o != option]
+
+    def plugin_list(self):
+        return PLUGIN_LIST_HEADER + "".join(
+            f"  {name:<20} 0.1.0 enabled    dokku {name} plugin\n"
+            for name in sorted(self.plugins)
+        )
+
+    def plugin_install(self, url):
+        name = url.rstrip("/").removesuffix(".git").rsplit("/", 1)[-1]
+        self.plugins.add(name.removeprefix("dokku-"))
+        return f"-----> Installing plugin {name}\n"
+
+    def config_export(self, *args):
+        *flags, name = args
+        return json.dumps(self.app(name).config)
+
+    def config_set(self, *args):
+        flags = [arg for arg in args if arg.startswith("--")]
+        name, *pairs = (arg for arg in args if not arg.startswith("--"))
+        app = self.app(name)
+        for pair in pairs:
+            key, _, value = pair.partition("=")
+            if "--encoded" in flags:
+                value = base64.b64decode(value).decode()
+            app.config[key] = value
+        output = "-----> Setting config vars\n"
+        if "--no-restart" not in flags:
+            output += self.ps_restart(name)
+        return output
+
+    def ps_restart(self, name):
+        self.app(name).restarts += 1
+        return f"-----> Restarting {name}\n"
+
+
+class _Interface(paramiko.ServerInterface):
+    def __init__(self, server: "DokkuServer"):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self.server.execute, args=(channel, command.decode()), daemon=True
+        ).start()
+        return True
+
+
+class DokkuServer:
+    """SSH server on localhost emulating a Dokku host
+
+    Every exec request waits `rtt` seconds before it starts, standing in for
+    the network round trip. `connections` and `commands` count what clients
+    asked for.
+    """
+
+    def __init__(self, dokku: Dokku | None = None, rtt: float = 0.0):
+        self.dokku = dokku or Dokku()
+        self.rtt = rtt
+        self.connections = 0
+        self.commands: list[str] = []
+        self.transports: list[paramiko.Transport] = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.listener.getsockname()[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.listener.close()
+        for transport in self.transports:
+            transport.close()
+
+    def reset_counts(self):
+        self.connections = 0
+        self.commands = []
+        self.dokku.calls = []
+
+    def serve(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            # As sshd does; otherwise Nagle holds small packets back ~40ms
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(host_key())
+            transport.start_server(server=_Interface(self))
+            self.transports.append(transport)
+            self.connections += 1
+
+    def execute(self, channel: paramiko.Channel, command: str):
+        """Run a command in a local shell, streaming its output to channel"""
+        self.commands.append(command)
+        time.sleep(self.rtt)
+        requests_r, requests_w = os.pipe()
+        replies_r, replies_w = os.pipe()
+        with tempfile.TemporaryDirectory() as output:
+            process = subprocess.Popen(
+                ["sh", "-c", SUDO + command],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(requests_w, replies_r),
+                env={
+                    **os.environ,
+                    "DOKKU_REQUESTS": str(requests_w),
+                    "DOKKU_REPLIES": str(replies_r),
+                    "DOKKU_OUTPUT": output,
+                },
+            )
+            os.close(requests_w)
+            os.close(replies_r)
+            threads = [
+                threading.Thread(
+                    target=self._answer, args=(requests_r, replies_w, Path(output))
+                ),
+                threading.Thread(
+                    target=self._forward, args=(process.stderr, channel.sendall_stderr)
+                ),
+            ]
+            for thread in threads:
+                thread.start()
+            self._forward(process.stdout, channel.sendall)
+            status = process.wait()
+            for thread in threads:
+                thread.join()
+        channel.send_exit_status(status)
+        channel.close()
+
+    def _answer(self, requests_fd: int, replies_fd: int, output: Path):
+        with (
+            os.fdopen(requests_fd, "rb", buffering=0) as requests,
+            os.fdopen(replies_fd, "wb", buffering=0) as replies,
+        ):
+            buffer, args = b"", []
+            while chunk := requests.read(65536):
+                *tokens, buffer = (buffer + chunk).split(b"\0")
+                for token in tokens:
+                    if token:
+                        args.append(token.decode())
+                        continue
+                    stdout, stderr, status = self.dokku(args)
+                    (output / "stdout").write_text(stdout)
+                    (output / "stderr").write_text(stderr)
+                    replies.write(f"{status}\n".encode())
+                    args = []
+
+    @staticmethod
+    def _forward(stream, send):
+        while data := stream.read1(65536):
+            send(data)
+        stream.close()
+
+
+class JSONServer:
+    """HTTP server on localhost answering requests with JSON from handle()
+
+    Each request waits `latency` seconds; `requests` records them all.
+    """
+
+    # Path every request is made under, left off what handle() sees
+    prefix = ""
+    # Sent with every response
+    headers: dict[str, str] = {}
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests: list[tuple[str, str]] = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{self.prefix}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, method: str, path: str, query: dict, headers, body: dict):
+        """Status, response body and extra headers for one request"""
+        raise NotImplementedError
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def respond(self):
+                url = urlsplit(self.path)
+                path = url.path.removeprefix(server.prefix)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or "{}")
+                time.sleep(server.latency)
+                with server.lock:
+                    server.requests.append((self.command, path))
+                    status, payload, headers = server.handle(
+                        self.command, path, parse_qs(url.query), self.headers, body
+                    )
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in {**server.headers, **headers}.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class DigitalOceanServer(JSONServer):
+    """Stand-in for the DigitalOcean domains API
+
+    Listings are paginated and zone listings carry ETags, as the real API's
+    do.
+    """
+
+    prefix = "/v2"
+    headers = {"RateLimit-Remaining": "5000", "RateLimit-Reset": "0"}
+
+    def __init__(
+        self,
+        zones: dict[str, list[dict]] | None = None,
+        latency: float = 0.0,
+        page_size: int = 200,
+    ):
+        super().__init__(latency)
+        self.zones = {
+            zone: [dict(record) for record in records]
+            for zone, records in (zones or {}).items()
+        }
+        self.versions = dict.fromkeys(self.zones, 1)
+        self.page_size = page_size
+        self.next_id = 1000
+
+    def page(self, path: str, query: dict, key: str, items: list) -> dict:
+        per_page = min(int(query.get("per_page", ["20"])[0]), self.page_size)
+        number = int(query.get("page", ["1"])[0])
+        body = {key: items[(number - 1) * per_page : number * per_page]}
+        body["meta"] = {"total": len(items)}
+        body["links"] = {}
+        if number * per_page < len(items):
+            next_url = f"{self.url}{path}?per_page={per_page}&page={number + 1}"
+            body["links"] = {"pages": {"next": next_url}}
+        return body
+
+    def handle(self, method: str, path: str, query: dict, headers, body: dict):
+        match path.strip("/").split("/"):
+            case ["domains"] if method == "GET":
+                zones = [{"name": zone} for zone in sorted(self.zones)]
+                return 200, self.page(path, query, "domains", zones), {}
+            case ["domains", zone, "records", *rest] if zone in self.zones:
+                return self.handle_records(
+                    method, path, query, headers, body, zone, rest
+                )
+        return 404, {"id": "not_found", "message": "The resource was not found."}, {}
+
+    def handle_records(self, method, path, query, headers, body, zone, rest):
+        records = self.zones[zone]
+        etag = f'"{zone}-{self.versions[zone]}"'
+        if method == "GET" and not rest:
+            if headers.get("If-None-Match") == etag:
+                return 304, None, {"ETag": etag}
+            return (
+                200,
+                self.page(path, query, "domain_records", records),
+                {"ETag": etag},
+            )
+        if method == "POST" and not rest:
+            record = {**body, "id": self.next_id}
+            self.next_id += 1
+            records.append(record)
+            self.versions[zone] += 1
+            return 201, {"domain_record": record}, {}
+
+        record = next((r for r in records if [str(r["id"])] == rest), None)
+        if record is None:
+            return 404, {"id": "not_found", "message": "Record not found."}, {}
+        if method == "PATCH":
+            record.update(body)
+            self.versions[zone] += 1
+            return 200, {"domain_record": record}, {}
+        if method == "DELETE":
+            records.remove(record)
+            self.versions[zone] += 1
+            return 204, None, {}
+        return 405, {"id": "method_not_allowed", "message": method}, {}
+
+
+class LokiServer(JSONServer):
+    """Stand-in for Loki's query_range API
+
+    `streams` maps each stream's labels to its (nanosecond timestamp, line)
+    entries. Label selectors and |=, != and |~ line filters are honoured, and
+    at most `limit` entries are returned, oldest first.
+    """
+
+    def __init__(
+        self, streams: dict[tuple[tuple[str, str], ...], list[tuple[int, str]]]
+    ):
+        super().__init__()
+        self.streams = streams
+
+    def handle(self, method: str, path: str, query: dict, headers, body: dict):
+        if path != "/loki/api/v1/query_range":
+            return 404, {"message": "not found"}, {}
+        logql = query["query"][0]
+        start, end = int(query["start"][0]), int(query["end"][0])
+        limit = int(query["limit"][0])
+
+        selector, _, pipeline = logql.partition("}")
+        wanted = set(re.findall(r'(\w+)="([^"]*)"', selector))
+        filters = [
+            (op, json.loads(text))
+            for op, text in re.findall(r'(\|=|!=|\|~) ("(?:[^"\\]|\\.)*")', pipeline)
+        ]
+
+        def keep(line: str) -> bool:
+            checks = {
+                "|=": lambda text: text in line,
+                "!=": lambda text: text not in line,
+                "|~": lambda text: re.search(text, line),
+            }
+            return all(checks[op](text) for op, text in filters)
+
+        entries = sorted(
+            (ts, labels, line)
+            for labels, values in self.streams.items()
+            if wanted <= set(labels)
+            for ts, line in values
+            if start <= ts < end and keep(line)
+        )[:limit]
+        result: dict[tuple, list] = {}
+        for ts, labels, line in entries:
+            result.setdefault(labels, []).append([str(ts), line])
+        streams = [
+            {"stream": dict(labels), "values": values}
+            for labels, values in result.items()
+        ]
+        data = {"resultType": "streams", "result": streams}
+        return 200, {"status": "success", "data": data}, {}
@@ -0,0 +1,111 @@
+import io
+import shlex
+import subprocess
+from unittest.mock import MagicMock
+
+from baconstack.utils.dns import DNSError
+
+
+class FakeStream(io.BytesIO):
+    """Bytes stream standing in for a paramiko ChannelFile
+
+    read() returns bytes while readline() and iteration yield text lines, as
+    paramiko's do, and `channel` exposes the command's exit status.
+    """
+
+    def __init__(self, data: bytes, exit_status: int):
+        super().__init__(data)
+        self.channel = MagicMock()
+        self.channel.recv_exit_status.return_value = exit_status
+
+    def readline(self, *args):
+        return super().readline(*args).decode()
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+def remote_shell(responses=None, default=("Success", "", 0)):
+    """Build an exec_command replacement that runs commands in a local shell
+
+    `sudo` is replaced by a shell function answering with the first entry of
+    `responses` (substring -> (stdout, stderr, exit status)) that matches its
+    arguments, so batched scripts are executed and framed for real.
+    """
+    cases = []
+    for pattern, (out, err, status) in {**(responses or {}), "": default}.items():
+        cases.append(
+            f"*{shlex.quote(pattern)}*) printf %s {shlex.quote(out)}; "
+            f"printf %s {shlex.quote(err)} >&2; return {status};;"
+        )
+    sudo = 'sudo() { case "$*" in\n' + "\n".join(cases) + "\nesac; }\n"
+
+    def exec_command(command):
+        process = subprocess.run(
+            ["sh", "-c", sudo + command], capture_output=True, check=False
+        )
+        return (
+            None,
+            FakeStream(process.stdout, process.returncode),
+            FakeStream(process.stderr, process.returncode),
+        )
+
+    return exec_command
+
+
+class FakeDigitalOcean:
+    """In-memory stand-in for DigitalOceanClient, counting API requests"""
+
+    def __init__(self, zones: dict[str, list[dict]]):
+        self.zones = {
+            zone: [dict(record) for record in records]
+            for zone, records in zones.items()
+        }
+        self.versions = {zone: 1 for zone in zones}
+        self.requests = []
+        self.not_modified = 0
+        self.next_id = 1000
+
+    def list_zones(self):
+        self.requests.append(("GET", "/domains"))
+        return list(self.zones)
+
+    def list_records(self, zone, etag=None):
+        self.requests.append(("GET", f"/domains/{zone}/records"))
+        if zone not in self.zones:
+            raise DNSError(
+                f"GET /domains/{zone}/records failed (404)",
+                MagicMock(status_code=404),
+            )
+        current = f'"{zone}-{self.versions[zone]}"'
+        if etag == current:
+            self.not_modified += 1
+            return None, etag
+        return [dict(record) for record in self.zones[zone]], current
+
+    def create_record(self, zone, record):
+        self.requests.append(("POST", f"/domains/{zone}/records"))
+        self.next_id += 1
+        created = {"id": self.next_id, "ttl": 1800, **record}
+        self.zones[zone].append(created)
+        self.versions[zone] += 1
+        return created
+
+    def update_record(self, zone, record_id, changes):
+        self.requests.append(("PATCH", f"/domains/{zone}/records/{record_id}"))
+        for record in self.zones[zone]:
+            if record["id"] == record_id:
+                record.update(changes)
+                self.versions[zone] += 1
+                return dict(record)
+
+    def delete_record(self, zone, record_id):
+        self.requests.append(("DELETE", f"/domains/{zone}/records/{record_id}"))
+        self.zones[zone] = [r for r in self.zones[zone] if r["id"] != record_id]
+        self.versions[zone] += 1
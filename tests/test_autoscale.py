@@ -0,0 +1,117 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.autoscale import (
+    RuleError,
+    Sample,
+    ScalingRule,
+    decide,
+    load_rules,
+    parse_stats,
+)
+from tests.fakes import remote_shell
+
+runner = CliRunner()
+
+WEB = ScalingRule("web", min=1, max=6, cpu=50, cooldown=300)
+
+
+def stats_line(name, cpu, memory):
+    return json.dumps({"Name": name, "CPUPerc": f"{cpu}%", "MemPerc": f"{memory}%"})
+
+
+def test_load_rules():
+    rules = load_rules(
+        {"dokku": {"autoscale": {"web": {"min": 2, "max": 5, "memory": 80}}}}
+    )
+    assert rules["web"] == ScalingRule("web", 2, 5, None, 80.0, 300.0)
+    assert load_rules({}) == {}
+
+    for spec in ({"min": 3, "max": 2, "cpu": 50}, {"max": 2}, {"cpu": 50, "rps": 9}):
+        with pytest.raises(RuleError):
+            load_rules({"dokku": {"autoscale": {"web": spec}}})
+
+
+def test_parse_stats_picks_out_the_apps_containers():
+    output = "\n".join(
+        [
+            stats_line("blog.web.1", "80.00", "10.0"),
+            stats_line("blog.web.2", "40.00", "30.0"),
+            stats_line("blog.worker.1", "5.5", "50"),
+            stats_line("blog-admin.web.1", "99", "99"),
+            stats_line("dokku.minio.storage", "99", "99"),
+        ]
+    )
+    assert parse_stats(output, "blog") == {
+        "web": Sample(2, 60.0, 20.0),
+        "worker": Sample(1, 5.5, 50.0),
+    }
+
+
+def test_decide_scales_up_on_the_mean_and_down_on_the_peak():
+    busy = [Sample(2, 90, 0), Sample(2, 110, 0)]
+    assert decide(WEB, 2, busy).desired == 4
+
+    # A single busy sample holds back a scale down
+    mostly_idle = [Sample(2, 10, 0), Sample(2, 48, 0)]
+    assert decide(WEB, 2, mostly_idle).desired == 2
+    assert decide(WEB, 4, [Sample(4, 10, 0), Sample(4, 20, 0)]).desired == 2
+
+    # Near the target nothing changes
+    assert decide(WEB, 3, [Sample(3, 54, 0)]).desired == 3
+
+
+def test_decide_respects_bounds_and_cooldown():
+    assert decide(WEB, 5, [Sample(5, 100, 0)]).desired == 6
+
+    # A stopped app isn't started up to min
+    decision = decide(WEB, 0, [])
+    assert decision.desired == 0
+    assert decision.reason == "no running containers"
+
+    decision = decide(WEB, 2, [Sample(2, 100, 0)], seconds_since_scaled=60)
+    assert decision.desired == 2
+    assert "cooling down for 240s more" in decision.reason
+
+    # Every metric must allow a scale down
+    both = ScalingRule("web", 1, 6, cpu=50, memory=50)
+    assert decide(both, 4, [Sample(4, 10, 60)]).desired == 5
+
+
+def test_autoscale_command(tmp_path):
+    rules = {"dokku": {"autoscale": {"web": {"min": 1, "max": 4, "cpu": 50}}}}
+    (tmp_path / "app.json").write_text(json.dumps(rules))
+    stats = "\n".join(stats_line(f"blog.web.{i}", 95, 10) for i in (1, 2)) + "\n"
+    args = [
+        "autoscale",
+        "blog",
+        "--dokku-host",
+        "dokku.example.com",
+        "--project-dir",
+        str(tmp_path),
+        "--once",
+        "--window",
+        "1",
+    ]
+
+    with patch("paramiko.SSHClient") as mock_ssh:
+        exec_command = mock_ssh.return_value.exec_command
+        exec_command.side_effect = remote_shell({"docker stats": (stats, "", 0)})
+
+        result = runner.invoke(app, [*args, "--dry-run"])
+        assert result.exit_code == 0, result.output
+        assert "web: would scale 2 -> 4" in result.output
+        assert exec_command.call_count == 1
+
+        result = runner.invoke(app, args)
+        assert result.exit_code == 0, result.output
+        assert exec_command.call_args.args[0] == "sudo dokku ps:scale blog web=4"
+
+        # Straight away again, the cooldown holds
+        result = runner.invoke(app, args)
+        assert "cooling down" in result.output
+        assert "ps:scale" not in exec_command.call_args.args[0]
@@ -0,0 +1,154 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from baconstack.utils.dokku import (
+    Broker,
+    BrokerClient,
+    BrokerError,
+    broker_running,
+    ensure_broker,
+)
+
+
+def fake_channel(stdout=b"", stderr=b"", status=0):
+    """Mock paramiko.Channel that yields its output once, then EOF"""
+    channel = MagicMock()
+    channel.recv.side_effect = [stdout, b""] if stdout else [b""]
+    channel.recv_stderr.side_effect = [stderr, b""] if stderr else [b""]
+    channel.recv_exit_status.return_value = status
+    return channel
+
+
+@pytest.fixture
+def mock_ssh():
+    with patch("paramiko.SSHClient") as mock:
+        mock.return_value.get_transport.return_value.is_active.return_value = True
+        yield mock
+
+
+@pytest.fixture
+def start_broker(tmp_path, mock_ssh):
+    threads = []
+
+    def start(idle_timeout=60):
+        broker = Broker(tmp_path / "broker.sock", idle_timeout=idle_timeout)
+        thread = threading.Thread(target=broker.serve, daemon=True)
+        thread.start()
+        while not broker_running(broker.socket_path):
+            pass
+        threads.append((broker, thread))
+        return broker, thread
+
+    yield start
+    for broker, thread in threads:
+        if thread.is_alive():
+            broker.server.shutdown()
+            thread.join()
+
+
+def test_exec_reuses_transport(start_broker, mock_ssh):
+    broker, _ = start_broker()
+    transport = mock_ssh.return_value.get_transport.return_value
+    transport.open_session.side_effect = [
+        fake_channel(b"first\n"),
+        fake_channel(b"second\n", b"warning\n", status=3),
+    ]
+
+    client = BrokerClient("dokku.example.com", "testuser", broker.socket_path)
+    _, stdout, stderr = client.exec_command("sudo dokku apps:list")
+    assert stdout.read() == b"first\n"
+    assert stdout.channel.recv_exit_status() == 0
+
+    _, stdout, stderr = client.exec_command("sudo dokku apps:report")
+    assert list(stdout) == ["second\n"]
+    assert stderr.read() == b"warning\n"
+    assert stdout.channel.recv_exit_status() == 3
+
+    # One handshake for the connect and both commands
+    mock_ssh.assert_called_once()
+    mock_ssh.return_value.connect.assert_called_once_with(
+        "dokku.example.com", username="testuser"
+    )
+    assert broker.status()[0]["host"] == "dokku.example.com"
+
+
+def test_connection_error_is_reported(start_broker, mock_ssh):
+    broker, _ = start_broker()
+    mock_ssh.return_value.connect.side_effect = OSError("No route to host")
+
+    with pytest.raises(BrokerError, match="No route to host"):
+        BrokerClient("dokku.example.com", "testuser", broker.socket_path)
+
+
+def test_idle_broker_shuts_down(start_broker, mock_ssh):
+    broker, thread = start_broker(idle_timeout=0.1)
+    transport = mock_ssh.return_value.get_transport.return_value
+    transport.open_session.return_value = fake_channel(b"ok\n")
+
+    client = BrokerClient("dokku.example.com", None, broker.socket_path)
+    client.exec_command("sudo dokku version")[1].read()
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    mock_ssh.return_value.close.assert_called_once()
+    assert not broker.socket_path.exists()
+
+
+def test_transport_in_use_is_not_reaped(start_broker, mock_ssh):
+    broker, thread = start_broker(idle_timeout=0.1)
+    transport = mock_ssh.return_value.get_transport.return_value
+    channel = fake_channel(b"done\n")
+    release = threading.Event()
+    recv = channel.recv.side_effect
+    # The command runs for several idle timeouts before producing output
+    channel.recv.side_effect = lambda size: release.wait() and next(recv)
+    transport.open_session.return_value = channel
+
+    client = BrokerClient("dokku.example.com", None, broker.socket_path)
+    _, stdout, _ = client.exec_command("sudo dokku ps:rebuild blog")
+    threading.Timer(0.5, release.set).start()
+
+    assert stdout.read() == b"done\n"
+    mock_ssh.return_value.close.assert_not_called()
+    thread.join(timeout=5)
+    mock_ssh.return_value.close.assert_called_once()
+
+
+def test_concurrent_starts_spawn_one_broker(tmp_path, mock_ssh):
+    socket_path = tmp_path / "broker.sock"
+    brokers = []
+
+    def spawn(*args, **kwargs):
+        broker = Broker(socket_path)
+        brokers.append(broker)
+        threading.Thread(target=broker.serve, daemon=True).start()
+
+    with patch("subprocess.Popen", side_effect=spawn):
+        starts = [
+            threading.Thread(target=ensure_broker, args=(socket_path,))
+            for _ in range(8)
+        ]
+        for thread in starts:
+            thread.start()
+        for thread in starts:
+            thread.join()
+
+    assert len(brokers) == 1
+    brokers[0].server.shutdown()
+
+
+def test_broker_leaves_a_live_socket_alone(start_broker):
+    broker, thread = start_broker()
+
+    with pytest.raises(BrokerError, match="already listening"):
+        Broker(broker.socket_path).serve()
+    assert broker_running(broker.socket_path)
+
+    # A broker whose socket was taken over doesn't remove its successor's
+    broker.socket_path.unlink()
+    successor, _ = start_broker()
+    broker.server.shutdown()
+    thread.join()
+    assert broker_running(successor.socket_path)
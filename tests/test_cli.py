@@ -3,6 +3,7 @@ import re
 from typer.testing import CliRunner
 
 from baconstack.cli import app
+from tests.fakes import FakeDigitalOcean, remote_shell
 
 runner = CliRunner()
 
@@ -18,71 +19,166 @@ def test_version():
     ), f"Version '{result.stdout}' does not match the required pattern"
 
 
-@patch("digitalocean.Manager")
 @patch("paramiko.SSHClient")
-def test_setup_command(mock_ssh, mock_do_manager):
+def test_setup_command(mock_ssh):
     # Set up mock SSH client
     mock_ssh_instance = mock_ssh.return_value
-    mock_stdout = MagicMock()
-    mock_stdout.read.return_value = b""
-    mock_stderr = MagicMock()
-    mock_stderr.read.return_value = b""
-    mock_ssh_instance.exec_command.return_value = (None, mock_stdout, mock_stderr)
+    mock_ssh_instance.exec_command.side_effect = remote_shell()
 
-    # Set up mock DO manager
-    mock_manager = mock_do_manager.return_value
-    mock_domain = mock_manager.get_domain.return_value
-    mock_domain.create_new_domain_record.return_value = None
+    # Set up fake DigitalOcean API
+    do_api = FakeDigitalOcean({"example.com": []})
 
-    result = runner.invoke(
-        app,
-        [
-            "setup",
-            "testapp",
-            "test.example.com",
-            "--dokku-host", "dokku.example.com",
-            "--dokku-user", "testuser",
-            "--do-token", "fake-token",
-        ],
-    )
+    with patch("baconstack.commands.setup.DigitalOceanClient", return_value=do_api):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host", "dokku.example.com",
+                "--dokku-user", "testuser",
+                "--do-token", "fake-token",
+            ],
+        )
     assert result.exit_code == 0
 
-@patch("digitalocean.Manager")
 @patch("paramiko.SSHClient")
-def test_destroy_command(mock_ssh, mock_do_manager):
+def test_destroy_command(mock_ssh):
     # Set up mock SSH client
     mock_ssh_instance = mock_ssh.return_value
-    mock_stdout = MagicMock()
-    mock_stdout.read.return_value = b"App destroyed"
-    mock_stderr = MagicMock()
-    mock_stderr.read.return_value = b""
-    mock_ssh_instance.exec_command.return_value = (None, mock_stdout, mock_stderr)
-
-    # Set up mock DO manager
-    mock_manager = mock_do_manager.return_value
-    mock_domain = MagicMock()
-    mock_record = MagicMock()
-    mock_record.type = "CNAME"
-    mock_record.name = "testapp"
-    mock_domain.get_records.return_value = [mock_record]
-    mock_manager.get_all_domains.return_value = [mock_domain]
+    mock_ssh_instance.exec_command.side_effect = remote_shell(
+        {
+            "domains:report": ("testapp.example.com", "", 0),
+            "apps:destroy": ("App destroyed", "", 0),
+        }
+    )
 
-    result = runner.invoke(
-        app,
-        [
-            "destroy",
-            "testapp",
-            "--dokku-host", "dokku.example.com",
-            "--do-token", "fake-token",
-            "--force",
-        ],
+    # Set up fake DigitalOcean API
+    do_api = FakeDigitalOcean(
+        {
+            "example.com": [
+                {"id": 1, "type": "A", "name": "@", "data": "1.2.3.4"},
+                {
+                    "id": 2,
+                    "type": "CNAME",
+                    "name": "testapp",
+                    "data": "dokku.example.com.",
+                },
+            ],
+            "example.org": [
+                {
+                    "id": 3,
+                    "type": "CNAME",
+                    "name": "testapp",
+                    "data": "dokku.example.com.",
+                },
+            ],
+        }
     )
+
+    with patch("baconstack.commands.destroy.DigitalOceanClient", return_value=do_api):
+        result = runner.invoke(
+            app,
+            [
+                "destroy",
+                "testapp",
+                "--dokku-host", "dokku.example.com",
+                "--do-token", "fake-token",
+                "--force",
+            ],
+        )
     assert result.exit_code == 0
-    
+
     # Verify SSH command was executed
     mock_ssh_instance.exec_command.assert_called_with(
         "sudo dokku apps:destroy testapp --force"
     )
-    
-    # Verify DNS record was destroyed
-    mock_record.destroy.assert_called_once()
+
+    # Verify only the app's own DNS record was destroyed, without listing zones
+    assert do_api.requests == [
+        ("GET", "/domains/example.com/records"),
+        ("DELETE", "/domains/example.com/records/2"),
+    ]
+    assert [r["id"] for r in do_api.zones["example.com"]] == [1]
+
+
+@patch("paramiko.SSHClient")
+def test_destroy_skips_zones_outside_the_account(mock_ssh):
+    mock_ssh.return_value.exec_command.side_effect = remote_shell(
+        {"domains:report": ("testapp.elsewhere.net testapp.example.com", "", 0)}
+    )
+    do_api = FakeDigitalOcean(
+        {
+            "example.com": [
+                {
+                    "id": 2,
+                    "type": "CNAME",
+                    "name": "testapp",
+                    "data": "dokku.example.com.",
+                },
+            ],
+        }
+    )
+
+    with patch("baconstack.commands.destroy.DigitalOceanClient", return_value=do_api):
+        result = runner.invoke(
+            app,
+            [
+                "destroy",
+                "testapp",
+                "--dokku-host", "dokku.example.com",
+                "--do-token", "fake-token",
+                "--force",
+            ],
+        )
+
+    assert result.exit_code == 0
+    assert "Skipped elsewhere.net" in result.stdout
+    assert do_api.zones["example.com"] == []
+
+@patch("paramiko.SSHClient")
+def test_env_sync_restarts_once(mock_ssh, tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SAME=1\nNEW=a:b 'c'\nEMPTY=\n")
+    commands = []
+    shell = remote_shell({"config:export": ('{"SAME": "1"}', "", 0)})
+
+    def exec_command(command):
+        commands.append(command)
+        return shell(command)
+
+    mock_ssh.return_value.exec_command.side_effect = exec_command
+
+    result = runner.invoke(
+        app,
+        ["env", "sync", "testapp", "--dokku-host", "dokku.example.com",
+         "--dokku-user", "testuser", "--env-file", str(env_file)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert [c.split()[2] for c in commands] == [
+        "config:export", "config:set", "ps:restart"
+    ]
+    assert "--no-restart" in commands[1] and "SAME" not in commands[1]
+
+
+@patch("paramiko.SSHClient")
+def test_env_sync_compares_digests(mock_ssh, tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SAME=1\nSECRET_KEY=new\n")
+    shell = remote_shell({"config:export": ('{"SAME": "1", "SECRET_KEY": "old"}', "", 0)})
+    mock_ssh.return_value.exec_command.side_effect = shell
+    args = ["env", "sync", "testapp", "--dokku-host", "dokku.example.com",
+            "--env-file", str(env_file), "--no-restart"]
+
+    result = runner.invoke(app, args, input="n\n")
+    assert result.exit_code == 0, result.output
+    assert "SECRET_KEY exists with different value" in result.output
+    assert "SAME exists" not in result.output
+    # Only digests came back: the old value was never printed or compared
+    assert "old" not in result.output
+
+    result = runner.invoke(app, [*args, "--no-digest"], input="y\n")
+    assert result.exit_code == 0, result.output
+    assert "SECRET_KEY exists with different value" in result.output
+    assert "updated" in result.output and "new" not in result.output
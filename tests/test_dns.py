@@ -0,0 +1,304 @@
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from baconstack.utils.dns import (
+    DigitalOceanClient,
+    DNSError,
+    RateLimit,
+    RecordIndex,
+    app_records,
+    apply,
+    desired_cname,
+    plan,
+    split_domain,
+)
+from tests.fakes import FakeDigitalOcean
+
+ZONES = {
+    "example.com": [
+        {"id": 1, "type": "CNAME", "name": "blog", "data": "dokku.example.com."},
+        {"id": 2, "type": "CNAME", "name": "shop", "data": "other.example.com."},
+    ],
+    "example.org": [
+        {"id": 3, "type": "CNAME", "name": "blog", "data": "dokku.example.com."},
+    ],
+}
+
+
+def test_split_domain():
+    assert split_domain("blog.example.com") == ("blog", "example.com")
+    assert split_domain("api.eu.example.com.") == ("api.eu", "example.com")
+    assert split_domain("example.com") == ("@", "example.com")
+
+
+def test_index_serves_from_disk_within_ttl(tmp_path):
+    do_api = FakeDigitalOcean(ZONES)
+    index = RecordIndex(do_api, directory=tmp_path)
+    index.records("example.com")
+
+    # A new index (i.e. the next CLI invocation) reads the cached zone
+    records = RecordIndex(do_api, directory=tmp_path).find(
+        "example.com", "CNAME", "blog"
+    )
+
+    assert [r["id"] for r in records] == [1]
+    assert do_api.requests == [("GET", "/domains/example.com/records")]
+
+
+def test_index_revalidates_with_etag(tmp_path):
+    do_api = FakeDigitalOcean(ZONES)
+    index = RecordIndex(do_api, ttl=0, directory=tmp_path)
+    index.records("example.com")
+    time.sleep(0.01)
+
+    assert len(index.records("example.com")) == 2
+    # Unchanged zone: the conditional request returned no body
+    assert do_api.not_modified == 1
+
+    do_api.zones["example.com"].pop()
+    do_api.versions["example.com"] += 1
+    assert len(index.records("example.com")) == 1
+
+
+def test_index_tracks_its_own_writes(tmp_path):
+    do_api = FakeDigitalOcean(ZONES)
+    index = RecordIndex(do_api, directory=tmp_path)
+
+    index.delete("example.com", index.find("example.com", "CNAME", "blog")[0])
+    created = index.create(
+        "example.com", {"type": "CNAME", "name": "api", "data": "dokku.example.com."}
+    )
+
+    cached = RecordIndex(do_api, directory=tmp_path).records("example.com")
+    assert [r["id"] for r in cached] == [2, created["id"]]
+    assert do_api.requests.count(("GET", "/domains/example.com/records")) == 1
+
+
+def create_in_process(directory, record_id):
+    do_api = FakeDigitalOcean(ZONES)
+    do_api.next_id = record_id - 1
+    index = RecordIndex(do_api, directory=directory)
+    index.create(
+        "example.com", {"type": "CNAME", "name": f"app{record_id}", "data": "x."}
+    )
+
+
+def test_index_keeps_concurrent_writes_from_other_processes(tmp_path):
+    RecordIndex(FakeDigitalOcean(ZONES), directory=tmp_path).records("example.com")
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=create_in_process, args=(tmp_path, 100 + i))
+        for i in range(8)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [p.exitcode for p in processes] == [0] * 8
+    cached = RecordIndex(FakeDigitalOcean(ZONES), directory=tmp_path).records(
+        "example.com"
+    )
+    assert {r["id"] for r in cached} == {1, 2, *range(100, 108)}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_app_records_uses_recorded_domains(tmp_path):
+    do_api = FakeDigitalOcean(ZONES)
+    index = RecordIndex(do_api, directory=tmp_path)
+
+    records = app_records(index, "blog", ["blog.example.com"], "dokku.example.com")
+
+    assert [(zone, r["id"]) for zone, r in records] == [("example.com", 1)]
+    assert ("GET", "/domains") not in do_api.requests
+
+
+def test_app_records_falls_back_to_every_zone(tmp_path):
+    do_api = FakeDigitalOcean(ZONES)
+    index = RecordIndex(do_api, directory=tmp_path)
+
+    records = app_records(index, "blog", [], "dokku.example.com")
+    assert [(zone, r["id"]) for zone, r in records] == [
+        ("example.com", 1),
+        ("example.org", 3),
+    ]
+    # Records pointing at another host are left alone
+    assert app_records(index, "shop", [], "dokku.example.com") == []
+
+
+def test_domains_match_case_insensitively(tmp_path):
+    do_api = FakeDigitalOcean(
+        {
+            "example.com": [
+                {
+                    "id": 1,
+                    "type": "CNAME",
+                    "name": "Blog",
+                    "data": "Dokku.Example.com.",
+                },
+            ]
+        }
+    )
+    index = RecordIndex(do_api, directory=tmp_path)
+
+    records = app_records(index, "blog", ["BLOG.example.com"], "dokku.example.com")
+    assert [(zone, r["id"]) for zone, r in records] == [("example.com", 1)]
+    assert plan(index, [desired_cname("blog.example.com", "dokku.example.com")]) == []
+
+
+def test_plan_creates_updates_and_removes_duplicates(tmp_path):
+    do_api = FakeDigitalOcean(
+        {
+            "example.com": [
+                *ZONES["example.com"],
+                {"id": 4, "type": "CNAME", "name": "blog", "data": "old.example.com."},
+            ]
+        }
+    )
+    index = RecordIndex(do_api, directory=tmp_path)
+    desired = [
+        desired_cname("blog.example.com", "dokku.example.com"),
+        desired_cname("shop.example.com", "dokku.example.com"),
+        desired_cname("api.example.com", "dokku.example.com"),
+    ]
+
+    changes = plan(index, desired)
+
+    assert [(c.action, c.fqdn) for c in changes] == [
+        ("delete", "blog.example.com"),
+        ("update", "shop.example.com"),
+        ("create", "api.example.com"),
+    ]
+    # One read for the whole zone, however many records are desired
+    assert do_api.requests == [("GET", "/domains/example.com/records")]
+
+    assert [error for _, error in apply(index, changes)] == [None] * 3
+    assert plan(index, desired) == []
+
+
+def test_plan_prunes_orphans_pointing_at_fleet_hosts(tmp_path):
+    index = RecordIndex(FakeDigitalOcean(ZONES), directory=tmp_path)
+
+    changes = plan(
+        index,
+        [desired_cname("api.example.com", "dokku.example.com")],
+        {"dokku.example.com"},
+    )
+
+    # shop points elsewhere, so it is not ours to remove
+    assert [(c.action, c.fqdn) for c in changes] == [
+        ("create", "api.example.com"),
+        ("delete", "blog.example.com"),
+    ]
+
+
+def test_rate_limit_waits_for_reset(monkeypatch):
+    slept = []
+    monkeypatch.setattr(time, "sleep", slept.append)
+    rate_limit = RateLimit(reserve=1)
+
+    rate_limit.update({"RateLimit-Remaining": "2", "RateLimit-Reset": "0"})
+    rate_limit.wait()
+    assert slept == []
+
+    rate_limit.update(
+        {"RateLimit-Remaining": "1", "RateLimit-Reset": str(time.time() + 5)}
+    )
+    rate_limit.wait()
+    assert len(slept) == 1 and 4 < slept[0] <= 5
+
+
+@pytest.fixture
+def do_server():
+    """Local HTTP server replaying canned responses, recording each request"""
+    responses, seen = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            seen.append((self.path, self.client_address))
+            status, headers, body = responses.pop(0)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_DELETE = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", responses, seen
+    server.shutdown()
+
+
+def test_client_retries_throttled_requests(do_server, monkeypatch):
+    url, responses, seen = do_server
+    slept = []
+    monkeypatch.setattr(time, "sleep", slept.append)
+    responses += [
+        (429, {"Retry-After": "2"}, {"message": "Too many requests"}),
+        (503, {}, {"message": "Unavailable"}),
+        (200, {}, {"domains": [{"name": "example.com"}]}),
+    ]
+
+    assert DigitalOceanClient("token", url).list_zones() == ["example.com"]
+    assert slept == [2.0, 1.0]
+
+
+def test_client_pages_lazily(do_server):
+    url, responses, seen = do_server
+    responses += [
+        (
+            200,
+            {"ETag": '"v1"'},
+            {
+                "domain_records": [{"id": 1}],
+                "links": {
+                    "pages": {"next": f"{url}/domains/example.com/records?page=2"}
+                },
+            },
+        ),
+        (200, {}, {"domain_records": [{"id": 2}]}),
+    ]
+
+    records, etag = DigitalOceanClient("token", url).list_records("example.com")
+
+    assert etag == '"v1"'
+    assert next(records) == {"id": 1}
+    assert len(seen) == 1
+    assert next(records) == {"id": 2}
+    assert len(seen) == 2
+    # Both pages came over the same pooled connection
+    assert seen[0][1] == seen[1][1]
+
+
+def test_client_ignores_deleting_a_missing_record(do_server):
+    url, responses, seen = do_server
+    responses += [
+        (404, {}, {"id": "not_found", "message": "The resource was not found."}),
+        (403, {}, {"id": "forbidden", "message": "(404)"}),
+    ]
+    client = DigitalOceanClient("token", url)
+
+    client.delete_record("example.com", 1)
+    with pytest.raises(DNSError, match="403"):
+        client.delete_record("example.com", 2)
+
+
+def test_client_pools_a_connection_per_worker():
+    client = DigitalOceanClient("token", "http://127.0.0.1", pool_size=20)
+    adapter = client.session.get_adapter("https://api.digitalocean.com")
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 20
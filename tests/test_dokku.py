@@ -0,0 +1,171 @@
+import base64
+import shlex
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+from baconstack.utils.dokku import (
+    apt_packages_commands,
+    config_set_commands,
+    parse_docker_options,
+    run,
+    run_batch,
+    split_host,
+)
+from tests.fakes import remote_shell
+
+
+def test_run_batch_reports_each_step():
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = remote_shell(
+        {
+            "apps:create": ("", "Error: App already exists\n", 1),
+            "domains:add": ("-----> Added test.example.com", "", 0),
+        }
+    )
+
+    results = run_batch(
+        ssh,
+        [
+            "sudo dokku apps:create testapp",
+            "sudo dokku domains:add testapp test.example.com",
+            "echo 'multi\nline'",
+        ],
+    )
+
+    # All three steps share one channel
+    ssh.exec_command.assert_called_once()
+    assert [r.exit_status for r in results] == [1, 0, 0]
+    assert results[0].stderr == "Error: App already exists\n"
+    assert results[0].stdout == ""
+    assert results[1].stdout == "-----> Added test.example.com"
+    assert results[2].stdout == "multi\nline\n"
+    assert results[2].command == "echo 'multi\nline'"
+
+
+def test_run_batch_stop_on_error():
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = remote_shell({"apps:create": ("", "boom", 2)})
+
+    results = run_batch(
+        ssh,
+        ["sudo dokku apps:create testapp", "sudo dokku domains:add testapp x.com"],
+        stop_on_error=True,
+    )
+
+    assert [r.exit_status for r in results] == [2, -1]
+    assert results[0].stderr == "boom"
+    assert not results[1].ok
+
+
+def test_config_set_commands_encode_and_chunk():
+    changes = {"QUOTED": 'it\'s "quoted"', "URL": "postgres://u:p@host/db"}
+    changes |= {f"VAR{i}": "x" * 100 for i in range(10)}
+
+    commands = config_set_commands("testapp", changes, limit=500)
+
+    assert len(commands) > 1
+    decoded = {}
+    for command in commands:
+        assert len(command) <= 500
+        args = shlex.split(command)
+        assert args[:6] == [
+            "sudo",
+            "dokku",
+            "config:set",
+            "--encoded",
+            "--no-restart",
+            "testapp",
+        ]
+        for pair in args[6:]:
+            key, value = pair.split("=", 1)
+            decoded[key] = base64.b64decode(value).decode()
+    assert decoded == changes
+
+
+def test_run_batch_streams_output_and_keeps_a_tail():
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = remote_shell()
+    seen = []
+
+    results = run_batch(
+        ssh,
+        ["seq 1 100", "echo oops >&2; false"],
+        on_output=lambda i, stream, line: seen.append((i, stream, line)),
+        tail=3,
+    )
+
+    # Every line is seen, though only the tail is kept
+    stdout = [(i, line) for i, stream, line in seen if stream == "stdout"]
+    assert stdout == [(0, f"{n}\n") for n in range(1, 101)]
+    assert (1, "stderr", "oops\n") in seen
+    assert results[0].stdout == "98\n99\n100\n"
+    assert results[1].stderr == "oops\n"
+
+
+def test_run_drains_both_streams_at_once():
+    # More stderr than a pipe buffer holds, all written before any stdout: a
+    # reader that finished stdout before touching stderr would hang here
+    script = "import sys; sys.stderr.write('e' * 1_000_000 + '\\n'); print('done')"
+
+    def exec_command(command):
+        process = subprocess.Popen(
+            [sys.executable, "-c", script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        process.stdout.channel = MagicMock()
+        process.stdout.channel.recv_exit_status.side_effect = process.wait
+        return None, process.stdout, process.stderr
+
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = exec_command
+
+    result = run(ssh, "chatty", tail=1)
+
+    assert result.ok
+    assert result.stdout == "done\n"
+    assert len(result.stderr) == 1_000_001
+
+
+def test_apt_packages_commands_are_idempotent():
+    options = parse_docker_options(
+        "--build-arg DOKKU_APT_PACKAGES=libpq-dev redis-tools --link db:db"
+    )
+    assert options == [
+        "--build-arg DOKKU_APT_PACKAGES=libpq-dev redis-tools",
+        "--link db:db",
+    ]
+
+    # Same packages in another order, with a duplicate: nothing to do
+    packages = ["redis-tools", "libpq-dev", "redis-tools"]
+    assert apt_packages_commands("testapp", packages, options) == []
+
+    assert apt_packages_commands("testapp", ["libpq-dev", "curl"], options) == [
+        (
+            "sudo dokku docker-options:remove testapp build "
+            "'--build-arg DOKKU_APT_PACKAGES=libpq-dev redis-tools'"
+        ),
+        (
+            "sudo dokku docker-options:add testapp build "
+            "'--build-arg DOKKU_APT_PACKAGES=curl libpq-dev'"
+        ),
+    ]
+
+
+def test_apt_packages_commands_remove_duplicates():
+    option = "--build-arg DOKKU_APT_PACKAGES=curl"
+    commands = apt_packages_commands("testapp", ["curl"], [option, option])
+    assert [c.split()[2] for c in commands] == [
+        "docker-options:remove",
+        "docker-options:remove",
+        "docker-options:add",
+    ]
+
+
+def test_split_host():
+    assert split_host("dokku.example.com") == ("dokku.example.com", None)
+    assert split_host("dokku.example.com:2222") == ("dokku.example.com", 2222)
+    # IPv6 addresses are left alone
+    assert split_host("::1") == ("::1", None)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.fleet import FleetApp, FleetJob, load_manifest, run_fleet
+
+runner = CliRunner()
+
+MANIFEST = """
+[hosts."dokku1.example.com"]
+user = "seb"
+max_concurrency = 1
+
+[[apps]]
+name = "blog"
+host = "dokku1.example.com"
+domain = "blog.example.com"
+
+[[apps]]
+name = "shop"
+host = "dokku1.example.com"
+domain = "shop.example.com"
+
+[[apps]]
+name = "api"
+host = "dokku2.example.com"
+domain = "api.example.com"
+user = "deploy"
+"""
+
+
+def test_load_manifest(tmp_path):
+    manifest = tmp_path / "fleet.toml"
+    manifest.write_text(MANIFEST)
+
+    fleet = load_manifest(manifest)
+
+    assert [a.name for a in fleet.apps] == ["blog", "shop", "api"]
+    assert fleet.apps[0].user == "seb"
+    assert fleet.apps[2].user == "deploy"
+    assert fleet.host_limits == {"dokku1.example.com": 1}
+    assert fleet.root == tmp_path
+
+
+def test_run_fleet_respects_limits():
+    jobs = [
+        FleetJob(FleetApp(f"app{i}", f"host{i % 2}"), ["setup", f"app{i}"])
+        for i in range(8)
+    ]
+    lock = threading.Lock()
+    in_flight = defaultdict(int)
+    peak = defaultdict(int)
+
+    def fake_runner(job):
+        with lock:
+            in_flight[job.app.host] += 1
+            peak[job.app.host] = max(peak[job.app.host], in_flight[job.app.host])
+        time.sleep(0.02)
+        with lock:
+            in_flight[job.app.host] -= 1
+        return (1, "boom") if job.app.name == "app3" else (0, "ok")
+
+    run_fleet(jobs, fake_runner, workers=3, per_host=2, host_limits={"host0": 1})
+
+    assert peak == {"host0": 1, "host1": 2}
+    assert [job.status for job in jobs].count("ok") == 7
+    assert jobs[3].status == "failed"
+    assert jobs[3].output == "boom"
+
+
+def test_run_fleet_treats_zero_workers_as_one():
+    jobs = [FleetJob(FleetApp(f"app{i}", "host0"), ["setup"]) for i in range(2)]
+
+    run_fleet(jobs, lambda job: (0, "ok"), workers=0)
+
+    assert [job.status for job in jobs] == ["ok", "ok"]
+
+
+def test_fleet_rejects_zero_workers(tmp_path):
+    manifest = tmp_path / "fleet.toml"
+    manifest.write_text(MANIFEST)
+
+    result = runner.invoke(app, ["fleet", "setup", str(manifest), "--workers", "0"])
+
+    assert result.exit_code == 2
+
+
+def test_fleet_setup_command(tmp_path):
+    manifest = tmp_path / "fleet.toml"
+    manifest.write_text(MANIFEST)
+    calls = []
+
+    def fake_cli_runner(cwd, env):
+        assert env["BACONSTACK_BROKER"] == "1"
+
+        def run(job):
+            calls.append(job.args)
+            if job.app.name == "shop":
+                return 1, "Error running dokku apps:create shop"
+            return 0, ""
+
+        return run
+
+    with patch("baconstack.commands.fleet.cli_runner", fake_cli_runner):
+        result = runner.invoke(app, ["fleet", "setup", str(manifest)])
+
+    assert result.exit_code == 1
+    assert sorted(calls) == [
+        [
+            "setup",
+            "api",
+            "api.example.com",
+            "--dokku-host",
+            "dokku2.example.com",
+            "--dokku-user",
+            "deploy",
+        ],
+        [
+            "setup",
+            "blog",
+            "blog.example.com",
+            "--dokku-host",
+            "dokku1.example.com",
+            "--dokku-user",
+            "seb",
+        ],
+        [
+            "setup",
+            "shop",
+            "shop.example.com",
+            "--dokku-host",
+            "dokku1.example.com",
+            "--dokku-user",
+            "seb",
+        ],
+    ]
+    assert "Error running dokku apps:create shop" in result.stdout
+    assert "2 succeeded, 1 failed" in result.stdout
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.loadtest import PERCENTILES, Histogram, run_load
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def site():
+    """Local keep-alive HTTP server; /chunked streams its body, /broken fails"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            server.connections.add(self.client_address)
+            if self.path == "/broken":
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path == "/chunked":
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in (b"hello ", b"world"):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                body = b"ok" * 1000
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.connections = set()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_histogram_percentiles_are_within_precision():
+    values = [random.randint(100, 5_000_000) for _ in range(20_000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for name, value in histogram.percentiles().items():
+        exact = values[int(len(values) * PERCENTILES[name]) - 1]
+        assert abs(value - exact) <= exact / 64
+    assert (histogram.min, histogram.max) == (values[0], values[-1])
+    assert len(histogram.counts) < 1000
+
+    restored = Histogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    restored.merge(histogram)
+    assert restored.total == 2 * len(values)
+    assert restored.value_at(0.5) == histogram.value_at(0.5)
+
+
+def test_closed_loop_reuses_connections(site):
+    result = asyncio.run(run_load(f"{site.url}/chunked", connections=3, duration=0.3))
+
+    assert result.mode == "closed"
+    assert result.ok > 10 and not result.errors
+    assert result.statuses == {"200": result.ok}
+    assert len(site.connections) == 3
+
+
+def test_fixed_rate_keeps_to_schedule(site):
+    result = asyncio.run(run_load(site.url, connections=2, duration=0.5, rate=100))
+
+    assert result.mode == "fixed"
+    assert result.ok == 50
+    assert result.histogram.max < 500_000
+
+
+def test_fixed_rate_above_a_billion_still_finishes(site):
+    # A microsecond's schedule at one request per nanosecond
+    result = asyncio.run(run_load(site.url, connections=4, duration=1e-6, rate=1e12))
+
+    assert result.mode == "fixed"
+    assert result.requests > 0
+
+
+@pytest.fixture
+def hung_url():
+    """A server that accepts connections and never answers"""
+    listener = socket.create_server(("127.0.0.1", 0))
+    held = []
+
+    def accept():
+        while True:
+            try:
+                held.append(listener.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    listener.close()
+    for conn in held:
+        conn.close()
+
+
+def test_fixed_rate_stops_waiting_for_connections_at_the_deadline(hung_url):
+    started = time.monotonic()
+    result = asyncio.run(
+        run_load(hung_url, connections=1, duration=0.5, rate=20, timeout=0.3)
+    )
+
+    # Only the request in flight at the deadline runs past it
+    assert time.monotonic() - started < 1.0
+    assert result.duration <= 0.5
+    assert result.requests == 10
+    assert result.errors["no connection"] >= 7
+
+
+def test_open_loop_caps_its_connections(hung_url):
+    result = asyncio.run(
+        run_load(
+            hung_url,
+            connections=1,
+            duration=0.2,
+            rate=50,
+            open_loop=True,
+            timeout=0.1,
+            max_connections=3,
+        )
+    )
+    assert result.connections == 3
+
+
+def test_errors_are_broken_down_by_kind(site):
+    result = asyncio.run(run_load(f"{site.url}/broken", connections=2, duration=0.2))
+    assert result.ok == 0
+    assert set(result.errors) == {"HTTP 503"}
+
+    site.shutdown()
+    site.server_close()
+    result = asyncio.run(run_load(site.url, duration=0.1, rate=50, open_loop=True))
+    assert result.errors == {"ConnectionRefusedError": result.requests}
+
+
+def test_loadtest_command_saves_and_compares(site, tmp_path):
+    first, second = tmp_path / "first.json", tmp_path / "second.json"
+    args = ["loadtest", site.url, "-c", "2", "-d", "0.2"]
+
+    result = runner.invoke(app, [*args, "--output", str(first)])
+    assert result.exit_code == 0, result.output
+    saved = json.loads(first.read_text())
+    assert saved["summary"]["ok"] == saved["latency_us"]["total"] > 0
+
+    result = runner.invoke(
+        app, [*args, "--compare", str(first), "--output", str(second)]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Baseline" in result.output
+
+    result = runner.invoke(app, ["loadtest", site.url, "--open-loop"])
+    assert result.exit_code == 1
+    assert "--open-loop needs a --rate" in result.output
+
+    result = runner.invoke(app, ["loadtest", site.url, "--rate", "2e9"])
+    assert result.exit_code == 1
+    assert "--rate must be above 0 and at most 1,000,000" in result.output
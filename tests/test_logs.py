@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.loki import LokiClient, build_query, parse_time
+from tests.emulator import LokiServer
+
+runner = CliRunner()
+
+NOW = time.time_ns()
+WEB = (("app", "blog"), ("process", "web"))
+WORKER = (("app", "blog"), ("process", "worker"))
+
+
+@pytest.fixture
+def loki():
+    streams = {
+        WEB: [(NOW - 60_000_000_000 + i, f"GET /page/{i}") for i in range(10)],
+        WORKER: [(NOW - 60_000_000_000 + i, f"job {i} error") for i in range(0, 10, 3)],
+        (("app", "shop"),): [(NOW - 1000, "GET /cart")],
+    }
+    with LokiServer(streams) as server:
+        yield server
+
+
+def test_build_query_filters_on_the_server():
+    query = build_query({"app": "blog"}, ["error"], ["healthcheck"], regex=r"id=\d+")
+    assert query == ('{app="blog"} |= "error" != "healthcheck" |~ "id=\\\\d+"')
+
+
+def test_parse_time():
+    assert parse_time("15m", now=1000.0) == 100 * 10**9
+    assert parse_time("2024-01-01T00:00:00+00:00") == 1704067200 * 10**9
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
+
+
+def test_lines_pages_without_gaps_or_repeats(loki):
+    client = LokiClient(loki.url)
+    query = build_query({"app": "blog"})
+
+    lines = list(client.lines(query, NOW - 10**12, NOW, page_size=3))
+
+    # Both streams, interleaved by time; the web and worker lines sharing a
+    # timestamp straddle page boundaries
+    assert [entry.line for entry in lines] == [
+        "GET /page/0",
+        "job 0 error",
+        "GET /page/1",
+        "GET /page/2",
+        "GET /page/3",
+        "job 3 error",
+        "GET /page/4",
+        "GET /page/5",
+        "GET /page/6",
+        "job 6 error",
+        "GET /page/7",
+        "GET /page/8",
+        "GET /page/9",
+        "job 9 error",
+    ]
+
+
+def test_lines_stop_at_limit(loki):
+    client = LokiClient(loki.url)
+    lines = client.lines(build_query({"app": "blog"}), NOW - 10**12, NOW, 3, limit=4)
+    assert len(list(lines)) == 4
+    assert len(loki.requests) == 2
+
+
+def test_follow_yields_new_lines_once(loki):
+    client = LokiClient(loki.url)
+    lines = client.follow(build_query({"app": "shop"}), NOW - 10**12, interval=0)
+    assert next(lines).line == "GET /cart"
+
+    # Later polls start from the last line seen without repeating it
+    loki.streams[(("app", "shop"),)].append((time.time_ns(), "GET /checkout"))
+    assert next(lines).line == "GET /checkout"
+
+
+def test_logs_command(loki):
+    result = runner.invoke(
+        app,
+        [
+            "logs",
+            "blog",
+            "--grep",
+            "error",
+            "--label",
+            "process=worker",
+            "--no-timestamps",
+            "--loki-url",
+            loki.url,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines() == [
+        "job 0 error",
+        "job 3 error",
+        "job 6 error",
+        "job 9 error",
+    ]
+
+
+def test_logs_reports_loki_errors():
+    result = runner.invoke(app, ["logs", "blog", "--loki-url", "http://127.0.0.1:9"])
+    assert result.exit_code == 1
+    assert "Could not reach Loki" in result.output
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock, patch
+
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.plugins import PluginInventory
+from tests.fakes import remote_shell
+
+runner = CliRunner()
+
+PLUGIN_LIST = (
+    (
+        "plugn: 0.14.0\n"
+        "  00_dokku-standard    0.35.0 enabled    dokku core standard plugin\n"
+        "  letsencrypt          0.20.0 enabled    Let's Encrypt\n"
+    ),
+    "",
+    0,
+)
+
+
+def test_inventory_caches_plugin_list(tmp_path):
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = remote_shell({"plugin:list": PLUGIN_LIST})
+
+    inventory = PluginInventory("dokku.example.com", directory=tmp_path)
+    assert inventory.installed(ssh) == {"00_dokku-standard", "letsencrypt"}
+
+    # A later invocation reads the list from disk, and sees our own installs
+    inventory = PluginInventory("dokku.example.com", directory=tmp_path)
+    inventory.add("loki")
+    assert inventory.installed(ssh) == {"00_dokku-standard", "letsencrypt", "loki"}
+    ssh.exec_command.assert_called_once()
+
+
+def test_inventory_expires(tmp_path):
+    ssh = MagicMock()
+    ssh.exec_command.side_effect = remote_shell({"plugin:list": PLUGIN_LIST})
+
+    inventory = PluginInventory("dokku.example.com", ttl=0, directory=tmp_path)
+    inventory.installed(ssh)
+    inventory.installed(ssh)
+
+    assert ssh.exec_command.call_count == 2
+
+
+@patch("paramiko.SSHClient")
+def test_bootstrap_installs_missing_plugins(mock_ssh):
+    commands = []
+    shell = remote_shell({"plugin:list": PLUGIN_LIST})
+
+    def exec_command(command):
+        commands.append(command)
+        return shell(command)
+
+    mock_ssh.return_value.exec_command.side_effect = exec_command
+
+    result = runner.invoke(
+        app, ["host", "bootstrap", "--dokku-host", "dokku.example.com"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert len(commands) == 2
+    assert "dokku-loki.git" in commands[1]
+    assert "dokku-letsencrypt.git" not in commands[1]
+    assert PluginInventory("dokku.example.com").cached() == {
+        "00_dokku-standard",
+        "letsencrypt",
+        "loki",
+    }
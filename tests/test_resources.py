@@ -0,0 +1,121 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.autoscale import ContainerStats
+from baconstack.utils.resources import (
+    ProfileError,
+    ResourceProfile,
+    load_profiles,
+    parse_memory,
+    peak_usage,
+    resource_commands,
+)
+from tests.fakes import remote_shell
+
+runner = CliRunner()
+
+MiB = 2**20
+
+
+def test_load_profiles():
+    app_json = {
+        "dokku": {
+            "resources": {
+                "_default_": {"limit": {"memory": "1g"}},
+                "web": {"limit": {"cpu": 2}, "reserve": {"memory": 256}},
+            }
+        }
+    }
+    assert load_profiles(app_json) == [
+        ResourceProfile("_default_", {"memory": "1g"}),
+        ResourceProfile("web", {"cpu": "2"}, {"memory": "256"}),
+    ]
+    assert load_profiles({}) == []
+
+    for spec in ({"limits": {"cpu": 1}}, {"limit": {"disk": "1g"}}):
+        with pytest.raises(ProfileError):
+            load_profiles({"dokku": {"resources": {"web": spec}}})
+
+
+def test_resource_commands_skip_settings_in_place():
+    profiles = [
+        ResourceProfile("_default_", {"memory": "1g"}),
+        ResourceProfile("web", {"cpu": "2", "memory": "512m"}),
+    ]
+    current = {
+        ("limit", "_default_"): {"memory": "1024"},
+        ("limit", "web"): {"cpu": "1", "memory": "512"},
+    }
+    assert resource_commands("blog", profiles, current) == [
+        "sudo dokku resource:limit --process-type web --cpu 2 --memory 512m blog"
+    ]
+    assert parse_memory("1g") == parse_memory("1024") == 1024 * MiB
+
+
+def test_peak_usage_advice():
+    samples = [
+        [
+            ContainerStats("web", 30.0, 0, 100 * MiB),
+            ContainerStats("web", 80.0, 0, 120 * MiB),
+        ],
+        [ContainerStats("web", 50.0, 0, 460 * MiB), ContainerStats("worker", 5, 0, 0)],
+    ]
+    current = {
+        ("limit", "_default_"): {"memory": "1g"},
+        ("limit", "web"): {"cpu": "1", "memory": "500m"},
+        ("reserve", "web"): {"memory": "256m"},
+    }
+
+    web, worker = peak_usage(samples, current)
+
+    assert (web.containers, web.cpu_peak, web.memory_peak) == (2, 0.8, 460 * MiB)
+    assert web.memory_reserve == 256 * MiB
+    assert web.advice == ["memory near its limit; raise it to 704m"]
+    assert worker.memory_limit == 1024 * MiB
+    assert worker.advice == ["memory oversized; lower it to 64m", "no cpu limit"]
+
+
+def test_resources_report_command():
+    stats = json.dumps(
+        {
+            "Name": "blog.web.1",
+            "CPUPerc": "25%",
+            "MemPerc": "5%",
+            "MemUsage": "100MiB / 2GiB",
+        }
+    )
+    with patch("paramiko.SSHClient") as mock_ssh:
+        exec_command = mock_ssh.return_value.exec_command
+        exec_command.side_effect = remote_shell(
+            {
+                "docker stats": (stats + "\n", "", 0),
+                "resource:limit blog": (
+                    "=====> resource limits\n       memory: 1g\n",
+                    "",
+                    0,
+                ),
+            }
+        )
+        result = runner.invoke(
+            app,
+            [
+                "resources",
+                "report",
+                "blog",
+                "--dokku-host",
+                "dokku.example.com",
+                "--samples",
+                "2",
+                "--interval",
+                "0",
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    # Two samples, then every scope's settings in one batch
+    assert exec_command.call_count == 3
+    assert "web: memory oversized; lower it to 192m" in result.output
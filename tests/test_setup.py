@@ -1,10 +1,11 @@
-from io import StringIO
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 import pytest
 from typer.testing import CliRunner
 
 from baconstack.cli import app
+from baconstack.utils.plugins import PluginInventory
+from tests.fakes import FakeDigitalOcean, remote_shell
 
 runner = CliRunner()
 
@@ -12,28 +13,17 @@ runner = CliRunner()
 @pytest.fixture
 def mock_ssh():
     with patch("paramiko.SSHClient") as mock:
-        # Configure the mock to return success for exec_command
-        # Mock stdout/stderr as bytes objects
-        mock_stdin = StringIO()
-        mock_stdout = StringIO()
-        mock_stderr = StringIO()
-
-        # Configure the mock's read() methods to return bytes
-        mock_stdout.read = lambda: b"Success"
-        mock_stderr.read = lambda: b""
-
-        # Set up the mock to return our configured streams
-        mock.return_value.exec_command.return_value = (
-            mock_stdin,
-            mock_stdout,
-            mock_stderr,
-        )
+        # Run the remote commands in a local shell where sudo always succeeds
+        mock.return_value.exec_command.side_effect = remote_shell()
         yield mock
 
 
 def test_basic_setup(mock_ssh):
     """Test basic app setup with minimal parameters"""
-    with patch("digitalocean.Manager"):
+    with patch(
+        "baconstack.commands.setup.DigitalOceanClient",
+        return_value=FakeDigitalOcean({"example.com": []}),
+    ):
         result = runner.invoke(
             app,
             [
@@ -71,25 +61,23 @@ def test_basic_setup(mock_ssh):
                 cmd in str(call) for call in exec_command_calls
             ), f"Expected command not found: {cmd}"
 
+        # Certificates are only requested once the app exists
+        scripts = [call.args[0] for call in exec_command_calls]
+        create = next(i for i, s in enumerate(scripts) if "apps:create" in s)
+        enable = next(i for i, s in enumerate(scripts) if "letsencrypt:enable" in s)
+        assert create < enable
+
 
 def test_setup_error_handling(mock_ssh):
     """Test handling of SSH errors during setup"""
-    with patch("digitalocean.Manager"):
+    with patch(
+        "baconstack.commands.setup.DigitalOceanClient",
+        return_value=FakeDigitalOcean({"example.com": []}),
+    ):
         # Configure mock with error response
-        mock_stdin = StringIO()
-        mock_stdout = StringIO()
-        mock_stderr = StringIO()
-
-        def mock_exec(cmd):
-            if "apps:create" in cmd:
-                mock_stderr.read = lambda: b"Error: App already exists"
-                mock_stdout.read = lambda: b""
-            else:
-                mock_stderr.read = lambda: b""
-                mock_stdout.read = lambda: b"Success"
-            return mock_stdin, mock_stdout, mock_stderr
-
-        mock_ssh.return_value.exec_command = mock_exec
+        mock_ssh.return_value.exec_command.side_effect = remote_shell(
+            {"apps:create": ("", "Error: App already exists", 1)}
+        )
 
         result = runner.invoke(
             app,
@@ -112,31 +100,46 @@ def test_setup_error_handling(mock_ssh):
             username="testuser",
         )
 
-        # Command should complete but show error message
-        assert result.exit_code == 0
+        # Command should report the failing step and exit non-zero
+        assert result.exit_code == 1
         assert "Error running dokku apps:create testapp" in result.stdout
         assert "Error: App already exists" in result.stdout
 
 
+def test_setup_reports_step_exceptions(mock_ssh):
+    do_api = FakeDigitalOcean({"example.com": []})
+    with (
+        patch("baconstack.commands.setup.DigitalOceanClient", return_value=do_api),
+        patch.object(
+            do_api, "list_records", side_effect=RuntimeError("DNS lookup timed out")
+        ),
+    ):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+                "--do-token",
+                "fake-token",
+            ],
+        )
+
+    assert result.exit_code == 1
+    assert "DNS lookup timed out" in result.stdout
+
+
 def test_setup_with_apt_packages(mock_ssh):
     """Test setup with APT packages configuration"""
-    # Set up mock SSH client
-    mock_ssh_instance = mock_ssh.return_value
-    mock_stdout = MagicMock()
-    mock_stdout.read.return_value = b""
-    mock_stderr = MagicMock()
-    mock_stderr.read.return_value = b""
-    mock_ssh_instance.exec_command.return_value = (None, mock_stdout, mock_stderr)
-
     with (
-        patch("digitalocean.Manager") as mock_do_manager,
-        patch("baconstack.cli.read_app_json") as mock_read_json,
+        patch(
+            "baconstack.commands.setup.DigitalOceanClient",
+            return_value=FakeDigitalOcean({"example.com": []}),
+        ),
+        patch("baconstack.commands.setup.read_app_json") as mock_read_json,
     ):
-        # Set up mock DO manager
-        mock_manager = mock_do_manager.return_value
-        mock_domain = mock_manager.get_domain.return_value
-        mock_domain.create_new_domain_record.return_value = None
-
         # Configure mock read_app_json
         mock_read_json.return_value = {
             "dokku": {"apt-packages": ["postgresql-client", "redis-tools"]}
@@ -170,3 +173,175 @@ def test_setup_with_apt_packages(mock_ssh):
         assert any(
             expected_cmd in call.args[0] for call in exec_command_calls
         ), f"APT packages not configured correctly.\nExpected command: {expected_cmd}\nActual commands called: {[call.args[0] for call in exec_command_calls]}"
+
+
+def test_setup_rerun_is_noop(mock_ssh):
+    """Re-running setup against a provisioned app only queries its state"""
+    mock_ssh.return_value.exec_command.side_effect = remote_shell(
+        {
+            "apps:list": ("testapp\n", "", 0),
+            "domains:report": ("test.example.com\n", "", 0),
+            "storage:report": (
+                "-v /var/lib/dokku/data/storage/testapp:/app/data\n",
+                "",
+                0,
+            ),
+            "letsencrypt:list": (
+                "-----> App name  Certificate Expiry\ntestapp  2030-01-01 00:00:00\n",
+                "",
+                0,
+            ),
+            "plugin:list": (
+                "plugn: 0.14.0\n  letsencrypt  0.20.0 enabled  Let's Encrypt\n",
+                "",
+                0,
+            ),
+        }
+    )
+
+    do_api = FakeDigitalOcean(
+        {
+            "example.com": [
+                {"id": 1, "type": "CNAME", "name": "test", "data": "dokku.example.com"}
+            ]
+        }
+    )
+    with patch("baconstack.commands.setup.DigitalOceanClient", return_value=do_api):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+                "--dokku-user",
+                "testuser",
+                "--do-token",
+                "fake-token",
+            ],
+        )
+
+    assert result.exit_code == 0
+    # One round trip to read the state, none to change it
+    mock_ssh.return_value.exec_command.assert_called_once()
+    assert do_api.requests == [("GET", "/domains/example.com/records")]
+
+
+def test_setup_reissues_certificate_for_a_new_domain(mock_ssh):
+    """An app with a certificate still gets one covering a domain setup adds"""
+    mock_ssh.return_value.exec_command.side_effect = remote_shell(
+        {
+            "apps:list": ("testapp\n", "", 0),
+            "domains:report": ("old.example.com\n", "", 0),
+            "letsencrypt:list": (
+                "-----> App name  Certificate Expiry\ntestapp  2030-01-01 00:00:00\n",
+                "",
+                0,
+            ),
+            "plugin:list": (
+                "plugn: 0.14.0\n  letsencrypt  0.20.0 enabled  Let's Encrypt\n",
+                "",
+                0,
+            ),
+        }
+    )
+
+    with patch(
+        "baconstack.commands.setup.DigitalOceanClient",
+        return_value=FakeDigitalOcean({"example.com": []}),
+    ):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+                "--do-token",
+                "fake-token",
+            ],
+        )
+
+    assert result.exit_code == 0
+    scripts = [c.args[0] for c in mock_ssh.return_value.exec_command.call_args_list]
+    assert any("domains:add testapp test.example.com" in s for s in scripts)
+    assert any("letsencrypt:enable testapp" in s for s in scripts)
+    assert not any("letsencrypt:set" in s for s in scripts)
+
+def test_setup_uses_plugin_inventory(mock_ssh):
+    """A fresh inventory answers the plugin question without plugin:list"""
+    PluginInventory("dokku.example.com").save({"letsencrypt"})
+
+    with patch(
+        "baconstack.commands.setup.DigitalOceanClient",
+        return_value=FakeDigitalOcean({"example.com": []}),
+    ):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+                "--do-token",
+                "fake-token",
+            ],
+        )
+
+    assert result.exit_code == 0
+    scripts = [c.args[0] for c in mock_ssh.return_value.exec_command.call_args_list]
+    assert not any("plugin:list" in script for script in scripts)
+    assert not any("plugin:install" in script for script in scripts)
+
+
+def test_setup_applies_resource_profiles(mock_ssh):
+    """Only resource settings that differ from the app's are applied"""
+    mock_ssh.return_value.exec_command.side_effect = remote_shell(
+        {
+            "resource:limit --process-type web testapp": (
+                (
+                    "=====> resource limits testapp information [web]\n"
+                    "       cpu:           1\n"
+                    "       memory:        512\n"
+                ),
+                "",
+                0,
+            ),
+        }
+    )
+    profiles = {
+        "web": {"limit": {"cpu": 1, "memory": "512m"}, "reserve": {"memory": "256m"}}
+    }
+
+    with (
+        patch(
+            "baconstack.commands.setup.DigitalOceanClient",
+            return_value=FakeDigitalOcean({"example.com": []}),
+        ),
+        patch(
+            "baconstack.commands.setup.read_app_json",
+            return_value={"dokku": {"resources": profiles}},
+        ),
+    ):
+        result = runner.invoke(
+            app,
+            [
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+                "--do-token",
+                "fake-token",
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    scripts = "\n".join(
+        c.args[0] for c in mock_ssh.return_value.exec_command.call_args_list
+    )
+    assert "resource:reserve --process-type web --memory 256m testapp" in scripts
+    assert "resource:limit --process-type web --cpu" not in scripts
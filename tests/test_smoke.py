@@ -1,8 +1,11 @@
+import asyncio
 import os
+import ssl
 import subprocess
 import time
 import requests
 from urllib.error import URLError
+from urllib.parse import urlsplit
 from urllib.request import urlopen
 
 import pytest
@@ -13,24 +16,26 @@ from pathlib import Path
 from typer.testing import CliRunner
 from dotenv import load_dotenv
 from baconstack.cli import app
+from baconstack.utils.wait import Target, wait_ready
 
 # Load environment variables from .env file
 load_dotenv()
 
 
-def wait_for_server(url, timeout=10, interval=0.5):
+def wait_for_server(url, timeout=10):
     """Wait for server to start responding, with timeout"""
-    start_time = time.time()
-    while True:
-        try:
-            # Use requests with SSL verification disabled for testing
-            response = requests.get(url, verify=False)
-            response.raise_for_status()
-            return True
-        except (requests.RequestException, ConnectionError):
-            if time.time() - start_time > timeout:
-                raise TimeoutError(f"Server did not respond within {timeout} seconds")
-            time.sleep(interval)
+    parts = urlsplit(url)
+    target = Target(
+        url, parts.hostname, scheme=parts.scheme, port=parts.port, path=parts.path or "/"
+    )
+    # Certificates are not verified for testing
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    (result,) = asyncio.run(wait_ready([target], ("http",), timeout, context=context))
+    if not result.ok:
+        raise TimeoutError(f"Server did not respond within {timeout} seconds")
+    return True
 
 
 @pytest.fixture
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from baconstack.cli import COMMANDS
+
+# Modules that must only be imported by the command that actually needs them
+HEAVY_MODULES = {"paramiko", "requests", "copier", "rich.live"}
+
+
+def imported_modules(*args: str, cwd=None) -> set[str]:
+    """Run the CLI under -X importtime and return every module it imported"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "baconstack.cli", *args],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+        input="",
+    )
+    assert result.returncode == 0, result.stderr
+
+    return {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+def loaded_heavy_modules(modules: set[str]) -> set[str]:
+    return {
+        heavy
+        for heavy in HEAVY_MODULES
+        for name in modules
+        if name == heavy or name.startswith(f"{heavy}.")
+    }
+
+
+def test_version_startup():
+    modules = imported_modules("--version")
+    assert not loaded_heavy_modules(modules)
+    assert "baconstack.commands" not in modules
+
+
+def test_env_init_startup(tmp_path):
+    (tmp_path / ".env.example").write_text("DEBUG=1\n")
+    modules = imported_modules("env", "init", str(tmp_path))
+    assert not loaded_heavy_modules(modules)
+
+
+@pytest.mark.parametrize("command", sorted(COMMANDS))
+def test_command_startup(command):
+    modules = imported_modules(command, "--help")
+    assert not loaded_heavy_modules(modules)
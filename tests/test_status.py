@@ -0,0 +1,92 @@
+import json
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from tests.fakes import remote_shell
+
+runner = CliRunner()
+
+RESPONSES = {
+    "apps:list": ("blog\nshop\n", "", 0),
+    "ps:report": (
+        (
+            "=====> blog ps information\n"
+            "       Deployed:                      true\n"
+            "       Processes:                     3\n"
+            "       Running:                       true\n"
+            "       Status web 1:                  running (CID: 5f1a2b3c4d5)\n"
+            "       Status web 2:                  running (CID: 6a7b8c9d0e1)\n"
+            "       Status worker 1:               running (CID: 1e2d3c4b5a6)\n"
+            "=====> shop ps information\n"
+            "       Deployed:                      false\n"
+            "       Processes:                     0\n"
+            "       Running:                       false\n"
+        ),
+        "",
+        0,
+    ),
+    "domains:report": (
+        (
+            "=====> blog domains information\n"
+            "       Domains app enabled:           true\n"
+            "       Domains app vhosts:            blog.example.com www.example.com\n"
+            "=====> shop domains information\n"
+            "       Domains app enabled:           true\n"
+            "       Domains app vhosts:            shop.example.com\n"
+        ),
+        "",
+        0,
+    ),
+    "letsencrypt:list": (
+        (
+            "-----> App name           Certificate Expiry        Time before expiry\n"
+            "blog                      2030-03-01 12:00:00       59d, 3h, 2m, 1s\n"
+        ),
+        "",
+        0,
+    ),
+}
+
+
+def invoke(*args):
+    return runner.invoke(
+        app, ["status", "--dokku-host", "dokku.example.com", "--json", *args]
+    )
+
+
+def test_status_gathers_every_app_in_one_exec():
+    with patch("paramiko.SSHClient") as mock_ssh:
+        exec_command = mock_ssh.return_value.exec_command
+        exec_command.side_effect = remote_shell(RESPONSES)
+        result = invoke()
+
+    assert result.exit_code == 0, result.output
+    exec_command.assert_called_once()
+    apps = {a["name"]: a for a in json.loads(result.output)["apps"]}
+    assert apps["blog"] == {
+        "name": "blog",
+        "deployed": True,
+        "running": "true",
+        "processes": {"web": 2, "worker": 1},
+        "domains": ["blog.example.com", "www.example.com"],
+        "certificate_expiry": "2030-03-01 12:00:00",
+    }
+    assert apps["shop"]["deployed"] is False
+    assert apps["shop"]["certificate_expiry"] is None
+
+
+def test_status_snapshot_is_cached():
+    with patch("paramiko.SSHClient") as mock_ssh:
+        exec_command = mock_ssh.return_value.exec_command
+        exec_command.side_effect = remote_shell(RESPONSES)
+        first = invoke()
+        second = invoke()
+        assert exec_command.call_count == 1
+        assert json.loads(second.output) == json.loads(first.output)
+
+        # Too old for the caller, or bypassed
+        invoke("--max-age", "0")
+        invoke("--refresh")
+        assert exec_command.call_count == 3
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from baconstack.utils.steps import Step, run_steps
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(3, timeout=2)
+    steps = [Step(name, barrier.wait) for name in ("a", "b", "c")]
+
+    # Would time out on the barrier if the steps ran one after another
+    outcomes = run_steps(steps, concurrency=3)
+
+    assert all(outcome.ok for outcome in outcomes.values())
+
+
+def test_dependencies_run_first():
+    finished = []
+
+    def step(name):
+        def run():
+            time.sleep(0.01)
+            finished.append(name)
+
+        return run
+
+    steps = [
+        Step("enable", step("enable"), after=("dns", "app")),
+        Step("app", step("app")),
+        Step("dns", step("dns"), worker="api"),
+    ]
+    run_steps(steps)
+
+    assert finished[-1] == "enable"
+
+
+def test_failed_step_skips_dependents():
+    def fail():
+        raise RuntimeError("no such domain")
+
+    steps = [
+        Step("dns", fail, worker="api"),
+        Step("app", lambda: False),
+        Step("storage", lambda: None),
+        Step("letsencrypt", lambda: None, after=("dns",)),
+        Step("renew", lambda: None, after=("letsencrypt", "app")),
+    ]
+    outcomes = run_steps(steps)
+
+    assert str(outcomes["dns"].error) == "no such domain"
+    assert not outcomes["app"].ok
+    assert outcomes["storage"].ok
+    assert outcomes["letsencrypt"].skipped
+    assert outcomes["letsencrypt"].blocked_by == ["dns"]
+    assert outcomes["renew"].blocked_by == ["letsencrypt", "app"]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        run_steps([Step("a", lambda: None, after=("missing",))])
+    with pytest.raises(ValueError):
+        run_steps(
+            [
+                Step("a", lambda: None, after=("b",)),
+                Step("b", lambda: None, after=("a",)),
+            ]
+        )
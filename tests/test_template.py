@@ -0,0 +1,251 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils import template as template_module
+from baconstack.utils.template import (
+    TASKS_FILE,
+    TaskError,
+    TemplateError,
+    load_projects,
+    mirror_path,
+    project_tasks,
+    render_project,
+    resolve_template,
+    template_url,
+)
+
+runner = CliRunner()
+
+
+def git(*args, cwd):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    """A minimal copier template in a git repository, reached by URL"""
+    repo = tmp_path / "template"
+    repo.mkdir()
+    (repo / "copier.yml").write_text(
+        """\
+project_name:
+  type: str
+_tasks:
+  - command: echo "hello {{ project_name }}" > greeting
+    working_directory: docs
+"""
+    )
+    (repo / "docs").mkdir()
+    (repo / "docs" / ".keep").touch()
+    (repo / ".baconstack-tasks.toml.jinja").write_text(
+        """\
+[[tasks]]
+name = "git"
+run = ["git init -q", "git add -A"]
+
+[[tasks]]
+name = "deps"
+run = [["uv", "venv", "--quiet"], "uv pip install --quiet -e .[dev]"]
+{% if project_name != "nohooks" %}
+[[tasks]]
+name = "pre-commit"
+run = [["uv", "tool", "run", "pre-commit", "install", "--install-hooks"]]
+after = ["git"]
+{% endif %}
+"""
+    )
+    (repo / "README.md.jinja").write_text("# {{ project_name }}\n")
+    (repo / "{{ _copier_conf.answers_file }}.jinja").write_text(
+        "{{ _copier_answers|to_nice_yaml }}"
+    )
+    git("init", "-q", cwd=repo)
+    git("add", ".", cwd=repo)
+    git("commit", "-qm", "init", cwd=repo)
+    return repo
+
+
+@pytest.fixture
+def fake_uv(tmp_path, monkeypatch):
+    """A `uv` on PATH that records its arguments instead of installing"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "uv.log"
+    uv = bin_dir / "uv"
+    uv.write_text(f'#!/bin/sh\necho "$(basename "$PWD") $*" >> {log}\n')
+    uv.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return log
+
+
+def test_template_url():
+    assert template_url("gh:sebbacon/baconstack-template") == (
+        "https://github.com/sebbacon/baconstack-template.git"
+    )
+    assert template_url("https://example.com/t.git") == "https://example.com/t.git"
+    assert template_url("../local-template") is None
+
+
+def test_mirror_is_cloned_once(upstream, monkeypatch):
+    url = upstream.as_uri()
+    fetches = []
+    monkeypatch.setattr(
+        template_module, "fetch_mirror", lambda *a, **kw: fetches.append(kw)
+    )
+
+    source = resolve_template(url)
+    assert source == mirror_path(url).as_uri()
+    assert resolve_template(url) == source
+    # Fresh mirror: nothing to fetch
+    assert fetches == []
+
+    monkeypatch.setattr(template_module, "MIRROR_TTL", -1)
+    resolve_template(url)
+    assert fetches == [{"background": True}]
+    resolve_template(url, offline=True)
+    assert len(fetches) == 1
+
+
+def test_offline_needs_a_mirror(upstream):
+    with pytest.raises(TemplateError):
+        resolve_template(upstream.as_uri(), offline=True)
+
+
+def test_new_offline_renders_from_mirror(upstream, tmp_path, monkeypatch, fake_uv):
+    monkeypatch.setenv("BACONSTACK_TEMPLATE", upstream.as_uri())
+    monkeypatch.chdir(tmp_path)
+
+    result = runner.invoke(app, ["new", "first"])
+    assert result.exit_code == 0, result.output
+
+    # With the upstream gone, the mirror is all there is
+    shutil.rmtree(upstream)
+    result = runner.invoke(app, ["new", "second", "--offline"])
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "second" / "README.md").read_text() == "# second\n"
+
+
+def test_load_projects(tmp_path):
+    manifest = tmp_path / "projects.toml"
+    manifest.write_text(
+        """
+[defaults]
+author_name = "Tenant Team"
+
+[[projects]]
+name = "tenant-a"
+
+[[projects]]
+name = "tenant-b"
+framework = "django"
+domain = "b.example.org"
+region = "eu"
+"""
+    )
+
+    a, b = load_projects(manifest, {"framework": "fastapi", "author_name": "Seb"})
+
+    assert a["project_name"] == "tenant-a"
+    assert a["domain"] == "tenant-a.example.com"
+    assert a["author_name"] == "Tenant Team"
+    assert b["framework"] == "django"
+    assert b["project_description"] == "Django Web App"
+    assert b["domain"] == "b.example.org"
+    # Keys new has no option for still reach the template
+    assert b["region"] == "eu"
+
+
+def test_load_projects_rejects_project_name(tmp_path, monkeypatch):
+    manifest = tmp_path / "projects.toml"
+    manifest.write_text('[[projects]]\nname = "a"\nproject_name = "b"\n')
+
+    with pytest.raises(ValueError, match="use name instead"):
+        load_projects(manifest)
+
+    monkeypatch.setenv("BACONSTACK_TEMPLATE", str(tmp_path))
+    result = runner.invoke(app, ["new", "--from", str(manifest)])
+    assert result.exit_code == 1
+    assert "Invalid project manifest" in result.output
+
+
+def test_new_from_manifest(upstream, tmp_path, monkeypatch, fake_uv):
+    monkeypatch.setenv("BACONSTACK_TEMPLATE", upstream.as_uri())
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "projects.toml").write_text(
+        "".join(f'[[projects]]\nname = "{name}"\n' for name in ("a", "b", "c"))
+    )
+    (tmp_path / "c").mkdir()
+
+    result = runner.invoke(app, ["new", "--from", "projects.toml", "--workers", "2"])
+
+    assert result.exit_code == 1
+    assert "2 created, 1 failed" in result.output
+    assert "c: directory already exists" in result.output
+    assert (tmp_path / "b" / "README.md").read_text() == "# b\n"
+    # Answers point at the template, not the local mirror
+    answers = (tmp_path / "a" / ".copier-answers.yml").read_text()
+    assert f"_src_path: {upstream.as_uri()}" in answers
+
+
+def test_new_runs_post_generation_tasks(upstream, tmp_path, monkeypatch, fake_uv):
+    monkeypatch.setenv("BACONSTACK_TEMPLATE", upstream.as_uri())
+    monkeypatch.chdir(tmp_path)
+
+    result = runner.invoke(app, ["new", "svc"])
+
+    assert result.exit_code == 0, result.output
+    assert "Post-generation tasks" in result.output
+    assert (tmp_path / "svc" / ".git").is_dir()
+    assert (tmp_path / "svc" / "docs" / "greeting").read_text() == "hello svc\n"
+    assert sorted(fake_uv.read_text().splitlines()) == [
+        "svc pip install --quiet -e .[dev]",
+        "svc tool run pre-commit install --install-hooks",
+        "svc venv --quiet",
+    ]
+
+
+def test_project_tasks(upstream, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = resolve_template(upstream.as_uri())
+
+    render_project(upstream.as_uri(), source, {"project_name": "svc"})
+    steps = project_tasks(tmp_path / "svc", skip=("git",))
+    assert [(s.name, s.after) for s in steps] == [("deps", ()), ("pre-commit", ())]
+
+    # The template renders the task list, so it can leave tasks out
+    render_project(upstream.as_uri(), source, {"project_name": "nohooks"})
+    assert [s.name for s in project_tasks(tmp_path / "nohooks")] == ["git", "deps"]
+
+
+def test_project_tasks_checks_dependencies(tmp_path):
+    (tmp_path / TASKS_FILE).write_text(
+        '[[tasks]]\nname = "hooks"\nrun = ["true"]\nafter = ["git"]\n'
+    )
+    with pytest.raises(TaskError, match="unknown tasks: git"):
+        project_tasks(tmp_path)
+    assert project_tasks(tmp_path / "missing") == []
+
+
+def test_new_skips_tasks(upstream, tmp_path, monkeypatch, fake_uv):
+    monkeypatch.setenv("BACONSTACK_TEMPLATE", upstream.as_uri())
+    monkeypatch.setenv("SKIP_PRE_COMMIT", "1")
+    monkeypatch.chdir(tmp_path)
+
+    result = runner.invoke(app, ["new", "svc", "--skip-task", "git"])
+
+    assert result.exit_code == 0, result.output
+    assert not (tmp_path / "svc" / ".git").exists()
+    assert sorted(fake_uv.read_text().splitlines()) == [
+        "svc pip install --quiet -e .[dev]",
+        "svc venv --quiet",
+    ]
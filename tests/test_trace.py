@@ -0,0 +1,81 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils.trace import Tracer, tracer
+from tests.fakes import FakeDigitalOcean, remote_shell
+
+runner = CliRunner()
+
+
+@pytest.fixture(autouse=True)
+def stop_tracing():
+    yield
+    tracer.enabled = False
+
+
+def test_disabled_tracer_records_nothing():
+    spans = Tracer()
+    with spans.span("ignored", "ssh"):
+        pass
+    assert spans.spans == []
+
+
+def test_chrome_trace_events():
+    spans = Tracer()
+    spans.start()
+    with spans.span("outer", "step"):
+        with spans.span("inner", "ssh", host="dokku.example.com"):
+            time.sleep(0.01)
+    with pytest.raises(ValueError), spans.span("broken", "api"):
+        raise ValueError
+
+    events = spans.chrome_trace()["traceEvents"]
+
+    assert [e["name"] for e in events] == ["outer", "inner", "broken"]
+    assert all(e["ph"] == "X" for e in events)
+    outer, inner, broken = events
+    assert outer["ts"] <= inner["ts"] and inner["dur"] <= outer["dur"]
+    assert inner["dur"] >= 10_000
+    assert inner["args"] == {"host": "dokku.example.com"}
+    assert broken["args"] == {"error": "ValueError"}
+
+
+def test_setup_trace(tmp_path):
+    trace_file = tmp_path / "trace.json"
+    with (
+        patch("paramiko.SSHClient") as mock_ssh,
+        patch(
+            "baconstack.commands.setup.DigitalOceanClient",
+            return_value=FakeDigitalOcean({"example.com": []}),
+        ),
+    ):
+        mock_ssh.return_value.exec_command.side_effect = remote_shell(
+            {"apps:create": ("", "Error: App already exists\n", 1)}
+        )
+        result = runner.invoke(
+            app,
+            [
+                "--trace",
+                str(trace_file),
+                "setup",
+                "testapp",
+                "test.example.com",
+                "--dokku-host",
+                "dokku.example.com",
+            ],
+        )
+
+    # The trace is written even though setup failed
+    assert result.exit_code == 1
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    names = {(e["cat"], e["name"]) for e in events}
+    assert ("ssh", "ssh connect dokku.example.com") in names
+    assert ("step", "app") in names
+    # Commands inside a batch get their own spans
+    assert ("dokku", "dokku apps:create testapp") in names
+    assert ("dokku", "dokku --quiet apps:list") in names
@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from typer.testing import CliRunner
+
+from baconstack.cli import app
+from baconstack.utils import wait
+from baconstack.utils.wait import Target, backoff_delay, wait_ready
+
+runner = CliRunner()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(wait, "backoff_delay", lambda attempt: 0.01)
+
+
+def self_signed(tmp_path):
+    """Certificate and key files for localhost"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_path, key_path
+
+
+@pytest.fixture
+def site():
+    """Local web server answering 503 until `ready_after` requests were made"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits += 1
+            self.send_response(200 if server.hits > server.ready_after else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.hits, server.ready_after = 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, base=1, cap=8) for attempt in range(10)]
+    assert all(0 <= delay <= min(8, 2**n) for n, delay in enumerate(delays))
+    assert len(set(delays)) > 1
+
+
+def test_http_check_retries_until_healthy(site):
+    site.ready_after = 2
+    target = Target("blog", "localhost", scheme="http", port=site.server_port)
+
+    (result,) = asyncio.run(wait_ready([target], ("http",), timeout=5))
+
+    assert result.ok
+    assert result.attempts == 3
+    assert result.detail == "HTTP 200"
+
+
+def test_checks_run_together_over_tls(site, tmp_path):
+    cert, key = self_signed(tmp_path)
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert, key)
+    site.socket = server_context.wrap_socket(site.socket, server_side=True)
+    client_context = ssl.create_default_context(cafile=str(cert))
+    target = Target("blog", "localhost", addresses={"127.0.0.1"}, port=site.server_port)
+    seen = []
+
+    results = asyncio.run(
+        wait_ready([target], timeout=5, on_result=seen.append, context=client_context)
+    )
+
+    assert [r.ok for r in results] == [True, True, True]
+    assert {r.check for r in seen} == {"dns", "tls", "http"}
+    assert results[1].detail == "valid for 30 more days"
+
+
+def test_gives_up_at_the_deadline():
+    targets = [Target(f"app{i}", "127.0.0.1", scheme="http", port=9) for i in range(20)]
+
+    results = asyncio.run(wait_ready(targets, ("http",), timeout=0.3))
+
+    assert not any(result.ok for result in results)
+    assert all(result.attempts > 1 for result in results)
+
+
+def test_wait_command():
+    result = runner.invoke(app, ["wait", "127.0.0.1", "--check", "dns"])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(app, ["wait", "127.0.0.1", "--check", "smoke-signals"])
+    assert result.exit_code == 1
+    assert "Unknown checks: smoke-signals" in result.output